@@ -0,0 +1,411 @@
+# bench_embeddings.py
+# ======================================================================
+# Benchmark reproducible del camino de embeddings (offline, modelo local).
+#
+# Suites (--suites, default todas):
+#   - encode → embed_service.encode_texts() (caché apagada) por backend,
+#              hilos, corpus y batch size: textos/seg y percentiles de
+#              latencia por llamada.
+#   - http   → POST /embed de punta a punta con el test client de Flask
+#              (JSON / f32, un texto y lotes) + desglose por etapa
+#              (header Server-Timing, ver GET /metrics).
+#   - seeder → docs/seg del pipeline del seeder (build_text → encode por
+#              tramos → empaquetado → executemany + commit) contra SQLite
+#              (default, base en memoria) o MySQL (--mysql: tabla
+#              <tabla>_bench, copia vacía de la real, se borra al terminar).
+#
+# Corpus (determinístico: mismos textos en cada corrida):
+#   - consultas   → preguntas cortas tipo kiosco
+#   - noticias    → build_text_for_embedding() de cada ítem de --json
+#   - noticias_xN → noticias estiradas a N veces su largo (--scale-length):
+#                   muestra el costo de los docs que llegan al tope de tokens
+#   Cada corpus se repite hasta --texts textos distintos (sufijo " [i]").
+#
+# Salida: JSON ({"meta", "results"}) en --out (o stdout). Para comparar dos
+# corridas (sale con código 1 si el throughput bajó más que --tolerance):
+#   python bench_embeddings.py --compare base.json nuevo.json
+#
+# Uso:
+#   python bench_embeddings.py --model_dir <ruta_modelo> --out bench_base.json
+#   python bench_embeddings.py --suites encode --backends torch,onnx-int8 \
+#       --threads 1,2,4 --batch-sizes 1,8,32
+#   python bench_embeddings.py --suites seeder --mysql --table conocimiento
+# ======================================================================
+
+import os                      # variables de entorno de embed_service / núcleos
+import sys                     # versión de Python / salida
+import json                    # corpus de entrada y salida de resultados
+import time                    # cronómetro
+import random                  # corpus sintético determinístico
+import argparse                # flags CLI
+import platform                # metadatos de la máquina
+import sqlite3                 # stand-in de MySQL para la suite seeder
+import subprocess              # commit de git (metadatos)
+import numpy as np             # percentiles
+
+from embed_backend import BACKENDS, cargar_modelo
+
+CONSULTAS = [
+    "¿Cuándo se fundó Realicó?",
+    "historia de la biblioteca popular",
+    "primera escuela de Realicó",
+    "cooperativa eléctrica",
+    "¿Quién fue el primer intendente?",
+    "llegada del ferrocarril",
+    "club atlético y deportes",
+    "inmigrantes italianos y españoles",
+]
+
+# ----------------- Utilidades -----------------
+def lista_int(texto: str):
+    return [int(x) for x in str(texto).split(",") if x.strip()]
+
+def percentiles(segundos) -> dict:
+    """p50/p95/p99/max en milisegundos."""
+    ms = np.asarray(segundos, dtype=np.float64) * 1000.0
+    if not len(ms):
+        return {}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3), "max": round(ms.max(), 3)}
+
+def commit_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def version_de(paquete: str):
+    try:
+        from importlib.metadata import version
+        return version(paquete)
+    except Exception:
+        return None
+
+def metadatos(args) -> dict:
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit_git(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "model_dir": args.model_dir,
+        "seed": args.seed,
+        "versions": {p: version_de(p) for p in
+                     ("torch", "sentence-transformers", "onnxruntime", "numpy", "flask")},
+    }
+
+# ----------------- Corpus -----------------
+def items_de_json(ruta: str):
+    from seed_local_embeddings import cargar_json
+    return [n for n in cargar_json(ruta) if (n.get("titulo") or "").strip() and (n.get("contenido") or "").strip()]
+
+def escalar(textos, n: int):
+    """Repite los textos hasta `n`, cada copia distinta (encode_cached deduplica iguales)."""
+    return [textos[i % len(textos)] + (f" [{i}]" if i >= len(textos) else "") for i in range(n)]
+
+def armar_corpus(items, n: int, factor_largo: int, seed: int) -> dict:
+    """Nombre del corpus → lista de `n` textos."""
+    from seed_local_embeddings import build_text_for_embedding
+    rnd = random.Random(seed)
+    noticias = [build_text_for_embedding(it) for it in items]
+    corpus = {"consultas": escalar(CONSULTAS, n)}
+    if noticias:
+        corpus["noticias"] = escalar(noticias, n)
+        if factor_largo > 1:
+            largos = []
+            for t in noticias:              # el doc + contenidos de otros al azar hasta xN su largo
+                partes = [t]
+                while sum(len(p) for p in partes) < factor_largo * len(t):
+                    partes.append(rnd.choice(noticias))
+                largos.append(" ".join(partes))
+            corpus[f"noticias_x{factor_largo}"] = escalar(largos, n)
+    return corpus
+
+# ----------------- Servicio (import con entorno de benchmark) -----------------
+def importar_servicio(args):
+    """
+    Importa embed_service con la caché y el micro-batcher apagados (medimos el
+    modelo, no los aciertos) y topes de admisión holgados para los lotes.
+    """
+    os.environ["MODEL_PATH"] = args.model_dir
+    os.environ.setdefault("EMBED_BACKEND", "torch" if "torch" in args.backends else args.backends[0])
+    os.environ.update({
+        "EMBED_CACHE_SIZE": "0", "EMBED_MICROBATCH_MS": "0", "EMBED_LAZY_LOAD": "0",
+        "EMBED_SERVER_TIMING": "1", "EMBED_QUEUE_TIMEOUT_MS": "600000",
+        "EMBED_MAX_TEXTS": str(max(args.batch_sizes + [256])), "EMBED_MAX_CHARS": "100000000",
+    })
+    import embed_service
+    return embed_service
+
+def modelo_para(es, backend: str, threads: int, cargados: dict):
+    """Entrada tipo MODELOS (ver embed_service.registrar_modelo) para backend/hilos."""
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads or os.cpu_count() or 1)   # torch cambia de hilos sin recargar
+        clave = ("torch", 0)
+    else:
+        clave = (backend, threads)                  # ONNX Runtime fija los hilos al crear la sesión
+    if clave not in cargados:
+        if backend == es.EMBED_BACKEND and (backend == "torch" or not threads):
+            cargados[clave] = es.MODELO_DEFAULT
+        else:
+            modelo = cargar_modelo(es.RUTA_MODELO_LOCAL, backend, threads=threads)
+            cargados[clave] = {"id": es.modelo_id(es.RUTA_MODELO_LOCAL, backend), "ruta": es.RUTA_MODELO_LOCAL,
+                               "backend": backend, "model": modelo,
+                               "dim": modelo.get_sentence_embedding_dimension()}
+    return cargados[clave]
+
+# ----------------- Suite: encode -----------------
+def bench_encode(es, args, corpus):
+    resultados, cargados = [], {}
+    for backend in args.backends:
+        for threads in args.threads:
+            try:
+                m = modelo_para(es, backend, threads, cargados)
+            except Exception as e:
+                print(f"⚠️  {backend}: no disponible ({e})")
+                resultados.append({"suite": "encode", "backend": backend, "threads": threads,
+                                   "skipped": f"{type(e).__name__}: {e}"})
+                break                               # sin modelo no hay hilos que probar
+            for nombre, textos in corpus.items():
+                for b in args.batch_sizes:
+                    es.encode_texts(textos[:b], batch_size=b, m=m)       # calentamiento
+                    lotes = [textos[i:i + b] for i in range(0, len(textos), b)]
+                    tiempos = []
+                    for _ in range(args.repeat):
+                        for lote in lotes:
+                            t = time.perf_counter()
+                            es.encode_texts(lote, batch_size=b, m=m)
+                            tiempos.append(time.perf_counter() - t)
+                    total = sum(tiempos)
+                    r = {
+                        "suite": "encode", "backend": backend, "threads": threads, "corpus": nombre,
+                        "batch_size": b, "texts": len(textos) * args.repeat,
+                        "chars_avg": round(sum(map(len, textos)) / len(textos), 1),
+                        "seconds": round(total, 4),
+                        "texts_per_s": round(len(textos) * args.repeat / max(total, 1e-9), 2),
+                        "latency_ms": percentiles(tiempos),        # por llamada de `b` textos
+                    }
+                    resultados.append(r)
+                    print(f"⏱️  encode {backend} t={threads} {nombre:<12} b={b:<3} "
+                          f"{r['texts_per_s']:>9.1f} textos/s  p95 {r['latency_ms']['p95']:.1f} ms")
+    return resultados
+
+# ----------------- Suite: http -----------------
+def bench_http(es, args, corpus):
+    cliente = es.app.test_client()
+    noticias = corpus.get("noticias") or corpus["consultas"]
+    casos = [
+        ("text_json", [{"text": t} for t in corpus["consultas"]]),
+        ("text_f32", [{"text": t, "format": "f32"} for t in corpus["consultas"]]),
+    ]
+    for b in args.batch_sizes:
+        if b > 1:
+            casos.append((f"texts{b}_json", [{"texts": noticias[i:i + b]} for i in range(0, len(noticias), b)]))
+            casos.append((f"texts{b}_f32", [{"texts": noticias[i:i + b], "format": "f32"}
+                                            for i in range(0, len(noticias), b)]))
+    resultados = []
+    for caso, cuerpos in casos:
+        cliente.post("/embed", json=cuerpos[0])                # calentamiento
+        tiempos, etapas, errores = [], {}, 0
+        for _ in range(args.repeat):
+            for cuerpo in cuerpos:
+                t = time.perf_counter()
+                resp = cliente.post("/embed", json=cuerpo)
+                tiempos.append(time.perf_counter() - t)
+                if resp.status_code != 200:
+                    errores += 1
+                for parte in resp.headers.get("Server-Timing", "").split(","):
+                    if ";dur=" in parte:
+                        k, v = parte.strip().split(";dur=")
+                        etapas.setdefault(k, []).append(float(v))
+        total = sum(tiempos)
+        r = {
+            "suite": "http", "case": caso, "requests": len(tiempos), "errors": errores,
+            "seconds": round(total, 4),
+            "req_per_s": round(len(tiempos) / max(total, 1e-9), 2),
+            "latency_ms": percentiles(tiempos),
+            "stages_ms_avg": {k: round(sum(v) / len(v), 3) for k, v in etapas.items()},
+        }
+        resultados.append(r)
+        print(f"🌐 http {caso:<14} {r['req_per_s']:>8.1f} req/s  p95 {r['latency_ms']['p95']:.1f} ms")
+    return resultados
+
+# ----------------- Suite: seeder -----------------
+SQLITE_TABLA = """
+CREATE TABLE IF NOT EXISTS {tabla} (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, titulo TEXT UNIQUE, contenido TEXT, vector TEXT,
+  vector_blob BLOB, vector_dtype TEXT, fecha_evento TEXT, imagen_url TEXT, etiquetas TEXT,
+  fuente_url TEXT, texto_hash TEXT, vector_modelo TEXT, vector_dim INTEGER, vector_norm INTEGER
+)"""
+
+COLUMNAS_UPSERT = ("titulo", "contenido", "vector", "vector_blob", "vector_dtype", "fecha_evento", "imagen_url",
+                   "etiquetas", "fuente_url", "texto_hash", "vector_modelo", "vector_dim", "vector_norm")
+
+def _sql_upsert_sqlite(tabla: str) -> str:
+    """Mismo UPSERT que seed_local_embeddings._sql_upsert, en dialecto SQLite."""
+    cols = ", ".join(COLUMNAS_UPSERT)
+    marcas = ", ".join("?" for _ in COLUMNAS_UPSERT)
+    sets = ", ".join(f"{c} = excluded.{c}" for c in COLUMNAS_UPSERT[1:])
+    return f"INSERT INTO {tabla} ({cols}) VALUES ({marcas}) ON CONFLICT(titulo) DO UPDATE SET {sets}"
+
+def abrir_destino(args):
+    """(conn, escribir(cur, tramo, vecs, formato), cerrar(), nombre) para SQLite o MySQL."""
+    import seed_local_embeddings as seed
+    if args.mysql:
+        from vector_store import asegurar_columnas
+        tabla = f"{args.table}_bench"
+        conn = seed.crear_conexion(dict(host=args.host, user=args.user, password=args.password,
+                                        database=args.database))
+        cur = conn.cursor()
+        cur.execute(f"DROP TABLE IF EXISTS {tabla}")
+        cur.execute(f"CREATE TABLE {tabla} LIKE {args.table}")     # mismos índices y tipos, vacía
+        asegurar_columnas(cur, tabla)
+        conn.commit()
+
+        def cerrar():
+            cur.execute(f"DROP TABLE IF EXISTS {tabla}")
+            conn.commit()
+            conn.close()
+        return conn, lambda c, tramo, vecs, fmt: seed.upsert_lote(c, tabla, tramo, vecs, fmt), cerrar, f"mysql:{tabla}"
+
+    conn = sqlite3.connect(args.sqlite)
+    conn.execute(SQLITE_TABLA.format(tabla="conocimiento"))
+    sql = _sql_upsert_sqlite("conocimiento")
+
+    def escribir(cur, tramo, vecs, fmt):
+        cur.executemany(sql, [seed._params_upsert(n, v, fmt) for n, v in zip(tramo, vecs)])
+    return conn, escribir, conn.close, f"sqlite:{args.sqlite}"
+
+def bench_seeder(es, args, items):
+    import seed_local_embeddings as seed
+    m = es.MODELO_DEFAULT
+    # --seed-docs ítems con títulos distintos (el UPSERT es por título)
+    docs = [{**items[i % len(items)], "titulo": f"{items[i % len(items)]['titulo']} #{i}"}
+            for i in range(args.seed_docs)]
+    opciones = {"batch_size": max(args.batch_sizes), "normalize": False, "passages": False,
+                "passage_tokens": 0, "passage_overlap": 32}
+    formato = {**seed.FORMATO_DEFAULT, "modelo": m["id"]}
+
+    conn, escribir, cerrar, destino = abrir_destino(args)
+    try:
+        cur = conn.cursor()
+        t_encode = t_db = 0.0
+        t0 = time.perf_counter()
+        for tramo in seed.iterar_tramos(docs, args.chunk):
+            t = time.perf_counter()
+            vecs, _ = seed.codificar_tramo(m["model"], tramo, opciones)
+            t_encode += time.perf_counter() - t
+            t = time.perf_counter()
+            escribir(cur, tramo, vecs, formato)
+            conn.commit()
+            t_db += time.perf_counter() - t
+        total = time.perf_counter() - t0
+    finally:
+        cerrar()
+    r = {
+        "suite": "seeder", "destination": destino, "docs": len(docs), "chunk": args.chunk,
+        "batch_size": opciones["batch_size"], "backend": m["backend"],
+        "seconds": round(total, 4),
+        "docs_per_s": round(len(docs) / max(total, 1e-9), 2),
+        "encode_docs_per_s": round(len(docs) / max(t_encode, 1e-9), 2),
+        "db_docs_per_s": round(len(docs) / max(t_db, 1e-9), 2),
+    }
+    print(f"🌱 seeder {destino}: {r['docs_per_s']:.1f} docs/s "
+          f"(encode {r['encode_docs_per_s']:.1f}, DB {r['db_docs_per_s']:.1f})")
+    return [r]
+
+# ----------------- Comparación entre corridas -----------------
+CLAVES = ("suite", "backend", "threads", "corpus", "batch_size", "case", "destination")
+METRICAS = ("texts_per_s", "req_per_s", "docs_per_s")
+
+def comparar(base_path: str, nuevo_path: str, tolerancia: float) -> int:
+    """Imprime el cambio de throughput por caso. Devuelve 1 si alguno bajó más que `tolerancia`."""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)["results"]
+    with open(nuevo_path, "r", encoding="utf-8") as f:
+        nuevo = json.load(f)["results"]
+    clave = lambda r: tuple((k, r.get(k)) for k in CLAVES if k in r)
+    previos = {clave(r): r for r in base if "skipped" not in r}
+    regresiones = 0
+    for r in nuevo:
+        antes = previos.get(clave(r))
+        metrica = next((k for k in METRICAS if k in r), None)
+        if antes is None or metrica is None or not antes.get(metrica):
+            continue
+        cambio = r[metrica] / antes[metrica] - 1.0
+        marca = "❌" if cambio < -tolerancia else "✅"
+        regresiones += cambio < -tolerancia
+        nombre = " ".join(str(v) for _, v in clave(r))
+        print(f"{marca} {nombre:<48} {antes[metrica]:>10.1f} → {r[metrica]:>10.1f} {metrica} ({cambio:+.1%})")
+    print(f"{'❌' if regresiones else '✅'} {regresiones} regresiones (tolerancia {tolerancia:.0%})")
+    return 1 if regresiones else 0
+
+# ----------------- Main -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de embeddings (encode, /embed y seeder).")
+    parser.add_argument("--model_dir", default=os.environ.get("MODEL_PATH",
+                        r"C:\Proyectos\museo-asistente\models\paraphrase-multilingual-mpnet-base-v2"))
+    parser.add_argument("--json", default="noticias.json", help="Corpus de noticias.")
+    parser.add_argument("--suites", default="encode,http,seeder", help="encode,http,seeder")
+    parser.add_argument("--backends", default="torch", help=f"Lista de: {', '.join(BACKENDS)}")
+    parser.add_argument("--threads", default="0", help="Hilos intra-op a probar (0 = default de la librería).")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="Batch sizes a probar.")
+    parser.add_argument("--texts", type=int, default=128, help="Textos por corpus.")
+    parser.add_argument("--scale-length", type=int, default=4, help="Factor del corpus de docs largos (1 = no).")
+    parser.add_argument("--repeat", type=int, default=3, help="Pasadas por caso.")
+    parser.add_argument("--seed", type=int, default=1234, help="Semilla del corpus sintético.")
+    parser.add_argument("--seed-docs", type=int, default=512, help="Docs del benchmark del seeder.")
+    parser.add_argument("--chunk", type=int, default=256, help="Docs por tramo del seeder.")
+    parser.add_argument("--sqlite", default=":memory:", help="Base SQLite del stand-in (default en memoria).")
+    parser.add_argument("--mysql", action="store_true", help="Seeder contra MySQL (tabla <tabla>_bench).")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="museo")
+    parser.add_argument("--password", default="museo2025")
+    parser.add_argument("--database", default="museo")
+    parser.add_argument("--table", default="conocimiento", help="Tabla de la que se copia la estructura.")
+    parser.add_argument("--out", default=None, help="Archivo JSON de salida (default: stdout).")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NUEVO"), help="Compara dos corridas y sale.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Caída de throughput tolerada.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return comparar(*args.compare, args.tolerance)
+
+    args.backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    invalidos = [b for b in args.backends if b not in BACKENDS]
+    if invalidos:
+        parser.error(f"Backend inválido: {', '.join(invalidos)}")
+    args.threads = lista_int(args.threads) or [0]
+    args.batch_sizes = lista_int(args.batch_sizes) or [32]
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+
+    items = items_de_json(args.json) if os.path.exists(args.json) else []
+    corpus = armar_corpus(items, max(1, args.texts), args.scale_length, args.seed)
+    es = importar_servicio(args)
+
+    salida = {"meta": metadatos(args), "results": []}
+    salida["meta"]["corpus"] = {k: {"texts": len(v), "chars_avg": round(sum(map(len, v)) / len(v), 1)}
+                                for k, v in corpus.items()}
+    if "encode" in suites:
+        salida["results"] += bench_encode(es, args, corpus)
+    if "http" in suites:
+        salida["results"] += bench_http(es, args, corpus)
+    if "seeder" in suites:
+        if items:
+            salida["results"] += bench_seeder(es, args, items)
+        else:
+            print(f"⚠️  seeder: sin ítems en {args.json}")
+
+    texto = json.dumps(salida, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+        print(f"💾 Resultados en {args.out}")
+    else:
+        print(texto)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,36 @@
 # crud_conocimiento.py
 # CRUD de la tabla "conocimiento" + utilidades de sincronización JSON,
 # y administración de la tabla "retroalimentacion" (pulgares del chat).
-
+# Conexiones: pool chico compartido (CRUD_POOL_SIZE). La importación desde
+# JSON es por conjuntos (staging + UPDATE/INSERT en una transacción, ver importar_lote).
+# Export: CRUD_EXPORT_PATH (default noticias.json; .jsonl → JSON Lines), atómico
+# y solo si la tabla cambió (marca en <archivo>.marca.json, ver exportar_a_json).
+# Listados: paginado keyset por (fecha, id) de a CRUD_PAGE_SIZE filas (ver paginas).
+# Cada alta/modificación/baja queda en conocimiento_cambios y, con CACHE_NOTIFY_URL,
+# se avisa a index.js para que aplique solo ese cambio (ver vector_store.registrar_cambios).
+#
+# Uso:
+#   python crud_conocimiento.py                          # menú interactivo
+#   python crud_conocimiento.py listar --formato csv     # listado sin menú (csv/json)
+#   python crud_conocimiento.py listar --sin-vector --formato json
+#   python crud_conocimiento.py retro --limite 500 --formato csv
+
+import os
+import sys
+import csv
 import json
+import time
+import argparse
 import mysql.connector
+from mysql.connector import pooling
 from tabulate import tabulate
 from colorama import Fore, Style, init
 from datetime import date, datetime
+from vector_store import (
+    SQL_DIMS, SQL_TIENE_VECTOR, asegurar_clave_unica, asegurar_columnas, asegurar_tabla_cambios, columna_indexable,
+    notificar_cambios, registrar_cambios,
+)
+from noticias_io import escribir_atomico, escribir_noticias, iterar_noticias, parchear_noticias
 
 # ===== Inicializar colorama =====
 init(autoreset=True)
@@ -19,8 +43,65 @@ DB = {
     "database": "museo"
 }
 
+# Pool chico compartido por todo el módulo (CRUD_POOL_SIZE, default 3):
+# conn.close() devuelve la conexión al pool en lugar de cerrarla.
+POOL_SIZE = int(os.environ.get("CRUD_POOL_SIZE", "3"))
+_pool = None
+
 def conectar():
-    return mysql.connector.connect(**DB)
+    """Conexión del pool (se crea en el primer uso). Si el pool está agotado, una directa."""
+    global _pool
+    if _pool is None:
+        _pool = pooling.MySQLConnectionPool(pool_name="crud_museo", pool_size=max(1, POOL_SIZE), **DB)
+    try:
+        return _pool.get_connection()
+    except mysql.connector.errors.PoolError:    # pool agotado (otros errores siguen de largo)
+        return mysql.connector.connect(**DB)
+
+# Archivo que sincroniza el CRUD (lo leen importar_desde_json y el seeder --json)
+ARCHIVO_EXPORT = os.environ.get("CRUD_EXPORT_PATH", "noticias.json")
+
+# Marca de agua de la tabla: `actualizado` cambia solo (ON UPDATE) en cada
+# INSERT/UPDATE que modifica la fila; con índice, MAX(actualizado) es inmediato.
+# El seeder no la mueve cuando solo reescribe vectores (ver vector_store.sql_marca).
+COLUMNAS_MARCA = {
+    "actualizado": "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)",
+}
+_marca_lista = False
+
+def asegurar_marca(cur):
+    """Columna `actualizado` + índice (una vez por proceso; DDL → fuera de transacciones)."""
+    global _marca_lista
+    if _marca_lista:
+        return
+    creadas = asegurar_columnas(cur, "conocimiento", COLUMNAS_MARCA)
+    cur.execute("""SELECT 1 FROM information_schema.STATISTICS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'conocimiento'
+                     AND INDEX_NAME = 'ix_actualizado'""")
+    if not cur.fetchone():
+        cur.execute("ALTER TABLE conocimiento ADD INDEX ix_actualizado (actualizado)")
+    if creadas:
+        print(Fore.YELLOW + "🧱 Columna 'actualizado' agregada a conocimiento" + Style.RESET_ALL)
+    _marca_lista = True
+
+def asegurar_esquema():
+    """Agrega (si faltan) las columnas de vector binario y metadatos (ver vector_store.py)."""
+    try:
+        conn = conectar()
+        cur = conn.cursor()
+        creadas = asegurar_columnas(cur, "conocimiento")
+        _, aviso = asegurar_clave_unica(cur, "conocimiento", "titulo")     # upsert por título
+        asegurar_marca(cur)                                                 # export incremental
+        asegurar_indices_listado(cur)                                       # paginado keyset
+        asegurar_tabla_cambios(cur, "conocimiento")                         # recarga delta en index.js
+        conn.commit()
+        conn.close()
+        if creadas:
+            print(Fore.YELLOW + f"🧱 Columnas agregadas a conocimiento: {', '.join(creadas)}" + Style.RESET_ALL)
+        if aviso:
+            print(Fore.YELLOW + f"🧱 {aviso}" + Style.RESET_ALL)
+    except Exception as e:
+        print(Fore.RED + f"❌ No pude verificar el esquema: {e}" + Style.RESET_ALL)
 
 # ---------- Helpers ----------
 def shorten(text, max_len=40):
@@ -36,6 +117,11 @@ def shorten(text, max_len=40):
     s = str(text)
     return s if len(s) <= max_len else s[:max_len//2] + "…" + s[-max_len//2:]
 
+def cortar(text, max_len=40):
+    """Como shorten, pero para columnas que vienen recortadas de SQL con LEFT(col, max_len + 1)."""
+    s = shorten(text, 10**9)
+    return s if len(s) <= max_len else s[:max_len - 1] + "…"
+
 def safe_jsonify_value(v):
     """Deja el valor serializable por json: str/float/int/bool/None/list/dict"""
     if isinstance(v, (date, datetime)):
@@ -61,121 +147,301 @@ def normalize_fecha(fe):
         return None
 
 # ---------- Exportar a noticias.json ----------
-def exportar_a_json():
-    """Exporta la tabla a noticias.json en formato {"news":[...]}, serializando seguro."""
+CAMPOS_EXPORT = ("titulo", "contenido", "fecha_evento", "imagen_url", "etiquetas", "fuente_url")
+
+def item_export(r):
+    """Fila (dict) → ítem del JSON, con tipos serializables."""
+    return {k: safe_jsonify_value(r.get(k)) for k in CAMPOS_EXPORT}
+
+def marca_tabla(cur):
+    """Estado de la tabla en una consulta barata: filas, id máximo y última modificación."""
+    asegurar_marca(cur)
+    cur.execute("SELECT COUNT(*), COALESCE(MAX(id), 0), MAX(actualizado) FROM conocimiento")
+    filas, max_id, actualizado = cur.fetchone()
+    return {"filas": int(filas), "max_id": int(max_id), "actualizado": safe_jsonify_value(actualizado)}
+
+def leer_marca(ruta=ARCHIVO_EXPORT):
+    try:
+        with open(f"{ruta}.marca.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def guardar_marca(marca, ruta=ARCHIVO_EXPORT):
+    escribir_atomico(f"{ruta}.marca.json", lambda f: json.dump(marca, f))
+
+def solo_este_cambio(cur, cambio, marca):
+    """
+    True si entre cambio["antes"] y `marca` la tabla cambió SOLO por `cambio`
+    (ningún otro escritor se metió en el medio). Si no, parchear un ítem y
+    guardar la marca dejaría afuera del archivo la fila del otro.
+    - filas: +1 en un alta, -1 en una baja, igual en una modificación;
+    - con `actualizado` posterior a la marca previa: solo la fila del cambio
+      (ninguna en una baja). Usa el índice ix_actualizado.
+    """
+    antes = cambio.get("antes") or {}
+    esperado = (cambio.get("titulo") is None) - (cambio.get("id") is None)
+    if marca["filas"] - antes.get("filas", -1) != esperado:
+        return False
+    desde = antes.get("actualizado")
+    if desde is None:                       # la tabla estaba vacía
+        cur.execute("SELECT id FROM conocimiento LIMIT 2")
+    else:
+        cur.execute("SELECT id FROM conocimiento WHERE actualizado > %s LIMIT 2", (desde.replace("T", " "),))
+    tocadas = [r["id"] for r in cur.fetchall()]
+    return tocadas == ([] if cambio.get("id") is None else [cambio["id"]])
+
+def exportar_a_json(forzar=False, cambio=None):
+    """
+    Exporta la tabla a ARCHIVO_EXPORT ({"news":[...]} o JSON Lines), serializando seguro.
+    - Si la tabla no cambió desde el último export (misma marca), no hace nada.
+    - cambio = {"antes": marca previa al cambio, "titulo": título anterior (None en
+      un alta), "id": fila nueva/modificada (None en una baja)}: si el archivo
+      estaba al día y nadie más tocó la tabla entretanto (solo_este_cambio), se
+      reescribe cambiando SOLO ese ítem (sin volcar la tabla).
+    - Si no, vuelca la tabla con un cursor en streaming (sin fetchall).
+    Siempre a un temporal + rename: un corte nunca deja el archivo truncado.
+    """
+    conn = None
     try:
         conn = conectar()
+        cur = conn.cursor()
+        # marca y volcado van en la misma transacción (REPEATABLE READ: misma foto de la tabla)
+        marca = marca_tabla(cur)
+        cur.close()
         cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT titulo, contenido, fecha_evento, imagen_url, etiquetas, fuente_url
+        previa = leer_marca()
+        existe = os.path.exists(ARCHIVO_EXPORT)
+
+        if existe and not forzar and previa == marca:
+            print(Fore.YELLOW + f"📝 {ARCHIVO_EXPORT} ya estaba al día." + Style.RESET_ALL)
+            return
+
+        if existe and not forzar and cambio and previa == cambio.get("antes") and solo_este_cambio(cur, cambio, marca):
+            nuevo = None
+            if cambio.get("id") is not None:
+                cur.execute(f"SELECT {', '.join(CAMPOS_EXPORT)} FROM conocimiento WHERE id=%s", (cambio["id"],))
+                filas = cur.fetchall()
+                nuevo = item_export(filas[0]) if filas else None
+            if parchear_noticias(ARCHIVO_EXPORT, cambio.get("titulo"), nuevo):
+                guardar_marca(marca)
+                print(Fore.YELLOW + f"📝 {ARCHIVO_EXPORT} sincronizado (1 ítem)." + Style.RESET_ALL)
+                return
+
+        # Volcado completo: el cursor sin buffer trae las filas a medida que se escriben
+        cur.execute(f"""
+            SELECT {', '.join(CAMPOS_EXPORT)}
             FROM conocimiento
-            ORDER BY fecha_evento ASC
+            ORDER BY fecha_evento ASC, id ASC
         """)
-        rows = cur.fetchall()
-        conn.close()
+        n = escribir_noticias(ARCHIVO_EXPORT, (item_export(r) for r in cur))
+        guardar_marca(marca)
 
-        # Normalizar a tipos JSON
-        clean_rows = []
-        for r in rows:
-            clean_rows.append({
-                "titulo":       safe_jsonify_value(r.get("titulo")),
-                "contenido":    safe_jsonify_value(r.get("contenido")),
-                "fecha_evento": safe_jsonify_value(r.get("fecha_evento")),
-                "imagen_url":   safe_jsonify_value(r.get("imagen_url")),
-                "etiquetas":    safe_jsonify_value(r.get("etiquetas")),
-                "fuente_url":   safe_jsonify_value(r.get("fuente_url")),
-            })
-
-        with open("noticias.json", "w", encoding="utf-8") as f:
-            json.dump({"news": clean_rows}, f, indent=2, ensure_ascii=False)
-
-        print(Fore.YELLOW + "📝 noticias.json sincronizado." + Style.RESET_ALL)
+        print(Fore.YELLOW + f"📝 {ARCHIVO_EXPORT} sincronizado ({n} ítems)." + Style.RESET_ALL)
     except Exception as e:
-        print(Fore.RED + f"❌ No pude exportar a noticias.json: {e}" + Style.RESET_ALL)
+        print(Fore.RED + f"❌ No pude exportar a {ARCHIVO_EXPORT}: {e}" + Style.RESET_ALL)
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
 
 # ---------- Listar conocimiento (con estado de vector) ----------
+# ---------- Listados paginados (keyset) ----------
+# En vez de LIMIT/OFFSET (que lee y descarta todas las filas anteriores) cada
+# página pide "las N siguientes a la última vista" por (fecha, id): con el
+# índice compuesto cuesta lo mismo la página 1 que la 1000.
+PAGINA = int(os.environ.get("CRUD_PAGE_SIZE", "50"))
+
+INDICES_LISTADO = {
+    "conocimiento":      ("ix_fecha_evento_id", "fecha_evento, id"),
+    "retroalimentacion": ("ix_fecha_creacion_id", "fecha_creacion, id"),
+}
+
+def asegurar_indices_listado(cur):
+    """Índices (fecha, id) para el paginado; si una tabla no existe, se saltea."""
+    for tabla, (nombre, cols) in INDICES_LISTADO.items():
+        cur.execute("""SELECT 1 FROM information_schema.STATISTICS
+                       WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s""",
+                    (tabla, nombre))
+        if cur.fetchone():
+            continue
+        try:
+            cur.execute(f"ALTER TABLE {tabla} ADD INDEX {nombre} ({cols})")
+            print(Fore.YELLOW + f"🧱 Índice {nombre} agregado a {tabla}" + Style.RESET_ALL)
+        except mysql.connector.Error as e:
+            print(Fore.YELLOW + f"⚠️ Sin índice {nombre} en {tabla}: {e.msg}" + Style.RESET_ALL)
+
+def _seek(col, desc, clave):
+    """
+    WHERE para "después de `clave`" = (fecha, id) en el orden (col, id) ASC/DESC.
+    NULL va primero en ASC y último en DESC (como ORDER BY de MySQL).
+    """
+    if clave is None:
+        return "TRUE", ()
+    fecha, id_ = clave
+    if not desc:
+        if fecha is None:
+            return f"(({col} IS NULL AND id > %s) OR {col} IS NOT NULL)", (id_,)
+        return f"({col} > %s OR ({col} = %s AND id > %s))", (fecha, fecha, id_)
+    if fecha is None:
+        return f"({col} IS NULL AND id < %s)", (id_,)
+    return f"({col} < %s OR ({col} = %s AND id < %s) OR {col} IS NULL)", (fecha, fecha, id_)
+
+def paginas(tabla, col, campos, desc=False, tam=PAGINA, desde=None, donde="TRUE", limite=0):
+    """
+    Genera páginas (listas de dicts) de `tabla` ordenadas por (col, id).
+    - campos: expresiones del SELECT (conviene LEFT(...) para no traer textos enteros)
+    - desde: (fecha, id) de la última fila ya vista (None = desde el principio)
+    - limite: tope total de filas (0 = sin tope)
+    Cada página es una consulta corta con su propia conexión del pool (no se
+    retiene una conexión mientras el usuario mira la pantalla) y las filas se
+    leen del cursor sin buffer a medida que llegan, sin fetchall.
+    """
+    orden = "DESC" if desc else "ASC"
+    vistas = 0
+    while True:
+        n = tam if not limite else min(tam, limite - vistas)
+        if n <= 0:
+            return
+        cond, params = _seek(col, desc, desde)
+        conn = conectar()
+        try:
+            cur = conn.cursor(dictionary=True)
+            cur.execute(f"""
+                SELECT id, {col} AS _clave, {campos}
+                FROM {tabla}
+                WHERE ({donde}) AND {cond}
+                ORDER BY {col} {orden}, id {orden}
+                LIMIT %s
+            """, params + (n,))
+            pagina = [r for r in cur]
+            cur.close()
+        finally:
+            conn.close()
+        if not pagina:
+            return
+        yield pagina
+        vistas += len(pagina)
+        desde = (pagina[-1]["_clave"], pagina[-1]["id"])
+        if len(pagina) < n:
+            return
+
+def hojear(paginas_, mostrar):
+    """Muestra página por página; Enter = siguiente, q = terminar."""
+    hubo = False
+    for pagina in paginas_:
+        hubo = True
+        mostrar(pagina)
+        if len(pagina) < PAGINA:
+            break
+        if input(Fore.CYAN + "Enter = página siguiente, q = terminar: " + Style.RESET_ALL).strip().lower() == "q":
+            break
+    return hubo
+
+def volcar(paginas_, columnas, formato="csv", anchos=None, salida=None):
+    """
+    Modo no interactivo: escribe las filas en CSV o JSON (arreglo) a medida que llegan.
+    anchos = {columna: n} para cortar (con …) las que vienen de LEFT(col, n + 1).
+    """
+    anchos = anchos or {}
+    salida = salida or sys.stdout
+    n = 0
+    if formato == "csv":
+        w = csv.writer(salida)
+        w.writerow(columnas)
+    else:
+        salida.write("[")
+    for pagina in paginas_:
+        for r in pagina:
+            fila = [cortar(r.get(c), anchos[c]) if c in anchos else safe_jsonify_value(r.get(c))
+                    for c in columnas]
+            if formato == "csv":
+                w.writerow(fila)
+            else:
+                salida.write(("," if n else "") + "\n" + json.dumps(dict(zip(columnas, fila)), ensure_ascii=False))
+            n += 1
+    if formato != "csv":
+        salida.write("\n]\n" if n else "]\n")
+    salida.flush()
+    return n
+
+# Columnas del listado de conocimiento: recortadas en SQL (LEFT) con el ancho de pantalla
+ANCHOS_CONOCIMIENTO = {"titulo": 40, "contenido": 60, "imagen_url": 50, "etiquetas": 30, "fuente_url": 60}
+CAMPOS_LISTADO = ", ".join(
+    [f"LEFT({c}, {n + 1}) AS {c}" for c, n in ANCHOS_CONOCIMIENTO.items()]
+    + ["DATE_FORMAT(fecha_evento, '%Y-%m-%d') AS fecha", "fecha_registro", f"{SQL_DIMS} AS dims"]
+)
+COLUMNAS_LISTADO = ["id", "dims", "titulo", "contenido", "fecha", "imagen_url", "etiquetas", "fuente_url", "fecha_registro"]
+
+def paginas_conocimiento(desde=None, sin_vector=False, limite=0):
+    donde = f"NOT {SQL_TIENE_VECTOR}" if sin_vector else "TRUE"
+    return paginas("conocimiento", "fecha_evento", CAMPOS_LISTADO, desde=desde, donde=donde, limite=limite)
+
 def listar(resaltar_id=None):
     """
     Lista eventos mostrando si tienen vector y cuántas dimensiones (dims).
-    Usamos JSON_LENGTH(vector) porque 'vector' es tipo JSON.
+    Usamos vector_dim (o JSON_LENGTH(vector) en filas viejas sin migrar).
+    Con resaltar_id arranca en la página de esa fila.
     """
-    conn = conectar()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT
-          id,
-          titulo,
-          contenido,
-          fecha_evento,
-          imagen_url,
-          etiquetas,
-          fuente_url,
-          fecha_registro,
-          COALESCE(JSON_LENGTH(vector), 0) AS dims   -- nº de floats en el embedding
-        FROM conocimiento
-        ORDER BY fecha_evento ASC, id ASC
-    """)
-    rows = cur.fetchall()
-    conn.close()
+    desde = None
+    if resaltar_id:
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute("SELECT fecha_evento FROM conocimiento WHERE id=%s", (resaltar_id,))
+        fila = cur.fetchone()
+        conn.close()
+        if fila:
+            desde = (fila[0], resaltar_id - 1)     # "después de (fecha, id-1)" incluye a la fila
+    numero = 0
+
+    def mostrar(pagina):
+        nonlocal numero
+        data = []
+        for r in pagina:
+            numero += 1
+            # ✔ si dims >= 64 (cualquier embedding real), ✖ si 0
+            vec_ok = "✔" if (r["dims"] or 0) >= 64 else "✖"
 
-    data = []
-    for idx, r in enumerate(rows, 1):
-        # ✔ si dims >= 64 (cualquier embedding real), ✖ si 0
-        vec_ok = "✔" if (r["dims"] or 0) >= 64 else "✖"
-
-        titulo_fmt = shorten(r["titulo"], 40)
-        if resaltar_id and r["id"] == resaltar_id:
-            titulo_fmt = Fore.GREEN + titulo_fmt + Style.RESET_ALL
-
-        data.append([
-            idx,                        # N°
-            r["id"],                    # ID real
-            vec_ok,                     # Estado vector
-            r["dims"] or 0,             # Dimensiones (p.ej. 384)
-            titulo_fmt,
-            shorten(r["contenido"], 60),
-            shorten(str(r["fecha_evento"])[:10], 10),
-            shorten(r["imagen_url"], 50),
-            shorten(r["etiquetas"], 30),
-            shorten(r["fuente_url"], 60),
-            shorten(r["fecha_registro"], 19),
-        ])
-
-    print(Fore.CYAN + "\n━━━ 📜 Eventos en la tabla conocimiento ━━━" + Style.RESET_ALL)
-    print(tabulate(
-        data,
-        headers=["N°", "ID", "Vec", "Dims", "Título", "Contenido", "Fecha", "Imagen", "Etiquetas", "Fuente", "Registro"],
-        tablefmt="fancy_grid"
-    ))
+            titulo_fmt = cortar(r["titulo"], 40)
+            if resaltar_id and r["id"] == resaltar_id:
+                titulo_fmt = Fore.GREEN + titulo_fmt + Style.RESET_ALL
+
+            data.append([
+                numero,                     # N°
+                r["id"],                    # ID real
+                vec_ok,                     # Estado vector
+                r["dims"] or 0,             # Dimensiones (p.ej. 384)
+                titulo_fmt,
+                cortar(r["contenido"], 60),
+                r["fecha"] or "",
+                cortar(r["imagen_url"], 50),
+                cortar(r["etiquetas"], 30),
+                cortar(r["fuente_url"], 60),
+                shorten(r["fecha_registro"], 19),
+            ])
+
+        print(Fore.CYAN + "\n━━━ 📜 Eventos en la tabla conocimiento ━━━" + Style.RESET_ALL)
+        print(tabulate(
+            data,
+            headers=["N°", "ID", "Vec", "Dims", "Título", "Contenido", "Fecha", "Imagen", "Etiquetas", "Fuente", "Registro"],
+            tablefmt="fancy_grid"
+        ))
+
+    if not hojear(paginas_conocimiento(desde), mostrar):
+        print(Fore.YELLOW + "ℹ️ La tabla conocimiento está vacía." + Style.RESET_ALL)
 
 # ---------- Listar SOLO los que NO tienen vector ----------
 def listar_sin_vector():
     """Muestra filas sin embedding (útil para debug del seed)."""
-    conn = conectar()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT
-          id,
-          titulo,
-          DATE_FORMAT(fecha_evento, '%Y-%m-%d') AS fecha,
-          COALESCE(JSON_LENGTH(vector), 0) AS dims
-        FROM conocimiento
-        WHERE vector IS NULL
-           OR JSON_LENGTH(vector) = 0
-        ORDER BY fecha_evento ASC, id ASC
-    """)
-    rows = cur.fetchall()
-    conn.close()
+    def mostrar(pagina):
+        data = [[r["id"], cortar(r["titulo"], 40), r["fecha"], r["dims"]] for r in pagina]
+        print(Fore.YELLOW + "\n⚠️ Filas sin vector" + Style.RESET_ALL)
+        print(tabulate(data, headers=["ID", "Título", "Fecha", "Dims"], tablefmt="fancy_grid"))
 
-    if not rows:
+    if not hojear(paginas_conocimiento(sin_vector=True), mostrar):
         print(Fore.GREEN + "✅ Todas las filas tienen vector." + Style.RESET_ALL)
-        return
-
-    data = []
-    for r in rows:
-        data.append([r["id"], shorten(r["titulo"], 50), r["fecha"], r["dims"]])
-    print(Fore.YELLOW + "\n⚠️ Filas sin vector" + Style.RESET_ALL)
-    print(tabulate(data, headers=["ID", "Título", "Fecha", "Dims"], tablefmt="fancy_grid"))
 
 # ---------- Crear ----------
 def crear():
@@ -191,17 +457,21 @@ def crear():
         etiquetas = input("Etiquetas: ")
         fuente    = input("Fuente URL: ")
 
+        antes = marca_tabla(cur)   # para sincronizar el export con un parche de 1 ítem
+
         # Guardamos vector = NULL (no '[]') para que sea claro que falta seed.
         sql = """INSERT INTO conocimiento
                  (titulo, contenido, fecha_evento, imagen_url, etiquetas, fuente_url, vector)
                  VALUES (%s, %s, %s, %s, %s, %s, NULL)"""
         cur.execute(sql, (titulo, contenido, fecha, imagen, etiquetas, fuente))
-        conn.commit()
         nuevo_id = cur.lastrowid
+        registrar_cambios(cur, "conocimiento", ids=[nuevo_id])
+        conn.commit()
         print(Fore.GREEN + f"✅ Evento creado con ID {nuevo_id}" + Style.RESET_ALL)
         conn.close()
+        notificar_cambios()
 
-        exportar_a_json()
+        exportar_a_json(cambio={"antes": antes, "titulo": None, "id": nuevo_id})
         listar(resaltar_id=nuevo_id)
     except Exception as e:
         print(Fore.RED + f"❌ Error creando evento: {e}" + Style.RESET_ALL)
@@ -218,6 +488,7 @@ def modificar():
     try:
         conn = conectar()
         cur = conn.cursor()
+        antes = marca_tabla(cur)
         cur.execute("""SELECT titulo, contenido, fecha_evento, imagen_url, etiquetas, fuente_url
                        FROM conocimiento WHERE id=%s""", (id_sel,))
         row = cur.fetchone()
@@ -241,11 +512,13 @@ def modificar():
                  SET titulo=%s, contenido=%s, fecha_evento=%s, imagen_url=%s, etiquetas=%s, fuente_url=%s
                  WHERE id=%s"""
         cur.execute(sql, (titulo, contenido, fecha, imagen, etiquetas, fuente, id_sel))
+        registrar_cambios(cur, "conocimiento", ids=[id_sel])
         conn.commit()
         conn.close()
+        notificar_cambios()
 
         print(Fore.GREEN + "✅ Evento actualizado" + Style.RESET_ALL)
-        exportar_a_json()
+        exportar_a_json(cambio={"antes": antes, "titulo": t, "id": id_sel})
         listar(resaltar_id=id_sel)
     except Exception as e:
         print(Fore.RED + f"❌ Error modificando: {e}" + Style.RESET_ALL)
@@ -267,78 +540,158 @@ def eliminar():
     try:
         conn = conectar()
         cur = conn.cursor()
+        antes = marca_tabla(cur)
+        cur.execute("SELECT titulo FROM conocimiento WHERE id=%s", (id_sel,))
+        fila = cur.fetchone()
         cur.execute("DELETE FROM conocimiento WHERE id=%s", (id_sel,))
-        conn.commit()
         affected = cur.rowcount
+        if affected:
+            registrar_cambios(cur, "conocimiento", ids=[id_sel], op="delete")
+        conn.commit()
         conn.close()
+        if affected:
+            notificar_cambios()
 
         if affected:
             print(Fore.GREEN + f"✅ Evento ID {id_sel} eliminado" + Style.RESET_ALL)
         else:
             print(Fore.YELLOW + f"ℹ️ No había un evento con ID {id_sel}" + Style.RESET_ALL)
 
-        exportar_a_json()
+        exportar_a_json(cambio={"antes": antes, "titulo": fila[0] if fila else None, "id": None})
         listar()
     except Exception as e:
         print(Fore.RED + f"❌ Error eliminando: {e}" + Style.RESET_ALL)
 
 # --- Importar JSON -> tabla (upsert por título) ---
-def importar_desde_json():
-    try:
-        # 1) Cargar payload desde noticias.json (formato {"news":[...]})
-        with open("noticias.json", "r", encoding="utf-8") as f:
-            payload = json.load(f)
-        items = payload.get("news", [])
-
-        conn = conectar()
-        cur  = conn.cursor()
-
-        # 2) Sentencias SQL (vector = NULL para marcar que falta calcular embedding)
-        ins = """INSERT INTO conocimiento
-                 (titulo, contenido, fecha_evento, imagen_url, etiquetas, fuente_url, vector)
-                 VALUES (%s, %s, %s, %s, %s, %s, NULL)"""
-        upd = """UPDATE conocimiento
-                 SET contenido=%s, fecha_evento=%s, imagen_url=%s, etiquetas=%s, fuente_url=%s
-                 WHERE id=%s"""
-        sel = "SELECT id FROM conocimiento WHERE titulo=%s"
-
-        # 3) Upsert por título
-        created, updated = 0, 0
-        for it in items:
-            t  = it.get("titulo", "").strip()
-            c  = it.get("contenido", "")
-            fe = normalize_fecha(it.get("fecha_evento"))
-            im = it.get("imagen_url", "")
-            et = it.get("etiquetas", "")
-            fu = it.get("fuente_url", "")
-
-            if not t:
-                continue
+CAMPOS_IMPORT = ("titulo", "contenido", "fecha_evento", "imagen_url", "etiquetas", "fuente_url")
+LOTE_IMPORT = 1000      # filas por INSERT multi-fila a la tabla de staging
 
-            cur.execute(sel, (t,))
-            row = cur.fetchone()
-            if row:
-                cur.execute(upd, (c, fe, im, et, fu, row[0]))
-                updated += 1
-            else:
-                cur.execute(ins, (t, c, fe, im, et, fu))
-                created += 1
+def importar_lote(items, conn=None):
+    """
+    Upsert por título de muchos ítems con SQL por conjuntos (no 2 consultas por ítem):
+      1) los ítems van a una tabla TEMPORARY de staging (executemany en lotes);
+      2) un JOIN contra conocimiento cuenta nuevos / cambiados / sin cambios;
+      3) un UPDATE ... JOIN pisa solo las filas que cambiaron y un
+         INSERT ... SELECT agrega las nuevas (vector NULL → las vectoriza el seed).
+    Todo en UNA transacción (con el registro de cambios de las filas tocadas).
+    Títulos repetidos en el JSON: gana el último.
+    Devuelve {"nuevos", "actualizados", "sin_cambios", "omitidos", "segundos"}.
+    """
+    t0 = time.perf_counter()
+    filas, omitidos = {}, 0
+    for it in items:
+        t = (it.get("titulo") or "").strip()
+        if not t:
+            omitidos += 1
+            continue
+        filas[t] = (
+            t,
+            it.get("contenido", ""),
+            normalize_fecha(it.get("fecha_evento")),
+            it.get("imagen_url", ""),
+            it.get("etiquetas", ""),
+            it.get("fuente_url", ""),
+        )
+
+    propia = conn is None
+    conn = conn or conectar()
+    cur = conn.cursor()
+    try:
+        # Fuera de la transacción: la clave única es DDL (commit implícito)
+        _, aviso = asegurar_clave_unica(cur, "conocimiento", "titulo")
+        if aviso:
+            print(Fore.YELLOW + f"🧱 {aviso}" + Style.RESET_ALL)
+        clave = columna_indexable(cur, "conocimiento", "titulo")
+        asegurar_marca(cur)
+        conn.commit()
 
+        conn.start_transaction()
+        cur.execute("SELECT NOW(6)")
+        inicio = cur.fetchone()[0]      # `actualizado` (ON UPDATE) marca lo que toque esta transacción
+        # 1) Staging con los mismos tipos de columna (CREATE/DROP TEMPORARY no hacen commit)
+        cols = ", ".join(CAMPOS_IMPORT)
+        cur.execute("DROP TEMPORARY TABLE IF EXISTS conocimiento_import")
+        cur.execute(f"""CREATE TEMPORARY TABLE conocimiento_import (KEY ix_titulo ({clave}))
+                        SELECT {cols} FROM conocimiento LIMIT 0""")
+        ins = f"INSERT INTO conocimiento_import ({cols}) VALUES ({', '.join(['%s'] * len(CAMPOS_IMPORT))})"
+        valores = list(filas.values())
+        for i in range(0, len(valores), LOTE_IMPORT):
+            cur.executemany(ins, valores[i:i + LOTE_IMPORT])
+
+        # 2) Conteos (<=> compara NULL con NULL)
+        iguales = " AND ".join(f"c.{k} <=> s.{k}" for k in CAMPOS_IMPORT[1:])
+        cur.execute(f"""
+            SELECT COALESCE(SUM(c.id IS NULL), 0),
+                   COALESCE(SUM(c.id IS NOT NULL AND NOT ({iguales})), 0)
+            FROM conocimiento_import s
+            LEFT JOIN conocimiento c ON c.titulo = s.titulo
+        """)
+        nuevos, actualizados = (int(x) for x in cur.fetchone())
+
+        # 3) Update de los cambiados + insert de los nuevos
+        sets = ", ".join(f"c.{k} = s.{k}" for k in CAMPOS_IMPORT[1:])
+        cur.execute(f"""
+            UPDATE conocimiento c
+            JOIN conocimiento_import s ON c.titulo = s.titulo
+            SET {sets}
+            WHERE NOT ({iguales})
+        """)
+        # (ON DUPLICATE KEY: dos títulos que la collation considera iguales, p. ej. por
+        #  mayúsculas, no rompen la transacción; queda el último)
+        cur.execute(f"""
+            INSERT INTO conocimiento ({cols}, vector)
+            SELECT n.*, NULL FROM (
+              SELECT {", ".join(f"s.{k}" for k in CAMPOS_IMPORT)}
+              FROM conocimiento_import s
+              LEFT JOIN conocimiento c ON c.titulo = s.titulo
+              WHERE c.id IS NULL
+            ) AS n
+            ON DUPLICATE KEY UPDATE {", ".join(f"{k} = n.{k}" for k in CAMPOS_IMPORT[1:])}
+        """)
+        registrar_cambios(cur, "conocimiento", select="""
+            SELECT c.id FROM conocimiento c
+            JOIN conocimiento_import s ON c.titulo = s.titulo
+            WHERE c.actualizado >= %s""", params=(inicio,))
+        cur.execute("DROP TEMPORARY TABLE IF EXISTS conocimiento_import")
         conn.commit()
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        if propia:
+            conn.close()
 
-        # 4) Feedback y sincronización de archivo
-        print(Fore.GREEN + f"✅ Importado desde JSON. Nuevos: {created}, Actualizados: {updated}" + Style.RESET_ALL)
-        exportar_a_json()   # normaliza salida
-        listar()
+    return {
+        "nuevos": nuevos,
+        "actualizados": actualizados,
+        "sin_cambios": len(filas) - nuevos - actualizados,
+        "omitidos": omitidos,
+        "segundos": round(time.perf_counter() - t0, 3),
+    }
 
-        # 5) Generar embeddings automáticamente
+def importar_desde_json():
+    try:
+        # 1+2) Leer ARCHIVO_EXPORT ({"news":[...]} o JSON Lines) en streaming
+        #      y hacer el upsert por título en una transacción (ver importar_lote)
+        r = importar_lote(iterar_noticias(ARCHIVO_EXPORT))
+
+        # 3) Feedback y sincronización de archivo (solo si algo cambió; sin relistar toda la tabla)
+        print(Fore.GREEN + f"✅ Importado desde JSON en {r['segundos']}s. Nuevos: {r['nuevos']}, "
+              f"Actualizados: {r['actualizados']}, Sin cambios: {r['sin_cambios']}"
+              + (f", Omitidos (sin título): {r['omitidos']}" if r["omitidos"] else "") + Style.RESET_ALL)
+        if r["nuevos"] or r["actualizados"]:
+            notificar_cambios()  # el backend aplica solo las filas tocadas (conocimiento_cambios)
+            exportar_a_json()   # normaliza salida
+
+        # 4) Generar embeddings automáticamente (solo filas nuevas/cambiadas/sin vector)
         #    (requiere que el venv esté activo y que seed_local_embeddings.py exista en el cwd)
         import subprocess, sys
-        print(Fore.YELLOW + "\n🧩 Generando vectores locales con seed_local_embeddings.py ..." + Style.RESET_ALL)
+        print(Fore.YELLOW + "\n🧩 Generando vectores locales con seed_local_embeddings.py --incremental ..." + Style.RESET_ALL)
         try:
             # Usa el mismo intérprete con el que está corriendo el CRUD (más robusto que 'python' a secas)
-            subprocess.run([sys.executable, "seed_local_embeddings.py"], check=True)
+            subprocess.run([sys.executable, "seed_local_embeddings.py", "--incremental",
+                            "--json", ARCHIVO_EXPORT], check=True)
             print(Fore.GREEN + "✅ Vectores generados correctamente.\n" + Style.RESET_ALL)
         except subprocess.CalledProcessError as e:
             print(Fore.RED + f"❌ Error al generar vectores (exit {e.returncode}). Revisá la consola del seed." + Style.RESET_ALL)
@@ -346,7 +699,7 @@ def importar_desde_json():
             print(Fore.RED + "❌ No se encontró seed_local_embeddings.py en el directorio actual." + Style.RESET_ALL)
 
     except FileNotFoundError:
-        print(Fore.RED + "❌ No encontré noticias.json" + Style.RESET_ALL)
+        print(Fore.RED + f"❌ No encontré {ARCHIVO_EXPORT}" + Style.RESET_ALL)
     except Exception as e:
         print(Fore.RED + f"❌ Error importando JSON: {e}" + Style.RESET_ALL)
 
@@ -361,15 +714,20 @@ def eliminar_todo():
         conn = conectar()
         cur = conn.cursor()
         cur.execute("DELETE FROM conocimiento")   # Borra todos los registros
+        registrar_cambios(cur, "conocimiento", op="reset")
         conn.commit()
         conn.close()
+        notificar_cambios()
 
         print(Fore.GREEN + "✅ Todos los eventos fueron eliminados." + Style.RESET_ALL)
 
-        # Exportar JSON vacío
-        with open("noticias.json", "w", encoding="utf-8") as f:
-            json.dump({"news": []}, f, indent=2, ensure_ascii=False)
-        print(Fore.YELLOW + "📝 noticias.json también fue limpiado." + Style.RESET_ALL)
+        # Exportar JSON vacío (+ marca, así el próximo export sabe que está al día)
+        escribir_noticias(ARCHIVO_EXPORT, [])
+        conn = conectar()
+        cur = conn.cursor()
+        guardar_marca(marca_tabla(cur))
+        conn.close()
+        print(Fore.YELLOW + f"📝 {ARCHIVO_EXPORT} también fue limpiado." + Style.RESET_ALL)
 
     except Exception as e:
         print(Fore.RED + f"❌ Error al eliminar todos los eventos: {e}" + Style.RESET_ALL)
@@ -378,38 +736,54 @@ def eliminar_todo():
 # === Retroalimentación (pulgares) =====================================
 # Tabla: retroalimentacion(id, fecha_creacion, pulgar, pregunta, respuesta, ip_cliente, agente_usuario)
 
-def retro_listar(limit=50, offset=0):
-    """Lista retroalimentación con paginado simple."""
-    try:
-        conn = conectar()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id, fecha_creacion, pulgar, LEFT(pregunta,200), LEFT(respuesta,200), ip_cliente
-            FROM retroalimentacion
-            ORDER BY fecha_creacion DESC
-            LIMIT %s OFFSET %s
-        """, (limit, offset))
-        rows = cur.fetchall()
-        conn.close()
+ANCHOS_RETRO = {"pregunta": 60, "respuesta": 60, "ip_cliente": 18}
+CAMPOS_RETRO = ", ".join(["fecha_creacion", "pulgar"] + [f"LEFT({c}, {n + 1}) AS {c}" for c, n in ANCHOS_RETRO.items()])
+COLUMNAS_RETRO = ["id", "fecha_creacion", "pulgar", "pregunta", "respuesta", "ip_cliente"]
 
-        data = []
-        for (id_, fecha, pulgar, pregunta, respuesta, ip) in rows:
-            data.append([
-                id_,
-                shorten(str(fecha), 19),
-                pulgar,
-                shorten(pregunta, 60),
-                shorten(respuesta, 60),
-                shorten(ip, 18)
-            ])
+def paginas_retro(desde=None, limite=0):
+    """Más recientes primero: (fecha_creacion, id) DESC."""
+    return paginas("retroalimentacion", "fecha_creacion", CAMPOS_RETRO, desc=True, desde=desde, limite=limite)
 
-        print(Fore.MAGENTA + "\n━━━ 📊 Retroalimentación (más recientes primero) ━━━" + Style.RESET_ALL)
-        print(tabulate(
-            data,
-            headers=["ID", "Fecha", "Pulgar", "Pregunta", "Respuesta", "IP"],
-            tablefmt="fancy_grid"
-        ))
-        print(Fore.MAGENTA + f"Mostrando hasta {limit} registros (offset {offset})." + Style.RESET_ALL)
+def clave_retro(id_):
+    """Clave keyset para arrancar EN el registro id_ (None si no existe)."""
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("SELECT fecha_creacion FROM retroalimentacion WHERE id=%s", (id_,))
+    fila = cur.fetchone()
+    conn.close()
+    return (fila[0], id_ + 1) if fila else None    # "antes de (fecha, id+1)" incluye al registro
+
+def retro_listar(desde_id=None):
+    """Lista retroalimentación paginada (keyset); desde_id = arrancar por ese registro hacia atrás."""
+    try:
+        desde = None
+        if desde_id:
+            desde = clave_retro(desde_id)
+            if desde is None:
+                print(Fore.YELLOW + f"ℹ️ No existe un registro con ID {desde_id}." + Style.RESET_ALL)
+                return
+
+        def mostrar(pagina):
+            data = []
+            for r in pagina:
+                data.append([
+                    r["id"],
+                    shorten(str(r["fecha_creacion"]), 19),
+                    r["pulgar"],
+                    cortar(r["pregunta"], 60),
+                    cortar(r["respuesta"], 60),
+                    cortar(r["ip_cliente"], 18)
+                ])
+
+            print(Fore.MAGENTA + "\n━━━ 📊 Retroalimentación (más recientes primero) ━━━" + Style.RESET_ALL)
+            print(tabulate(
+                data,
+                headers=["ID", "Fecha", "Pulgar", "Pregunta", "Respuesta", "IP"],
+                tablefmt="fancy_grid"
+            ))
+
+        if not hojear(paginas_retro(desde), mostrar):
+            print(Fore.MAGENTA + "ℹ️ No hay retroalimentación para mostrar." + Style.RESET_ALL)
     except Exception as e:
         print(Fore.RED + f"❌ Error listando retroalimentación: {e}" + Style.RESET_ALL)
 
@@ -452,30 +826,42 @@ def retro_limpiar_todo():
     except Exception as e:
         print(Fore.RED + f"❌ Error vaciando retroalimentación: {e}" + Style.RESET_ALL)
 
+def retro_minar():
+    """Corre feedback_mining.py (solo procesa lo nuevo desde la última vez) y muestra su reporte."""
+    import subprocess
+    print(Fore.YELLOW + "\n🔎 Agrupando preguntas con pulgar abajo (feedback_mining.py) ..." + Style.RESET_ALL)
+    try:
+        subprocess.run([sys.executable, "feedback_mining.py"], check=True)
+    except subprocess.CalledProcessError as e:
+        print(Fore.RED + f"❌ feedback_mining.py terminó con error (exit {e.returncode})." + Style.RESET_ALL)
+    except FileNotFoundError:
+        print(Fore.RED + "❌ No se encontró feedback_mining.py en el directorio actual." + Style.RESET_ALL)
+
 def menu_retro():
     """Submenú para administrar retroalimentación."""
     while True:
         print(Fore.MAGENTA + "\n=== 📊 Retroalimentación ===" + Style.RESET_ALL)
-        print("1. Listar últimos 50")
-        print("2. Listar con límite y offset")
+        print(f"1. Listar (más recientes primero, de a {PAGINA})")
+        print("2. Listar desde un ID (hacia atrás)")
         print("3. Eliminar por ID")
         print("4. ⚠️ Vaciar toda la tabla")
+        print("5. 🔎 Clusters de preguntas con pulgar abajo (feedback_mining.py)")
         print("0. Volver")
         op = input("Opción: ").strip()
         if op == "1":
-            retro_listar(50, 0)
+            retro_listar()
         elif op == "2":
-            try:
-                limit  = int(input("Límite (ej. 100): ").strip() or "50")
-                offset = int(input("Offset (ej. 0): ").strip() or "0")
-            except:
-                print(Fore.RED + "Valores inválidos." + Style.RESET_ALL)
+            id_txt = input("ID desde el que listar: ").strip()
+            if not id_txt.isdigit():
+                print(Fore.RED + "Valor inválido." + Style.RESET_ALL)
                 continue
-            retro_listar(limit, offset)
+            retro_listar(int(id_txt))
         elif op == "3":
             retro_eliminar_por_id()
         elif op == "4":
             retro_limpiar_todo()
+        elif op == "5":
+            retro_minar()
         elif op == "0":
             break
         else:
@@ -485,6 +871,7 @@ def menu_retro():
 
 # --- Menú principal ---
 def menu():
+    asegurar_esquema()
     while True:
         print(Fore.CYAN + "\n=== 🎛️ CRUD Museo ===" + Style.RESET_ALL)
         print("1. Listar eventos")
@@ -504,7 +891,7 @@ def menu():
             elif op == "2": crear()
             elif op == "3": modificar()
             elif op == "4": eliminar()
-            elif op == "5": exportar_a_json()
+            elif op == "5": exportar_a_json(forzar=True)
             elif op == "6": importar_desde_json()
             elif op == "7": eliminar_todo()
             elif op == "8": menu_retro()
@@ -517,5 +904,29 @@ def menu():
         except Exception as e:
             print(Fore.RED + f"💥 Error inesperado: {e}" + Style.RESET_ALL)
 
+# --- Listados sin menú (para scripts / cron) ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CRUD Museo. Sin argumentos abre el menú interactivo.")
+    sub = parser.add_subparsers(dest="cmd")
+    p_lis = sub.add_parser("listar", help="Lista conocimiento (columnas recortadas) en CSV o JSON.")
+    p_lis.add_argument("--sin-vector", action="store_true", help="Solo filas sin embedding.")
+    p_ret = sub.add_parser("retro", help="Lista retroalimentación (más recientes primero) en CSV o JSON.")
+    p_ret.add_argument("--desde-id", type=int, default=None, help="Arrancar por ese registro hacia atrás.")
+    for p in (p_lis, p_ret):
+        p.add_argument("--formato", choices=("csv", "json"), default="csv")
+        p.add_argument("--limite", type=int, default=0, help="Máximo de filas (0 = todas).")
+    args = parser.parse_args(argv)
+
+    if args.cmd is None:
+        menu()
+    elif args.cmd == "listar":
+        volcar(paginas_conocimiento(sin_vector=args.sin_vector, limite=args.limite),
+               COLUMNAS_LISTADO, args.formato, ANCHOS_CONOCIMIENTO)
+    else:
+        desde = clave_retro(args.desde_id) if args.desde_id else None
+        if args.desde_id and desde is None:
+            sys.exit(f"No existe retroalimentación con ID {args.desde_id}")
+        volcar(paginas_retro(desde, limite=args.limite), COLUMNAS_RETRO, args.formato, ANCHOS_RETRO)
+
 if __name__ == "__main__":
-    menu()
+    main()
@@ -12,8 +12,8 @@ python crud_conocimiento.py
 
 REM === 3️⃣ Generar embeddings automáticamente ===
 echo.
-echo 🧩 Generando vectores locales (seed_local_embeddings.py)...
-python seed_local_embeddings.py
+echo 🧩 Generando vectores locales (seed_local_embeddings.py --incremental)...
+python seed_local_embeddings.py --incremental
 
 REM === 4️⃣ Confirmación visual ===
 echo.
@@ -0,0 +1,204 @@
+# embed_backend.py
+# ======================================================================
+# Carga del modelo de embeddings con backend seleccionable.
+# Lo usan embed_service.py y seed_local_embeddings.py para que ambos
+# generen vectores con EXACTAMENTE el mismo motor.
+#
+# Backends:
+#   - "torch"     → PyTorch (default, el de siempre)
+#   - "onnx"      → ONNX Runtime (fp32), mismo resultado que torch (±1e-6)
+#   - "onnx-int8" → ONNX Runtime con cuantización dinámica int8
+#                   (más rápido y liviano en CPU; vectores muy parecidos)
+#
+# Se elige con la variable de entorno EMBED_BACKEND o con --backend.
+# Los backends ONNX necesitan (opcionales, no están en requirements.txt):
+#   pip install "optimum[onnxruntime]" onnxruntime
+#
+# Comandos:
+#   # 1) Exportar a ONNX (una vez; queda en <modelo>/onnx/model.onnx)
+#   python embed_backend.py export --model_dir <ruta_modelo> [--int8] [--quant avx2]
+#
+#   # 2) Verificar que el backend da los mismos vectores que torch
+#   python embed_backend.py parity --model_dir <ruta_modelo> --backend onnx-int8
+#     → imprime JSON con coseno mínimo/medio entre ambos vectores por texto
+# ======================================================================
+
+import os                      # rutas del modelo / variables de entorno
+import json                    # salida del chequeo de paridad
+import argparse                # CLI export/parity
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Configuración de cuantización de sentence-transformers:
+#   "arm64" | "avx2" | "avx512" | "avx512_vnni"  (según la CPU del servidor)
+DEFAULT_QUANT = os.environ.get("EMBED_ONNX_QUANT", "avx2")
+
+# ----------------- Helpers -----------------
+def backend_por_defecto() -> str:
+    """Backend indicado por EMBED_BACKEND (o "torch")."""
+    b = os.environ.get("EMBED_BACKEND", "torch").strip().lower()
+    if b not in BACKENDS:
+        raise ValueError(f"EMBED_BACKEND inválido: {b!r}. Opciones: {', '.join(BACKENDS)}")
+    return b
+
+def archivo_onnx(backend: str, quant: str = DEFAULT_QUANT) -> str:
+    """Ruta relativa (dentro del modelo) del .onnx que usa cada backend."""
+    if backend == "onnx":
+        return os.path.join("onnx", "model.onnx")
+    return os.path.join("onnx", f"model_qint8_{quant}.onnx")
+
+def _requiere_onnx():
+    """Falla con un mensaje claro si faltan las dependencias opcionales."""
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError(
+            "El backend ONNX necesita dependencias extra: "
+            "pip install \"optimum[onnxruntime]\" onnxruntime"
+        ) from e
+
+def dimension_desde_disco(ruta_modelo: str):
+    """
+    Dimensión del embedding leyendo solo los JSON del modelo (sin cargar pesos):
+    out_features de la última capa Dense si la hay (modules.json), si no el
+    hidden_size del transformer (config.json). None si no se puede deducir.
+    """
+    try:
+        with open(os.path.join(ruta_modelo, "modules.json"), "r", encoding="utf-8") as f:
+            modulos = json.load(f)
+        for mod in reversed(modulos):
+            if str(mod.get("type", "")).endswith(".Dense"):
+                with open(os.path.join(ruta_modelo, mod["path"], "config.json"), "r", encoding="utf-8") as f:
+                    return int(json.load(f)["out_features"])
+        with open(os.path.join(ruta_modelo, "config.json"), "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        for clave in ("hidden_size", "d_model", "dim"):
+            if clave in cfg:
+                return int(cfg[clave])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+# ----------------- Carga -----------------
+def cargar_modelo(ruta_modelo: str, backend: str = "torch", quant: str = DEFAULT_QUANT, threads: int = 0):
+    """
+    Carga el SentenceTransformer SOLO desde disco con el backend pedido.
+    - threads > 0 limita los hilos intra-op (torch o ONNX Runtime).
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inválido: {backend!r}. Opciones: {', '.join(BACKENDS)}")
+
+    if backend == "torch":
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(ruta_modelo, local_files_only=True)
+
+    _requiere_onnx()
+    rel = archivo_onnx(backend, quant)
+    if not os.path.exists(os.path.join(ruta_modelo, rel)):
+        raise FileNotFoundError(
+            f"[ERROR] Falta '{rel}' en {ruta_modelo}. Exportalo con:\n"
+            f"  python embed_backend.py export --model_dir \"{ruta_modelo}\""
+            + (" --int8" if backend == "onnx-int8" else "")
+        )
+
+    model_kwargs = {"file_name": rel.replace(os.sep, "/")}
+    if threads > 0:
+        import onnxruntime as ort
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = threads
+        model_kwargs["session_options"] = so
+    return SentenceTransformer(ruta_modelo, backend="onnx", local_files_only=True, model_kwargs=model_kwargs)
+
+# ----------------- Exportación -----------------
+def exportar_onnx(ruta_modelo: str, int8: bool = False, quant: str = DEFAULT_QUANT):
+    """
+    Exporta el modelo a <modelo>/onnx/model.onnx (si no existe) y,
+    opcionalmente, genera la variante cuantizada int8 (dinámica).
+    """
+    _requiere_onnx()
+    destino = os.path.join(ruta_modelo, archivo_onnx("onnx"))
+    if not os.path.exists(destino):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        print(f"🔁 Exportando a ONNX: {ruta_modelo}")
+        ort_model = ORTModelForFeatureExtraction.from_pretrained(ruta_modelo, export=True, local_files_only=True)
+        ort_model.save_pretrained(os.path.dirname(destino))
+        print(f"✅ ONNX guardado en {destino}")
+    else:
+        print(f"ℹ️ Ya existe {destino}")
+
+    if int8:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        modelo = cargar_modelo(ruta_modelo, "onnx")
+        print(f"🔁 Cuantizando int8 ({quant}) …")
+        export_dynamic_quantized_onnx_model(modelo, quant, ruta_modelo)
+        print(f"✅ int8 guardado en {os.path.join(ruta_modelo, archivo_onnx('onnx-int8', quant))}")
+
+# ----------------- Paridad contra torch -----------------
+def textos_de_muestra(ruta_json: str = "noticias.json", limite: int = 64):
+    """Títulos + inicio del contenido de noticias.json, más algunas preguntas típicas."""
+    textos = [
+        "¿Cuándo se fundó Realicó?",
+        "historia de la biblioteca popular",
+        "primera escuela de Realicó",
+        "cooperativa eléctrica",
+    ]
+    try:
+        with open(ruta_json, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        items = data.get("news", []) if isinstance(data, dict) else data
+        for it in items[:limite]:
+            textos.append(f"{it.get('titulo') or ''}. {(it.get('contenido') or '')[:400]}")
+    except (OSError, ValueError):
+        pass
+    return textos
+
+def verificar_paridad(ruta_modelo: str, backend: str, textos=None, quant: str = DEFAULT_QUANT) -> dict:
+    """
+    Codifica los mismos textos con torch y con `backend` y compara por coseno.
+    Devuelve {"n", "cos_min", "cos_mean", "cos_p05", "ok"} (ok si cos_min >= 0.99).
+    """
+    import numpy as np
+
+    textos = textos or textos_de_muestra()
+    ref = cargar_modelo(ruta_modelo, "torch").encode(textos, convert_to_numpy=True, normalize_embeddings=True)
+    alt = cargar_modelo(ruta_modelo, backend, quant).encode(textos, convert_to_numpy=True, normalize_embeddings=True)
+    cos = np.sum(ref * alt, axis=1)      # ambos normalizados → producto punto = coseno
+    return {
+        "backend": backend,
+        "n": int(len(textos)),
+        "cos_min": round(float(cos.min()), 6),
+        "cos_mean": round(float(cos.mean()), 6),
+        "cos_p05": round(float(np.percentile(cos, 5)), 6),
+        "ok": bool(cos.min() >= 0.99),
+    }
+
+# ----------------- CLI -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backends ONNX del modelo de embeddings.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_exp = sub.add_parser("export", help="Exporta el modelo a ONNX (y opcionalmente int8).")
+    p_exp.add_argument("--model_dir", default=os.environ.get("MODEL_PATH"), required=not os.environ.get("MODEL_PATH"))
+    p_exp.add_argument("--int8", action="store_true", help="Genera también la variante cuantizada int8.")
+    p_exp.add_argument("--quant", default=DEFAULT_QUANT, help="arm64 | avx2 | avx512 | avx512_vnni")
+
+    p_par = sub.add_parser("parity", help="Compara vectores del backend contra torch (coseno).")
+    p_par.add_argument("--model_dir", default=os.environ.get("MODEL_PATH"), required=not os.environ.get("MODEL_PATH"))
+    p_par.add_argument("--backend", default="onnx-int8", choices=BACKENDS[1:])
+    p_par.add_argument("--quant", default=DEFAULT_QUANT)
+    p_par.add_argument("--json", default="noticias.json", help="Corpus de muestra.")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "export":
+        exportar_onnx(args.model_dir, int8=args.int8, quant=args.quant)
+    else:
+        rep = verificar_paridad(args.model_dir, args.backend, textos_de_muestra(args.json), quant=args.quant)
+        print(json.dumps(rep, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
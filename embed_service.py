@@ -12,16 +12,109 @@
 #     Salida:
 #       { "embeddings": [[...],[...],[...]] }
 #
+#   - Salida binaria (opcional, más liviana que JSON):
+#       Header "Accept: application/octet-stream"  → float32
+#       o campo  "format": "f32" | "f16" | "json"  en el cuerpo
+#     Cuerpo: header de 16 bytes + matriz contigua little-endian (count x dim)
+#       [0:4]  magic b"EMB1"
+#       [4]    dtype (1 = float32, 2 = float16)
+#       [5]    flags (bit 0 = vectores normalizados L2)
+#       [6:8]  reservado (0)
+#       [8:12] count (uint32)  → nº de vectores (1 para "text")
+#       [12:16] dim  (uint32)
+#     También se informan en headers: X-Embedding-Dtype/-Count/-Dim/-Normalized.
+#
+#   - Normalización L2 (opcional): con vectores de norma 1 el coseno es un
+#     simple producto punto. EMBED_NORMALIZE=1 la activa por defecto y el
+#     campo "normalize": true|false la pide por request. Las respuestas JSON
+#     incluyen "normalized" para que el cliente sepa qué recibió.
+#     (usar el mismo modo que el seeder: seed_local_embeddings.py --normalize)
+#
+# Arranque:
+#   - EMBED_LAZY_LOAD=1 → abre el puerto enseguida y carga el modelo en segundo
+#     plano (/health "loading" → "ready"; mientras tanto /embed responde 503
+#     con Retry-After y index.js usa BM25). EMBED_WARMUP=0 salta el encode de
+#     calentamiento. La dimensión sale de config.json sin esperar al modelo.
+#   - Desarrollo (Windows/Linux):  python embed_service.py
+#   - Producción (Linux, varios workers, modelo precargado):
+#       gunicorn -c gunicorn.conf.py embed_service:app
+#
 # Endpoints extra:
-#   - GET /health  → estado y metadatos del modelo
-#   - GET /dim     → dimensión del embedding
+#   - GET /health  → estado y metadatos del modelo (incluye stats de caché);
+#                    "status": loading | ready | error y "timings" (import/carga/warm-up)
+#   - GET /dim     → dimensión del embedding (?model=<id> para otro modelo)
+#   - POST /search → embebe la consulta y busca el top-k en el índice en disco
+#       Entrada: { "query": "fundación de Realicó", "k": 10,
+#                  "mode": "auto" | "exact" | "ivf", "nprobe": 8 }
+#       Salida : { "ids": [12, 7, ...], "scores": [0.81, 0.77, ...],
+#                  "mode": "ivf", "scanned": 420, "index_version": "v…", "took_ms": 3.1 }
+#       Varias consultas: "queries": [...] (un solo encode + un solo matmul).
+#       "hybrid": true suma los bonus léxicos de index.js y agrega "hits" con el detalle.
+#       "mode": "bm25" busca solo por palabras (índice léxico, sin modelo).
+#       Si el índice tiene pasajes (seeder --passages), el score de un doc largo
+#       es el de su mejor pasaje y se devuelve "passages" (o "passage" por hit)
+#       con {start, end, sim}: offsets de caracteres sobre `contenido`.
+#     El índice lo exporta el seeder (vector_index.py) y se recarga solo cuando
+#     cambia indice/CURRENT (EMBED_INDEX_DIR; IVF: ver vector_search.py).
+#   - POST /search/reload → fuerza la recarga del índice
+#   - GET /metrics → métricas Prometheus (por proceso, etiqueta pid):
+#       embed_requests_total{endpoint,status}, embed_request_seconds{endpoint},
+#       embed_stage_seconds{stage}  (decode | clean | queue | microbatch |
+#                                    tokenize | forward | search | serialize),
+#       embed_texts_total, embed_tokens_total, embed_text_tokens, embed_truncated_total,
+#       embed_batch_texts, embed_errors_total, caché, cola y micro-batcher.
+#     EMBED_SERVER_TIMING=1 agrega a cada respuesta el header Server-Timing
+#     con las mismas etapas (se ve en las DevTools del navegador / curl -i).
+#
+# Dos modelos a la vez (cambio de modelo sin corte):
+#   - EMBED_SHADOW_MODEL_PATH → carga un segundo modelo (el nuevo) además del
+#     principal; EMBED_SHADOW_BACKEND su backend (default: el mismo).
+#   - /embed acepta "model": <id del espacio> (vector_modelo del seeder, con o
+#     sin "+l2"); sin "model" o desconocido usa el principal. La respuesta
+#     informa "model" (o el header X-Embedding-Model).
+#   - /search embebe la consulta con el modelo del manifest del índice.
+#   - Pasos completos: ver seed_local_embeddings.py (--shadow / --cutover).
+#
+# Caché de embeddings (en memoria, por proceso):
+#   - Clave: (id del modelo, texto ya normalizado por clean_text()). El id incluye
+#     el backend: la misma carpeta con torch y con onnx-int8 no comparte entradas.
+#   - Desalojo por tamaño (LRU) y por antigüedad (TTL).
+#   - EMBED_CACHE_SIZE  → máx. entradas (default 2048; 0 = desactivada)
+#   - EMBED_CACHE_TTL_S → segundos de vida de cada entrada (default 3600)
+#
+# Micro-batching (opcional) para pedidos concurrentes de un solo texto:
+#   - Los { "text": ... } que llegan dentro de una ventana corta se juntan
+#     en UNA llamada a model.encode y se reparte el resultado a cada pedido.
+#   - EMBED_MICROBATCH_MS  → ventana en ms (default 0 = desactivado; sugerido 5–10)
+#   - EMBED_MICROBATCH_MAX → tamaño máx. del lote (default 32)
+#
+# Control de admisión (backpressure, por proceso):
+#   - EMBED_MAX_INFLIGHT      → encodes simultáneos (default 2)
+#   - EMBED_MAX_QUEUE         → pedidos esperando turno (default 16); llena → 429
+#   - EMBED_QUEUE_TIMEOUT_MS  → espera máx. de turno (default 1000); vencida → 503
+#   - EMBED_MAX_TEXTS / EMBED_MAX_CHARS → topes por pedido (default 256 / 200000) → 413
+#   - Los 429/503 traen Retry-After; los pedidos de 1 texto pasan antes que los lotes.
+#   - Header opcional X-Request-Timeout-Ms: plazo que le queda al cliente (no se
+#     espera turno más allá). La respuesta informa X-Queue-Wait-Ms.
 # ======================================================================
 
-from flask import Flask, request, jsonify                 # Framework web y helpers JSON
-from sentence_transformers import SentenceTransformer     # Carga de modelos de SentenceTransformers
+from flask import Flask, Response, request, jsonify, g, has_request_context  # Framework web y helpers JSON
+from embed_backend import cargar_modelo, backend_por_defecto, dimension_desde_disco  # torch / onnx / onnx-int8
+from vector_search import MODOS, PARAMS_HIBRIDO, RELLENO_ID, GestorIndice  # POST /search sobre el índice en disco
+from vector_store import modelo_id                         # id del espacio de embeddings (igual que el seeder)
+from metricas import Registro, CONTENT_TYPE as METRICS_CONTENT_TYPE  # GET /metrics (formato Prometheus)
 import unicodedata                                        # Para normalización opcional de tildes
 import traceback                                          # Para logs de errores legibles
+import struct                                             # Header del formato binario
 import os                                                 # Para rutas del modelo y variables de entorno
+import time                                               # Para TTL de la caché
+import threading                                          # Lock de la caché (Flask atiende en hilos)
+from collections import OrderedDict                       # Orden LRU de la caché
+import queue                                              # Cola del micro-batcher
+import math                                               # Retry-After estimado (segundos enteros)
+from contextlib import contextmanager                     # Turno de encode (control de admisión)
+from concurrent.futures import Future, TimeoutError as FutureTimeout  # Resultado diferido por pedido
+import numpy as np                                        # Vectores en memoria (ya viene con sentence-transformers)
 
 # ----------------------------------------------------------------------
 # Crear app Flask
@@ -41,10 +134,19 @@ RUTA_MODELO_LOCAL = os.environ.get(
     r"C:\Proyectos\museo-asistente\models\paraphrase-multilingual-mpnet-base-v2"
 )
 
+# Backend de inferencia: "torch" (default), "onnx" u "onnx-int8" (ver embed_backend.py)
+EMBED_BACKEND = backend_por_defecto()
+
+# Normalización L2 por defecto de las respuestas (ver encabezado)
+EMBED_NORMALIZE = os.environ.get("EMBED_NORMALIZE", "0").strip().lower() in ("1", "true", "si", "sí")
+
 # ----------------------------------------------------------------------
 # Archivos mínimos esperados dentro del modelo (verificación temprana)
+#  (los .onnx los verifica embed_backend al cargar)
 # ----------------------------------------------------------------------
-REQUERIDOS = ["modules.json", "config.json", "tokenizer.json", "model.safetensors"]
+REQUERIDOS = ["modules.json", "config.json", "tokenizer.json"]
+if EMBED_BACKEND == "torch":
+    REQUERIDOS.append("model.safetensors")
 for nombre in REQUERIDOS:
     ruta = os.path.join(RUTA_MODELO_LOCAL, nombre)       # compone ruta absoluta
     if not os.path.exists(ruta):                         # si falta, aborta con error claro
@@ -54,14 +156,220 @@ for nombre in REQUERIDOS:
         )
 
 # ----------------------------------------------------------------------
-# Carga del modelo (una sola vez al iniciar el servicio)
+# Métricas (GET /metrics, ver metricas.py)
+#  - Por etapa del pedido: decode (JSON), clean (clean_text), queue (espera de
+#    turno), tokenize y forward (dentro de model.encode), search, serialize.
+#  - tokenize se mide envolviendo model.tokenize, que es lo que llama encode por
+#    lote: forward = encode − tokenize (incluye pooling y el paso a numpy).
+#  - Un texto cuenta como truncado si llegó al tope de tokens del modelo
+#    (max_seq_length): lo que pasa de ahí no entra en el vector.
+# ----------------------------------------------------------------------
+EMBED_SERVER_TIMING = os.environ.get("EMBED_SERVER_TIMING", "0").strip().lower() in ("1", "true", "si", "sí")
+
+metricas = Registro()
+M_PEDIDOS = metricas.contador("embed_requests_total", "Pedidos HTTP atendidos.", ("endpoint", "status"))
+M_LATENCIA = metricas.histograma("embed_request_seconds", "Duración total del pedido.", ("endpoint",))
+M_ETAPAS = metricas.histograma("embed_stage_seconds", "Duración de cada etapa del pedido.", ("stage",))
+M_TEXTOS = metricas.contador("embed_texts_total", "Textos recibidos para embeber.", ("endpoint",))
+M_ERRORES = metricas.contador("embed_errors_total", "Pedidos que terminaron en excepción (500).", ("endpoint", "type"))
+M_TOKENS = metricas.contador("embed_tokens_total", "Tokens que pasaron por el modelo.")
+M_TOKENS_TEXTO = metricas.histograma("embed_text_tokens", "Tokens por texto codificado.",
+                                     buckets=(8, 16, 32, 64, 128, 256, 384, 512))
+M_TRUNCADOS = metricas.contador("embed_truncated_total", "Textos que llegaron al tope de tokens del modelo.")
+M_LOTE = metricas.histograma("embed_batch_texts", "Textos por llamada al modelo (forward).",
+                             buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+_medicion = threading.local()       # tokenización del encode en curso (por hilo)
+
+def _etapa(nombre: str, segundos: float):
+    """Registra la duración de una etapa (histograma + Server-Timing del pedido en curso)."""
+    M_ETAPAS.observe(segundos, (nombre,))
+    if has_request_context():
+        etapas = g.setdefault("etapas", {})
+        etapas[nombre] = etapas.get(nombre, 0.0) + segundos
+
+@contextmanager
+def medir(nombre: str):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        _etapa(nombre, time.perf_counter() - t)
+
+def _instrumentar_tokenize(modelo):
+    """Envuelve modelo.tokenize para medir su tiempo y contar tokens / truncados."""
+    original = getattr(modelo, "tokenize", None)
+    if original is None:
+        return
+    def tokenize(textos, *args, **kwargs):
+        t = time.perf_counter()
+        features = original(textos, *args, **kwargs)
+        _medicion.tokenize_s = getattr(_medicion, "tokenize_s", 0.0) + (time.perf_counter() - t)
+        mascara = features.get("attention_mask") if isinstance(features, dict) else None
+        tope = getattr(modelo, "max_seq_length", None)
+        if mascara is not None:
+            largos = mascara.sum(-1).tolist()        # torch o numpy: tokens reales por texto
+            M_TOKENS.inc(n=sum(largos))
+            for n in largos:
+                M_TOKENS_TEXTO.observe(n)
+                if tope and n >= tope:
+                    M_TRUNCADOS.inc()
+        return features
+
+    modelo.tokenize = tokenize
+
+# ----------------------------------------------------------------------
+# Modelos servidos (cambio de modelo sin corte, ver seed_local_embeddings.py --shadow)
+#  - Clave: id del espacio de embeddings (vector_store.modelo_id, sin "+l2"),
+#    el mismo que el seeder guarda en vector_modelo y en el manifest del índice.
+#  - EMBED_SHADOW_MODEL_PATH carga un SEGUNDO modelo (el nuevo) junto al actual:
+#    mientras dura el re-seed en sombra y el cutover, cada cliente pide el
+#    modelo de SU índice con "model" y nadie mezcla espacios.
+# ----------------------------------------------------------------------
+MODELOS = {}
+MODELO_DEFAULT = None          # entrada de MODELOS del modelo principal (None mientras carga)
+model = None                   # SentenceTransformer principal
+
+RUTA_MODELO_SOMBRA = os.environ.get("EMBED_SHADOW_MODEL_PATH", "").strip()
+BACKEND_SOMBRA = os.environ.get("EMBED_SHADOW_BACKEND", EMBED_BACKEND).strip().lower()
+
+# Dimensión leída de config.json (sin cargar pesos): /dim responde aunque el modelo siga cargando
+EMBED_DIM = dimension_desde_disco(RUTA_MODELO_LOCAL)
+
+def registrar_modelo(ruta: str, backend: str, modelo) -> dict:
+    _instrumentar_tokenize(modelo)
+    m = {
+        "id": modelo_id(ruta, backend),
+        "ruta": ruta,
+        "backend": backend,
+        "model": modelo,
+        "dim": modelo.get_sentence_embedding_dimension(),
+    }
+    MODELOS[m["id"]] = m
+    return m
+
+# ----------------------------------------------------------------------
+# Carga del modelo
 #  - local_files_only=True: evita intentos de descarga por internet
 #  - Nota: SentenceTransformer selecciona CPU/GPU automáticamente si hay CUDA
+#  - EMBED_LAZY_LOAD=0 (default): carga al importar, antes de abrir el puerto
+#    (lo que necesita gunicorn con preload_app para compartir los pesos).
+#  - EMBED_LAZY_LOAD=1: el puerto abre enseguida y el modelo carga en un hilo;
+#    /health responde "loading" (con el desglose de tiempos) y /embed o /search
+#    devuelven 503 + Retry-After hasta que esté "ready" (mode=bm25 funciona igual).
+#  - EMBED_WARMUP=1 (default): un encode de prueba al terminar de cargar, para
+#    que la inicialización perezosa de torch no la pague el primer pedido.
 # ----------------------------------------------------------------------
-print(f"[INFO] Cargando modelo desde {RUTA_MODELO_LOCAL} ...")
-model = SentenceTransformer(RUTA_MODELO_LOCAL, local_files_only=True)
-EMBED_DIM = model.get_sentence_embedding_dimension()
-print(f"[OK] Modelo cargado. Dimensión del embedding = {EMBED_DIM}")
+EMBED_LAZY_LOAD = os.environ.get("EMBED_LAZY_LOAD", "0").strip().lower() in ("1", "true", "si", "sí")
+EMBED_WARMUP = os.environ.get("EMBED_WARMUP", "1").strip().lower() in ("1", "true", "si", "sí")
+
+class CargaModelo:
+    """Estado de la carga del modelo ("loading" | "ready" | "error") y sus tiempos."""
+
+    def __init__(self):
+        self.estado = "loading"
+        self.error = None
+        self.tiempos = {}                   # import_s, load_s, shadow_load_s, warmup_s, total_s
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def lista(self) -> bool:
+        return self.estado == "ready"
+
+    def cargar(self):
+        """Carga el/los modelo(s) en el hilo actual (bloquea)."""
+        global model, MODELO_DEFAULT, EMBED_DIM
+        threads = int(os.environ.get("EMBED_TORCH_THREADS", "0"))  # 0 = default de la librería
+        try:
+            t = time.monotonic()
+            import sentence_transformers  # noqa: F401  (el import de torch es buena parte del arranque)
+            self.tiempos["import_s"] = round(time.monotonic() - t, 3)
+
+            print(f"[INFO] Cargando modelo desde {RUTA_MODELO_LOCAL} (backend={EMBED_BACKEND}) ...")
+            t = time.monotonic()
+            principal = registrar_modelo(RUTA_MODELO_LOCAL, EMBED_BACKEND,
+                                         cargar_modelo(RUTA_MODELO_LOCAL, EMBED_BACKEND, threads=threads))
+            self.tiempos["load_s"] = round(time.monotonic() - t, 3)
+            if EMBED_DIM and EMBED_DIM != principal["dim"]:
+                print(f"[WARN] config.json decía dim {EMBED_DIM}; el modelo da {principal['dim']}")
+            EMBED_DIM = principal["dim"]
+            print(f"[OK] Modelo cargado. Dimensión del embedding = {EMBED_DIM}")
+
+            if RUTA_MODELO_SOMBRA:
+                print(f"[INFO] Cargando modelo en sombra desde {RUTA_MODELO_SOMBRA} (backend={BACKEND_SOMBRA}) ...")
+                t = time.monotonic()
+                sombra = registrar_modelo(RUTA_MODELO_SOMBRA, BACKEND_SOMBRA,
+                                          cargar_modelo(RUTA_MODELO_SOMBRA, BACKEND_SOMBRA, threads=threads))
+                self.tiempos["shadow_load_s"] = round(time.monotonic() - t, 3)
+                print(f"[OK] Modelo en sombra {sombra['id']} cargado. Dimensión = {sombra['dim']}")
+
+            if EMBED_WARMUP:
+                t = time.monotonic()
+                for m in MODELOS.values():
+                    m["model"].encode(["calentamiento del modelo"], show_progress_bar=False)
+                self.tiempos["warmup_s"] = round(time.monotonic() - t, 3)
+
+            model, MODELO_DEFAULT = principal["model"], principal
+            self.estado = "ready"
+        except Exception as e:
+            self.estado, self.error = "error", f"{type(e).__name__}: {e}"
+            print("[ERROR] No se pudo cargar el modelo:", self.error)
+            if not EMBED_LAZY_LOAD:
+                raise
+        finally:
+            self.tiempos["total_s"] = round(time.monotonic() - self._t0, 3)
+
+    def iniciar(self):
+        """Arranca la carga en segundo plano (una vez por proceso: tras un fork se relanza)."""
+        if self.lista or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self.cargar, name="carga-modelo", daemon=True)
+                self._thread.start()
+
+    def stats(self) -> dict:
+        info = {"status": self.estado, "lazy": EMBED_LAZY_LOAD, "timings": dict(self.tiempos)}
+        if not self.lista:
+            info["elapsed_s"] = round(time.monotonic() - self._t0, 3)
+        if self.error:
+            info["error"] = self.error
+        return info
+
+carga_modelo = CargaModelo()
+if EMBED_LAZY_LOAD:
+    carga_modelo.iniciar()
+else:
+    carga_modelo.cargar()
+
+def modelo_no_listo():
+    """Respuesta 503 (con Retry-After) mientras el modelo carga o si falló; None si está listo."""
+    if carga_modelo.lista:
+        return None
+    resp = jsonify({"error": "El modelo de embeddings no está listo.", **carga_modelo.stats()})
+    resp.headers["Retry-After"] = "2"
+    return resp, 503
+
+def elegir_modelo(nombre=None) -> dict:
+    """
+    Modelo para un id de espacio (vector_modelo / manifest "model"; acepta el
+    sufijo "+l2"). Sin nombre o desconocido → el modelo principal. Con otro
+    backend (p. ej. "mpnet@onnx-int8" vs "mpnet") se compara por nombre base.
+    """
+    if not nombre or not isinstance(nombre, str):
+        return MODELO_DEFAULT
+    clave = nombre[:-3] if nombre.endswith("+l2") else nombre
+    if clave in MODELOS:
+        return MODELOS[clave]
+    base = clave.split("@")[0]
+    for m in MODELOS.values():
+        if m["id"].split("@")[0] == base:
+            return m
+    return MODELO_DEFAULT
 
 # ----------------------------------------------------------------------
 # Utilidades
@@ -85,73 +393,687 @@ def clean_text(text: str, remove_accents: bool = False) -> str:
     t = " ".join(text.split())               # colapsa espacios/line breaks
     return strip_accents(t) if remove_accents else t
 
-def encode_texts(texts, batch_size: int = 16):
+# ----------------------------------------------------------------------
+# Caché de embeddings (LRU + TTL)
+#  - Las preguntas del kiosco se repiten mucho ("cuando se fundo realico"):
+#    un acierto evita el forward completo del modelo.
+#  - Guarda vectores numpy float32 de solo lectura (no se copian al leer).
+# ----------------------------------------------------------------------
+class EmbeddingCache:
     """
-    Codifica 1 o N textos a embeddings usando el modelo cargado.
-    - batch_size controla memoria/velocidad en lotes.
-    Devuelve:
-      - lista de floats (1 texto) o lista de listas (N textos)
+    Caché en memoria con desalojo por tamaño (LRU) y por TTL.
+    Thread-safe: el servidor de desarrollo de Flask atiende en varios hilos.
     """
+
+    def __init__(self, max_items: int = 2048, ttl_s: float = 3600.0):
+        self.max_items = max(0, int(max_items))
+        self.ttl_s = max(0.0, float(ttl_s))
+        self._data = OrderedDict()          # clave -> (vector, instante de alta)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0                  # desalojos por tamaño
+        self.expirations = 0                # desalojos por TTL
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0
+
+    def get(self, key):
+        """Devuelve el vector cacheado o None (cuenta hit/miss)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            vec, ts = entry
+            if self.ttl_s and (time.monotonic() - ts) > self.ttl_s:
+                del self._data[key]         # vencida: cuenta como miss
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)     # marca como usada recientemente
+            self.hits += 1
+            return vec
+
+    def put(self, key, vec):
+        """Guarda un vector (se marca de solo lectura para compartirlo sin copiar)."""
+        if not self.enabled:
+            return
+        vec.setflags(write=False)
+        with self._lock:
+            self._data[key] = (vec, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)  # saca la menos usada
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "max_items": self.max_items,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+embed_cache = EmbeddingCache(
+    max_items=int(os.environ.get("EMBED_CACHE_SIZE", "2048")),
+    ttl_s=float(os.environ.get("EMBED_CACHE_TTL_S", "3600")),
+)
+
+# ----------------------------------------------------------------------
+# Control de admisión (backpressure)
+#  - Sin tope, un re-seed con lotes grandes o una ráfaga del kiosco meten
+#    muchos model.encode a la vez: todos compiten por los mismos núcleos y la
+#    latencia (y la memoria) se dispara para todos.
+#  - Tope de encodes simultáneos + cola de espera acotada. Lo que no entra
+#    se rechaza ENSEGUIDA (index.js tiene un presupuesto de ~3.5 s por /ask y
+#    ante un error cae a BM25: fallar rápido es mejor que esperar de más).
+#      429 + Retry-After → cola llena
+#      503 + Retry-After → no hubo turno dentro del plazo
+#  - Prioridad: los pedidos de un texto (consultas del kiosco) pasan antes que
+#    los lotes, y los lotes nunca toman el último lugar libre (si hay más de uno).
+#  - Solo cuenta el forward: un acierto de caché no pide turno.
+# ----------------------------------------------------------------------
+class PedidoRechazado(Exception):
+    """Pedido que no se atiende: demasiado grande (413) o servicio saturado (429/503)."""
+
+    def __init__(self, status: int, mensaje: str, retry_after: int = None):
+        super().__init__(mensaje)
+        self.status = status
+        self.retry_after = retry_after
+
+    def respuesta(self):
+        resp = jsonify({"error": str(self), "admission": admision.stats()})
+        if self.retry_after:
+            resp.headers["Retry-After"] = str(self.retry_after)
+        return resp, self.status
+
+class ControlAdmision:
+    """Semáforo con cola acotada y dos prioridades (interactivo / lote). Thread-safe."""
+
+    def __init__(self, max_inflight: int = 2, max_queue: int = 16, timeout_ms: float = 1000.0,
+                 max_texts: int = 256, max_chars: int = 200000):
+        self.max_inflight = max(1, int(max_inflight))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout_s = max(0.0, float(timeout_ms)) / 1000.0
+        self.max_texts = max(1, int(max_texts))
+        self.max_chars = max(1, int(max_chars))
+        self._cond = threading.Condition()
+        self.en_curso = 0
+        self.esperando = {"interactive": 0, "bulk": 0}
+        self.admitidos = 0
+        self.esperaron = 0                  # admitidos que tuvieron que hacer cola
+        self.espera_total_s = 0.0
+        self.espera_max_s = 0.0
+        self.uso_total_s = 0.0              # tiempo con turno tomado (para estimar Retry-After)
+        self.cola_max = 0
+        self.rechazos = {"queue_full": 0, "timeout": 0, "too_large": 0}
+
+    def validar(self, textos):
+        """413 si el pedido supera los topes de textos o de caracteres."""
+        if len(textos) > self.max_texts:
+            self._rechazo("too_large")
+            raise PedidoRechazado(413, f"Máximo {self.max_texts} textos por pedido.")
+        chars = sum(len(t) for t in textos)
+        if chars > self.max_chars:
+            self._rechazo("too_large")
+            raise PedidoRechazado(413, f"Máximo {self.max_chars} caracteres por pedido (llegaron {chars}).")
+
+    def _rechazo(self, motivo: str):
+        with self._cond:
+            self.rechazos[motivo] += 1
+
+    def _puede_pasar(self, lote: bool) -> bool:
+        libres = self.max_inflight - self.en_curso
+        if not lote:
+            return libres > 0
+        reserva = 1 if self.max_inflight > 1 else 0   # un lugar queda para los interactivos
+        return libres > reserva and self.esperando["interactive"] == 0
+
+    def retry_after(self) -> int:
+        """Segundos sugeridos: lo que tardaría en vaciarse la cola al ritmo medio."""
+        uso_medio = self.uso_total_s / self.admitidos if self.admitidos else 0.5
+        cola = sum(self.esperando.values()) + 1
+        return max(1, math.ceil(uso_medio * cola / self.max_inflight))
+
+    @contextmanager
+    def turno(self, lote: bool = False, plazo_s: float = None):
+        """Bloquea hasta tener turno de encode (o lanza PedidoRechazado)."""
+        clase = "bulk" if lote else "interactive"
+        espera = self.timeout_s if plazo_s is None else max(0.0, min(self.timeout_s, plazo_s))
+        t0 = time.monotonic()
+        with self._cond:
+            if not self._puede_pasar(lote):
+                if sum(self.esperando.values()) >= self.max_queue:
+                    self.rechazos["queue_full"] += 1
+                    raise PedidoRechazado(429, "Servicio de embeddings saturado (cola llena).", self.retry_after())
+                if espera <= 0:                 # plazo del cliente ya vencido: no tiene sentido hacer cola
+                    self.rechazos["timeout"] += 1
+                    raise PedidoRechazado(503, "Sin turno de encode dentro del plazo del cliente.", self.retry_after())
+                self.esperando[clase] += 1
+                self.cola_max = max(self.cola_max, sum(self.esperando.values()))
+                try:
+                    ok = self._cond.wait_for(lambda: self._puede_pasar(lote), timeout=espera)
+                finally:
+                    self.esperando[clase] -= 1
+                    self._cond.notify_all()     # sin este interactivo en cola, un lote quizás ya pasa
+                if not ok:
+                    self.rechazos["timeout"] += 1
+                    raise PedidoRechazado(503, f"Sin turno de encode en {espera * 1000:.0f} ms.", self.retry_after())
+                self.esperaron += 1
+            self.en_curso += 1
+            self.admitidos += 1
+            esperado = time.monotonic() - t0
+            self.espera_total_s += esperado
+            self.espera_max_s = max(self.espera_max_s, esperado)
+        _etapa("queue", esperado)
+        t1 = time.monotonic()
+        try:
+            yield esperado
+        finally:
+            with self._cond:
+                self.en_curso -= 1
+                self.uso_total_s += time.monotonic() - t1
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_inflight": self.max_inflight,
+                "max_queue": self.max_queue,
+                "queue_timeout_ms": self.timeout_s * 1000.0,
+                "max_texts": self.max_texts,
+                "max_chars": self.max_chars,
+                "inflight": self.en_curso,
+                "queued": dict(self.esperando),
+                "queue_max": self.cola_max,
+                "admitted": self.admitidos,
+                "waited": self.esperaron,
+                "wait_avg_ms": round(self.espera_total_s / self.admitidos * 1000, 3) if self.admitidos else 0.0,
+                "wait_max_ms": round(self.espera_max_s * 1000, 3),
+                "rejected": dict(self.rechazos),
+            }
+
+admision = ControlAdmision(
+    max_inflight=int(os.environ.get("EMBED_MAX_INFLIGHT", "2")),
+    max_queue=int(os.environ.get("EMBED_MAX_QUEUE", "16")),
+    timeout_ms=float(os.environ.get("EMBED_QUEUE_TIMEOUT_MS", "1000")),
+    max_texts=int(os.environ.get("EMBED_MAX_TEXTS", "256")),
+    max_chars=int(os.environ.get("EMBED_MAX_CHARS", "200000")),
+)
+
+def _plazo_cliente():
+    """Segundos que le quedan al cliente (header X-Request-Timeout-Ms) o None."""
+    if not has_request_context():
+        return None                     # hilo del micro-batcher: usa el timeout de la cola
+    try:
+        ms = float(request.headers.get("X-Request-Timeout-Ms", ""))
+    except ValueError:
+        return None
+    return max(0.0, ms / 1000.0 - (time.monotonic() - g.t_inicio)) if ms > 0 else None
+
+def _encode_array(texts, batch_size: int = 16, m: dict = None):
+    """
+    Llama al modelo `m` (default: el principal) y devuelve una matriz numpy float32 (N x dim).
+    Sin caché: usar encode_cached() salvo que se quiera forzar el forward.
+    """
+    m = m or MODELO_DEFAULT
+    texts = list(texts)
     # SentenceTransformer.encode ya trunca a máx. tokens del modelo.
-    # convert_to_numpy=True y luego .tolist() para JSON-friendly.
     try:
-        vecs = model.encode(
+        _medicion.tokenize_s = 0.0
+        t = time.perf_counter()
+        vecs = m["model"].encode(
             texts,
             batch_size=max(1, int(batch_size)),
             convert_to_numpy=True,
             show_progress_bar=False,     # evitamos barras en consola
-            normalize_embeddings=False   # si quisieras normalizar L2, ponelo True
-        ).tolist()
-        return vecs
+            normalize_embeddings=False   # la caché guarda vectores crudos; ver normalizar_l2()
+        )
+        total, tok = time.perf_counter() - t, _medicion.tokenize_s
+        _etapa("tokenize", tok)
+        _etapa("forward", max(0.0, total - tok))
+        M_LOTE.observe(len(texts))
+        return np.asarray(vecs, dtype=np.float32)
     except Exception as e:
         # Propagamos error con trace para registro
         raise RuntimeError(f"Fallo al codificar: {e}")
 
+def _encode_and_store(pendientes, batch_size: int = 16, m: dict = None, interactivo: bool = None) -> dict:
+    """
+    Codifica textos únicos (sin caché) y los guarda en la caché. Devuelve texto -> vector.
+    Es el único camino al modelo: acá se pide turno al control de admisión
+    (interactivo=None → interactivo si es un solo texto, lote si son varios).
+    """
+    m = m or MODELO_DEFAULT
+    if interactivo is None:
+        interactivo = len(pendientes) == 1
+    with admision.turno(lote=not interactivo, plazo_s=_plazo_cliente()):
+        nuevos = _encode_array(pendientes, batch_size=batch_size, m=m)
+    salida = {}
+    for t, vec in zip(pendientes, nuevos):
+        vec = vec.copy()                 # fila independiente (no retiene la matriz entera)
+        embed_cache.put((m["id"], t), vec)
+        salida[t] = vec
+    return salida
+
+def encode_cached(texts, batch_size: int = 16, m: dict = None):
+    """
+    Codifica una lista de textos YA limpios (salida de clean_text) usando la caché.
+    - m: modelo (ver elegir_modelo); default el principal.
+    - Deduplica dentro del lote: cada texto distinto se codifica una sola vez.
+    - Solo los textos que no están en caché pasan por el modelo.
+    Devuelve matriz numpy float32 (N x dim) en el mismo orden de entrada.
+    """
+    m = m or MODELO_DEFAULT
+    encontrados = {}                     # texto -> vector
+    pendientes = []                      # textos únicos sin caché (orden estable)
+    vistos = set()
+    for t in texts:
+        if t in vistos:
+            continue
+        vistos.add(t)
+        vec = embed_cache.get((m["id"], t))
+        if vec is None:
+            pendientes.append(t)
+        else:
+            encontrados[t] = vec
+
+    if pendientes:
+        encontrados.update(_encode_and_store(pendientes, batch_size=batch_size, m=m))
+
+    return np.stack([encontrados[t] for t in texts]) if texts else np.zeros((0, m["dim"]), np.float32)
+
+def normalizar_l2(mat):
+    """Devuelve una copia con cada fila de norma 1 (filas nulas quedan en 0)."""
+    mat = np.asarray(mat, dtype=np.float32)
+    normas = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.maximum(normas, 1e-12)
+
+def encode_texts(texts, batch_size: int = 16, m: dict = None):
+    """
+    Codifica 1 o N textos a embeddings usando el modelo `m` (default: el principal; con caché).
+    - batch_size controla memoria/velocidad en lotes.
+    Devuelve:
+      - lista de floats (1 texto) o lista de listas (N textos)
+    """
+    single = isinstance(texts, str)
+    mat = encode_cached([texts] if single else list(texts), batch_size=batch_size, m=m)
+    vecs = mat.tolist()                  # .tolist() para JSON-friendly
+    return vecs[0] if single else vecs
+
+# ----------------------------------------------------------------------
+# Micro-batcher: junta pedidos concurrentes de 1 texto en un solo encode
+#  - En CPU el modelo rinde mucho más con lotes de 8–32 que con lotes de 1.
+#  - Un hilo "colector" toma el primer pedido, espera hasta `window_ms`
+#    (o hasta `max_batch` pedidos) y codifica todo junto.
+#  - El hilo se arranca en el primer uso (y se re-arranca si el proceso
+#    fue forkeado), así sirve también con servidores multi-proceso.
+# ----------------------------------------------------------------------
+class MicroBatcher:
+    def __init__(self, window_ms: float = 0.0, max_batch: int = 32, batch_size: int = 32):
+        self.window_s = max(0.0, float(window_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self.batch_size = max(1, int(batch_size))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0                    # nº de llamadas al modelo
+        self.texts = 0                      # nº de pedidos atendidos por lote
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_s > 0
+
+    def _ensure_worker(self):
+        # Los hilos no sobreviven a un fork: si cambió el PID, se crea otro.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()   # cola heredada del padre: descartada
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def encode(self, text: str, m: dict = None, timeout_s: float = 30.0):
+        """Devuelve el vector de `text` (ya limpio), pasando por la caché y el lote."""
+        m = m or MODELO_DEFAULT
+        vec = embed_cache.get((m["id"], text))
+        if vec is not None:
+            return vec
+        self._ensure_worker()
+        fut = Future()
+        self._queue.put((text, fut, m))
+        plazo = _plazo_cliente()
+        try:
+            with medir("microbatch"):        # espera del lote (tokenize/forward corren en el hilo colector)
+                return fut.result(timeout=timeout_s if plazo is None else min(timeout_s, plazo + admision.timeout_s))
+        except FutureTimeout:
+            raise PedidoRechazado(503, "Sin respuesta del micro-batcher dentro del plazo.", admision.retry_after())
+
+    def _collect(self):
+        """Bloquea hasta el primer pedido y junta los que lleguen dentro de la ventana."""
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.window_s
+        while len(items) < self.max_batch:
+            restante = deadline - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=restante))
+            except queue.Empty:
+                break
+        return items
+
+    def _loop(self):
+        while True:
+            items = self._collect()
+            # un encode por modelo (durante un cambio de modelo pueden llegar de los dos)
+            por_modelo = {}
+            for t, fut, m in items:
+                por_modelo.setdefault(m["id"], (m, []))[1].append((t, fut))
+            for m, grupo in por_modelo.values():
+                try:
+                    unicos = list(dict.fromkeys(t for t, _ in grupo))
+                    vecs = _encode_and_store(unicos, batch_size=self.batch_size, m=m, interactivo=True)
+                    self.batches += 1
+                    self.texts += len(grupo)
+                    for t, fut in grupo:
+                        fut.set_result(vecs[t])
+                except Exception as e:
+                    for _, fut in grupo:
+                        if not fut.done():
+                            fut.set_exception(e)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window_s * 1000.0,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+micro_batcher = MicroBatcher(
+    window_ms=float(os.environ.get("EMBED_MICROBATCH_MS", "0")),
+    max_batch=int(os.environ.get("EMBED_MICROBATCH_MAX", "32")),
+)
+
+def encode_one(text: str, batch_size: int = 16, m: dict = None):
+    """Vector (numpy) de un texto limpio: vía micro-batcher si está activo, o directo."""
+    if micro_batcher.enabled:
+        return micro_batcher.encode(text, m)
+    return encode_cached([text], batch_size=batch_size, m=m)[0]
+
+# ----------------------------------------------------------------------
+# Formato binario de respuesta (ver encabezado del archivo)
+# ----------------------------------------------------------------------
+WIRE_MAGIC = b"EMB1"
+WIRE_HEADER = struct.Struct("<4sBB2xII")              # magic, dtype, flags, pad, count, dim = 16 bytes
+WIRE_FLAG_NORMALIZED = 0x01
+WIRE_DTYPES = {"f32": (1, "<f4"), "f16": (2, "<f2")}  # formato -> (código, dtype numpy)
+
+def wire_format(payload: dict) -> str:
+    """
+    Decide el formato de salida: "json", "f32" o "f16".
+    Prioridad: campo "format" del cuerpo > header Accept > JSON.
+    """
+    fmt = str(payload.get("format") or "").strip().lower()
+    if fmt in ("json", "f32", "f16"):
+        return fmt
+    if "application/octet-stream" in request.headers.get("Accept", ""):
+        return "f32"
+    return "json"
+
+def binary_response(mat, fmt: str, normalized: bool = False, modelo: str = None):
+    """Empaqueta una matriz (count x dim) en el formato binario con header."""
+    code, dtype = WIRE_DTYPES[fmt]
+    mat = np.ascontiguousarray(mat, dtype=dtype)
+    count, dim = mat.shape
+    flags = WIRE_FLAG_NORMALIZED if normalized else 0
+    body = WIRE_HEADER.pack(WIRE_MAGIC, code, flags, count, dim) + mat.tobytes()
+    return Response(body, mimetype="application/octet-stream", headers={
+        "X-Embedding-Dtype": fmt,
+        "X-Embedding-Count": str(count),
+        "X-Embedding-Dim": str(dim),
+        "X-Embedding-Normalized": "1" if normalized else "0",
+        "X-Embedding-Model": modelo or MODELO_DEFAULT["id"],
+    })
+
+# Con EMBED_LAZY_LOAD, cada proceso (p. ej. worker de gunicorn) arranca su carga
+# con el primer pedido si todavía no la tenía (los hilos no sobreviven a un fork).
+@app.before_request
+def _asegurar_carga():
+    g.t_inicio = time.monotonic()       # plazo del cliente (X-Request-Timeout-Ms)
+    if EMBED_LAZY_LOAD:
+        carga_modelo.iniciar()
+
+@app.after_request
+def _registrar_pedido(resp):
+    endpoint = request.url_rule.rule if request.url_rule else "otro"
+    total = time.monotonic() - g.t_inicio
+    M_PEDIDOS.inc((endpoint, str(resp.status_code)))
+    M_LATENCIA.observe(total, (endpoint,))
+    etapas = g.get("etapas", {})
+    if "queue" in etapas:
+        resp.headers["X-Queue-Wait-Ms"] = f"{etapas['queue'] * 1000:.1f}"
+    if EMBED_SERVER_TIMING:
+        partes = [f"{k};dur={v * 1000:.2f}" for k, v in etapas.items()]
+        resp.headers["Server-Timing"] = ", ".join(partes + [f"total;dur={total * 1000:.2f}"])
+    return resp
+
 # ----------------------------------------------------------------------
 # Endpoint: POST /embed
 #   - Acepta { "text": "..." }  -> { "embedding": [...] }
 #   - Acepta { "texts": [...] } -> { "embeddings": [[...], ...] }
-#   - Campo opcional: batch_size (int)
+#   - Campos opcionales: batch_size (int), format ("json" | "f32" | "f16"),
+#                        normalize (bool; default EMBED_NORMALIZE)
 # ----------------------------------------------------------------------
 @app.route("/embed", methods=["POST"])
 def embed():
     try:
-        payload = request.get_json(force=True) or {}           # lee JSON (aunque falte header)
+        with medir("decode"):
+            payload = request.get_json(force=True) or {}       # lee JSON (aunque falte header)
         batch_size = payload.get("batch_size", 16)              # batch para lotes
+        fmt = wire_format(payload)                              # json | f32 | f16
+        normalize = bool(payload.get("normalize", EMBED_NORMALIZE))
+        no_listo = modelo_no_listo()                            # EMBED_LAZY_LOAD: todavía cargando
+        if no_listo:
+            return no_listo
+        m = elegir_modelo(payload.get("model"))                # espacio de embeddings pedido
 
         # --- Caso 1: un solo texto ---
         if "text" in payload and payload["text"] is not None:
-            text = clean_text(str(payload["text"]), remove_accents=False)
+            with medir("clean"):
+                text = clean_text(str(payload["text"]), remove_accents=False)
             if not text:
                 return jsonify({"error": "Falta 'text' o está vacío."}), 400
+            M_TEXTOS.inc(("/embed",))
+            admision.validar([text])
 
-            vec = encode_texts(text, batch_size=batch_size)    # devuelve lista de floats
-            # encode_texts devuelve lista también para 1 texto; homogenizamos a vector
-            if isinstance(vec, list) and len(vec) > 0 and isinstance(vec[0], list):
-                vec = vec[0]
-            return jsonify({"embedding": vec})
+            vec = encode_one(text, batch_size=batch_size, m=m)  # numpy (dim,)
+            with medir("serialize"):
+                if normalize:
+                    vec = normalizar_l2(vec)
+                if fmt != "json":
+                    return binary_response(vec[None, :], fmt, normalize, m["id"])
+                return jsonify({"embedding": vec.tolist(), "normalized": normalize, "model": m["id"]})
 
         # --- Caso 2: varios textos ---
         if "texts" in payload and isinstance(payload["texts"], list):
-            # Limpieza mínima de cada string
-            texts = [clean_text(str(x), remove_accents=False) for x in payload["texts"]]
-            # Filtra vacíos (para no reventar encode)
-            texts = [t for t in texts if t]
+            with medir("clean"):
+                # Limpieza mínima de cada string
+                texts = [clean_text(str(x), remove_accents=False) for x in payload["texts"]]
+                # Filtra vacíos (para no reventar encode)
+                texts = [t for t in texts if t]
             if not texts:
                 return jsonify({"error": "'texts' no contiene strings válidos."}), 400
+            M_TEXTOS.inc(("/embed",), len(texts))
+            admision.validar(texts)                            # 413 si es demasiado grande
 
-            vecs = encode_texts(texts, batch_size=batch_size)  # lista de listas
-            return jsonify({"embeddings": vecs})
+            mat = encode_cached(texts, batch_size=batch_size, m=m)  # numpy (N x dim)
+            with medir("serialize"):
+                if normalize:
+                    mat = normalizar_l2(mat)
+                if fmt != "json":
+                    return binary_response(mat, fmt, normalize, m["id"])  # un solo buffer contiguo
+                return jsonify({"embeddings": mat.tolist(), "normalized": normalize, "model": m["id"]})
 
         # Si no vino ni text ni texts → error de uso
         return jsonify({"error": "Debés enviar 'text' (string) o 'texts' (lista)."}), 400
 
+    except PedidoRechazado as e:                # 413 / 429 / 503 sin traza: es carga, no un bug
+        return e.respuesta()
     except Exception as e:
         # Devuelve error 500 con traza para facilitar depuración
+        M_ERRORES.inc(("/embed", type(e).__name__))
         print("[/embed] Exception:", e)
         print(traceback.format_exc())
         return jsonify({"error": f"{e}"}), 500
 
+# ----------------------------------------------------------------------
+# Endpoint: POST /search  → top-k sobre el índice en disco (ver vector_search.py)
+#   - Campos: query (o text) | queries (lista), k (default 10, máx. 200),
+#             mode (auto|exact|ivf|bm25), nprobe
+#   - mode=bm25 → búsqueda léxica (no embebe; scores BM25 normalizados a [0, 1])
+#   - hybrid: true → suma los bonus léxicos de index.js (etiquetas / tokens).
+#       lexical_query(s): texto original del usuario para los bonus (default: query)
+#       params: {sim_threshold, tag_match_bonus, tag_bypass_sim,
+#                overlap_bonus_per_token, overlap_bonus_max}  (default: app.config.json)
+#   - Los scores son cosenos (consulta e índice normalizados L2)
+#   - Con "queries" responde { "results": [ {ids, scores[, hits][, passages]}, ... ], ... }
+# ----------------------------------------------------------------------
+SEARCH_K_MAX = 200
+SEARCH_QUERIES_MAX = 256
+gestor_indice = GestorIndice(os.environ.get("EMBED_INDEX_DIR", "indice"))
+
+def _resultado_busqueda(ids, scores, hits=None, pasajes=None) -> dict:
+    # buscar_lote rellena al final las filas con menos de k candidatos (IVF)
+    n = sum(1 for x in ids if int(x) != RELLENO_ID)
+    r = {"ids": [int(x) for x in ids[:n]], "scores": [round(float(x), 6) for x in scores[:n]]}
+    if hits is not None:
+        r["hits"] = hits
+    if pasajes is not None:
+        r["passages"] = pasajes[:n]
+    return r
+
+@app.route("/search", methods=["POST"])
+def search():
+    try:
+        t0 = time.perf_counter()
+        with medir("decode"):
+            payload = request.get_json(force=True) or {}
+        lote = isinstance(payload.get("queries"), list)
+        crudas = [str(x or "") for x in payload["queries"]] if lote \
+            else [str(payload.get("query") or payload.get("text") or "")]
+        with medir("clean"):
+            queries = [clean_text(q, remove_accents=False) for q in crudas]
+        if not queries or not all(queries):
+            return jsonify({"error": "Falta 'query' (o 'queries' tiene textos vacíos)."}), 400
+        if len(queries) > SEARCH_QUERIES_MAX:
+            return jsonify({"error": f"Máximo {SEARCH_QUERIES_MAX} consultas por pedido."}), 400
+        try:
+            k = max(1, min(int(payload.get("k", 10)), SEARCH_K_MAX))
+            nprobe = payload.get("nprobe")
+            nprobe = None if nprobe is None else max(1, int(nprobe))
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({"error": "'k' y 'nprobe' deben ser números enteros."}), 400
+        mode = str(payload.get("mode") or "auto").strip().lower()
+        if mode not in MODOS:
+            return jsonify({"error": f"'mode' inválido. Opciones: {', '.join(MODOS)}"}), 400
+        hybrid = bool(payload.get("hybrid", False))
+        lexicas = payload.get("lexical_queries") if lote else [payload.get("lexical_query")]
+        if lexicas is None:
+            lexicas = [None] * len(crudas)
+        if not isinstance(lexicas, list) or len(lexicas) != len(crudas):
+            return jsonify({"error": "'lexical_queries' debe ser una lista del mismo largo que 'queries'."}), 400
+        lexicas = [str(x) if x else crudas[i] for i, x in enumerate(lexicas)]
+        try:
+            params = {
+                k_: float(v) for k_, v in (payload.get("params") or {}).items() if k_ in PARAMS_HIBRIDO
+            }
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({"error": "'params' debe ser un objeto con valores numéricos."}), 400
+
+        indice = gestor_indice.actual()
+        if indice is None:
+            return jsonify({"error": "No hay índice de vectores (correr el seeder)."}), 503
+
+        batch_size = payload.get("batch_size", 16)
+        if mode != "bm25" and modelo_no_listo():       # bm25 no necesita el modelo
+            return modelo_no_listo()
+        m = elegir_modelo(indice.manifest.get("model"))    # la consulta, en el espacio del índice
+        if mode == "bm25":                      # solo léxico: no pasa por el modelo
+            Q = None
+        else:
+            M_TEXTOS.inc(("/search",), len(queries))
+            admision.validar(queries)
+            Q = encode_one(queries[0], batch_size=batch_size, m=m)[None, :] if not lote \
+                else encode_cached(queries, batch_size=batch_size, m=m)
+        t1 = time.perf_counter()
+        try:
+            if mode == "bm25":
+                hits, info = indice.buscar_bm25(lexicas, k, params)
+                resultados = [
+                    _resultado_busqueda([h["id"] for h in hs], [h["score"] for h in hs], hs) for hs in hits
+                ]
+            elif hybrid:
+                hits, info = indice.buscar_hibrido_lote(Q, lexicas, k, mode, nprobe, params)
+                resultados = [
+                    _resultado_busqueda([h["id"] for h in hs], [h["score"] for h in hs], hs) for hs in hits
+                ]
+            else:
+                (ids, scores), info = indice.buscar_lote(Q, k, mode, nprobe)
+                pasajes = info.pop("passages", None) or [None] * len(ids)
+                resultados = [_resultado_busqueda(i, s, pasajes=p) for i, s, p in zip(ids, scores, pasajes)]
+        except ValueError as e:                 # dim distinta / IVF no disponible
+            return jsonify({"error": str(e)}), 409
+        t2 = time.perf_counter()
+        _etapa("search", t2 - t1)
+
+        cuerpo = {"results": resultados} if lote else dict(resultados[0])
+        cuerpo.update({
+            **info,
+            "hybrid": hybrid,
+            "model": None if mode == "bm25" or m is None else m["id"],
+            "index_version": indice.version,
+            "took_ms": round((t2 - t0) * 1000, 3),
+            "embed_ms": round((t1 - t0) * 1000, 3),
+            "search_ms": round((t2 - t1) * 1000, 3),
+        })
+        with medir("serialize"):
+            return jsonify(cuerpo)
+
+    except PedidoRechazado as e:
+        return e.respuesta()
+    except Exception as e:
+        M_ERRORES.inc(("/search", type(e).__name__))
+        print("[/search] Exception:", e)
+        print(traceback.format_exc())
+        return jsonify({"error": f"{e}"}), 500
+
+@app.route("/search/reload", methods=["POST"])
+def search_reload():
+    try:
+        indice = gestor_indice.recargar()
+        return jsonify({"ok": indice is not None, "index": gestor_indice.stats()})
+    except Exception as e:
+        print("[/search/reload] Exception:", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
+
 # ----------------------------------------------------------------------
 # Endpoint: GET /health  → chequeo rápido del servicio
 # ----------------------------------------------------------------------
@@ -159,26 +1081,63 @@ def embed():
 def health():
     try:
         info = {
-            "ok": True,
+            "ok": carga_modelo.lista,
+            **carga_modelo.stats(),             # status loading|ready|error + tiempos de carga
+            "pid": os.getpid(),                 # útil con varios workers (gunicorn)
             "model_path": RUTA_MODELO_LOCAL,
+            "backend": EMBED_BACKEND,
+            "normalized": EMBED_NORMALIZE,
             "embedding_dim": EMBED_DIM,
-            "embed_url": "http://127.0.0.1:5001/embed"
+            "model": MODELO_DEFAULT["id"] if MODELO_DEFAULT else modelo_id(RUTA_MODELO_LOCAL, EMBED_BACKEND),
+            "models": {k: {"path": m["ruta"], "backend": m["backend"], "dim": m["dim"]} for k, m in MODELOS.items()},
+            "embed_url": "http://127.0.0.1:5001/embed",
+            "cache": embed_cache.stats(),
+            "micro_batch": micro_batcher.stats(),
+            "admission": admision.stats(),      # encodes en curso, cola, esperas y rechazos
+            "index": gestor_indice.stats()      # None hasta la primera búsqueda
         }
         return jsonify(info)
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+# ----------------------------------------------------------------------
+# Endpoint: GET /metrics  → formato de texto de Prometheus (ver "Métricas")
+#   Lo que ya cuentan la caché, el micro-batcher y el control de admisión se
+#   lee de sus stats() al exportar (no se duplica el conteo).
+# ----------------------------------------------------------------------
+metricas.gauge("embed_model_ready", "1 si el modelo está cargado.", lambda: int(carga_modelo.lista))
+metricas.gauge("embed_cache_hits_total", "Aciertos de la caché de embeddings.",
+               lambda: embed_cache.stats()["hits"], tipo="counter")
+metricas.gauge("embed_cache_misses_total", "Fallos de la caché de embeddings.",
+               lambda: embed_cache.stats()["misses"], tipo="counter")
+metricas.gauge("embed_cache_items", "Entradas en la caché de embeddings.", lambda: embed_cache.stats()["size"])
+metricas.gauge("embed_microbatch_batches_total", "Lotes armados por el micro-batcher.",
+               lambda: micro_batcher.batches, tipo="counter")
+metricas.gauge("embed_inflight", "Encodes en curso.", lambda: admision.stats()["inflight"])
+metricas.gauge("embed_queue_depth", "Pedidos esperando turno de encode.",
+               lambda: {(k,): v for k, v in admision.stats()["queued"].items()}, ("priority",))
+metricas.gauge("embed_rejected_total", "Pedidos rechazados por el control de admisión.",
+               lambda: {(k,): v for k, v in admision.stats()["rejected"].items()}, ("reason",), tipo="counter")
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(metricas.exportar(), content_type=METRICS_CONTENT_TYPE)
+
 # ----------------------------------------------------------------------
 # Endpoint: GET /dim  → devuelve solo la dimensión de embedding
 # ----------------------------------------------------------------------
 @app.route("/dim", methods=["GET"])
 def dim():
-    return jsonify({"embedding_dim": EMBED_DIM})
+    m = elegir_modelo(request.args.get("model"))
+    if m is None:                        # todavía cargando: la de config.json
+        return jsonify({"embedding_dim": EMBED_DIM, "model": modelo_id(RUTA_MODELO_LOCAL, EMBED_BACKEND)})
+    return jsonify({"embedding_dim": m["dim"], "model": m["id"]})
 
 # ----------------------------------------------------------------------
 # Arranque del servidor Flask
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
+    # Servidor de desarrollo (1 proceso). Para producción ver gunicorn.conf.py
     print("[INFO] Servicio de embeddings listo en http://127.0.0.1:5001")
     # host 127.0.0.1 → solo accesible localmente (loopback)
     app.run(host="127.0.0.1", port=5001)
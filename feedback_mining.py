@@ -0,0 +1,336 @@
+# feedback_mining.py
+# ======================================================================
+# Minería de retroalimentación (offline): agrupa las preguntas con pulgar
+# abajo para ver QUÉ temas le faltan al archivo (o no se encuentran bien).
+#
+#   1) Lee la retroalimentación en tramos: MySQL `retroalimentacion` (keyset
+#      por id) o feedback.csv (desde el último offset de bytes). Memoria
+#      acotada aunque haya cientos de miles de filas.
+#   2) Embebe las preguntas por lotes con el modelo local (el mismo del índice).
+#   3) Las agrupa con MiniBatchKMeans.partial_fit (k-means incremental): cada
+#      corrida procesa SOLO lo nuevo desde la anterior. Modelo, contadores,
+#      ejemplos y punto de lectura quedan en --estado (joblib).
+#   4) Reporta los clusters con más pulgares abajo: preguntas de ejemplo y
+#      los docs de `conocimiento` más cercanos al centroide (índice en disco,
+#      ver vector_search.py) con su similitud.
+#        - similitud < min_best_score (app.config.json) → tema que el archivo
+#          no cubre (candidato a agregar)
+#        - similitud alta → el doc existe pero la respuesta no convenció
+#
+# Notas:
+#   - Vectores normalizados (coseno): k-means sobre la esfera.
+#   - Cada pregunta se cuenta en el cluster que le tocó al procesarla; los
+#     centroides se siguen moviendo, así que los conteos viejos son aproximados.
+#   - Hasta juntar INIT_FACTOR x --clusters preguntas no se entrena (se
+#     acumulan en el estado para la próxima corrida).
+#   - index.js escribe TODOS los pulgares en feedback.csv y los mismos en
+#     MySQL: usar una sola fuente (default mysql) para no contar doble.
+#
+# Uso:
+#   python feedback_mining.py --model_dir <ruta_modelo>         # MySQL, solo lo nuevo
+#   python feedback_mining.py --fuente csv --csv feedback.csv
+#   python feedback_mining.py --clusters 80 --top 15 --json reporte_feedback.json
+#   python feedback_mining.py --solo-reporte                    # sin leer nada nuevo
+#   python feedback_mining.py --reset                           # empezar de cero
+# ======================================================================
+
+import os                      # rutas / variables de entorno
+import csv                     # feedback.csv
+import json                    # reporte JSON / app.config.json
+import time                    # tiempos
+import argparse                # flags CLI
+import numpy as np             # vectores / centroides
+
+from embed_backend import BACKENDS, cargar_modelo
+from noticias_io import escribir_atomico
+from vector_index import INDEX_DIR_DEFAULT, cargar_docs
+from vector_store import modelo_id
+
+PULGAR_ABAJO = "abajo"         # así lo guarda index.js (up/down → arriba/abajo)
+INIT_FACTOR = 3                # preguntas por cluster para la inicialización
+EJEMPLOS_POR_CLUSTER = 20      # reservorio de preguntas por cluster (para el reporte)
+
+# ----------------- Fuentes (en tramos) -----------------
+def lotes_mysql(conn, desde_id: int, tam: int, tabla: str = "retroalimentacion"):
+    """(último id, [preguntas]) de a `tam` filas con pulgar abajo, en orden de id."""
+    cur = conn.cursor()
+    ultimo = desde_id
+    try:
+        while True:
+            cur.execute(
+                f"""SELECT id, pregunta FROM {tabla}
+                    WHERE id > %s AND pulgar = %s
+                    ORDER BY id LIMIT %s""",
+                (ultimo, PULGAR_ABAJO, tam),
+            )
+            filas = cur.fetchall()
+            if not filas:
+                return
+            ultimo = filas[-1][0]
+            yield ultimo, [p for _, p in filas]
+    finally:
+        cur.close()
+
+def lotes_csv(ruta: str, desde_byte: int, tam: int):
+    """
+    (offset de bytes, [preguntas]) leyendo feedback.csv desde `desde_byte`.
+    Formato de index.js: "fecha","pulgar","pregunta","respuesta" (sin encabezado).
+    Un registro incompleto al final (escritura en curso) queda para la próxima.
+    """
+    if desde_byte > os.path.getsize(ruta):
+        desde_byte = 0                          # el archivo se rotó/truncó: de nuevo
+    lote, pos_ok, pos, pendiente = [], desde_byte, desde_byte, b""
+    with open(ruta, "rb") as f:
+        f.seek(desde_byte)
+        for linea in f:
+            pendiente += linea
+            pos += len(linea)
+            if pendiente.count(b'"') % 2 or not pendiente.endswith(b"\n"):
+                continue                        # salto de línea dentro de un campo (o final cortado)
+            fila = next(csv.reader([pendiente.decode("utf-8", errors="replace")]), [])
+            pendiente, pos_ok = b"", pos
+            if len(fila) >= 3 and fila[1] == PULGAR_ABAJO:
+                lote.append(fila[2])
+                if len(lote) >= tam:
+                    yield pos_ok, lote
+                    lote = []
+    yield pos_ok, lote                          # avanza el cursor aunque no haya preguntas
+
+# ----------------- Embeddings -----------------
+def limpiar(texto) -> str:
+    return " ".join(str(texto or "").split())
+
+def codificar(modelo, textos, batch_size: int = 64):
+    """Textos → matriz float32 normalizada (N x dim)."""
+    return np.asarray(
+        modelo.encode(textos, batch_size=max(1, batch_size), convert_to_numpy=True,
+                      normalize_embeddings=True, show_progress_bar=False),
+        dtype=np.float32,
+    )
+
+# ----------------- Estado (clusters incrementales) -----------------
+def estado_nuevo(clusters: int, ident: str, seed: int = 0) -> dict:
+    return {
+        "modelo": ident,                # espacio de embeddings (no se mezclan modelos)
+        "clusters": clusters,
+        "seed": seed,
+        "km": None,                     # MiniBatchKMeans (None hasta juntar INIT_FACTOR x k)
+        "inicio": [],                   # [(vecs, textos)] acumulados antes de entrenar
+        "conteo": np.zeros(clusters, dtype=np.int64),
+        "ejemplos": [[] for _ in range(clusters)],    # reservorio: [(texto, vec float16)]
+        "cursor": {"mysql": 0, "csv": 0},
+        "procesadas": 0,
+    }
+
+def cargar_estado(ruta: str):
+    import joblib
+    return joblib.load(ruta) if os.path.exists(ruta) else None
+
+def guardar_estado(estado: dict, ruta: str):
+    """joblib a un temporal + rename: un corte no deja el estado a medias."""
+    import joblib
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    joblib.dump(estado, tmp)
+    os.replace(tmp, ruta)
+
+def _asignar(estado, X, textos, nuevos, rng):
+    etiquetas = estado["km"].predict(X)
+    for x, t, c in zip(X, textos, etiquetas):
+        estado["conteo"][c] += 1
+        nuevos[c] += 1
+        # reservoir sampling: cada pregunta del cluster con la misma probabilidad
+        ej = estado["ejemplos"][c]
+        if len(ej) < EJEMPLOS_POR_CLUSTER:
+            ej.append((t, x.astype(np.float16)))
+        else:
+            j = rng.integers(0, estado["conteo"][c])
+            if j < EJEMPLOS_POR_CLUSTER:
+                ej[j] = (t, x.astype(np.float16))
+
+def agregar(estado: dict, X, textos, nuevos, rng):
+    """partial_fit con el tramo nuevo + conteos/ejemplos por cluster."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    k = estado["clusters"]
+    if estado["km"] is None:
+        estado["inicio"].append((X, list(textos)))
+        if sum(len(t) for _, t in estado["inicio"]) < INIT_FACTOR * k:
+            return
+        X = np.vstack([x for x, _ in estado["inicio"]])
+        textos = [t for _, ts in estado["inicio"] for t in ts]
+        estado["inicio"] = []
+        estado["km"] = MiniBatchKMeans(n_clusters=k, random_state=estado["seed"], n_init=3,
+                                       batch_size=max(256, INIT_FACTOR * k))
+    estado["km"].partial_fit(X)
+    _asignar(estado, X, textos, nuevos, rng)
+
+# ----------------- Reporte -----------------
+def umbral_hueco(ruta: str = "app.config.json") -> float:
+    """min_best_score de app.config.json: por debajo, index.js no da una respuesta segura."""
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return float((json.load(f).get("search") or {}).get("min_best_score", 0.70))
+    except (OSError, ValueError):
+        return 0.70
+
+def titulos_docs(index_dir: str, manifest: dict, ids, conn=None) -> dict:
+    """id → título: docs.jsonl del índice o, si no se exportó, MySQL."""
+    docs = cargar_docs(index_dir, manifest)
+    if docs:
+        buscados = set(ids)
+        return {d["id"]: d.get("titulo") for d in docs if d.get("id") in buscados}
+    if conn is None or not ids:
+        return {}
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, titulo FROM conocimiento WHERE id IN ({', '.join(['%s'] * len(ids))})", tuple(ids))
+    titulos = dict(cur.fetchall())
+    cur.close()
+    return titulos
+
+def reporte(estado: dict, nuevos, indice=None, top: int = 10, vecinos: int = 3, ejemplos: int = 3,
+            index_dir: str = INDEX_DIR_DEFAULT, conn=None) -> list:
+    """Clusters ordenados por pulgares abajo, con ejemplos y docs más cercanos al centroide."""
+    if estado["km"] is None:
+        return []
+    centroides = estado["km"].cluster_centers_.astype(np.float32)
+    centroides /= np.maximum(np.linalg.norm(centroides, axis=1, keepdims=True), 1e-12)
+    orden = [int(c) for c in np.argsort(-estado["conteo"], kind="stable")[:top] if estado["conteo"][c]]
+
+    cercanos = {}
+    if indice is not None and len(indice) and orden:
+        (ids, scores), _ = indice.buscar_lote(centroides[orden], min(vecinos, len(indice)), "exact")
+        cercanos = {c: list(zip(ids[i].tolist(), scores[i].tolist())) for i, c in enumerate(orden)}
+    titulos = titulos_docs(index_dir, indice.manifest, {d for v in cercanos.values() for d, _ in v}, conn) \
+        if cercanos else {}
+
+    salida = []
+    for c in orden:
+        ej = estado["ejemplos"][c]
+        sims = [float(np.dot(v.astype(np.float32), centroides[c])) for _, v in ej]
+        # ejemplos más representativos (más cerca del centroide), sin repetir texto
+        vistos, muestra = set(), []
+        for i in np.argsort(sims)[::-1]:
+            t = ej[i][0]
+            if t.lower() not in vistos:
+                vistos.add(t.lower())
+                muestra.append(t)
+            if len(muestra) >= ejemplos:
+                break
+        salida.append({
+            "cluster": c,
+            "negativos": int(estado["conteo"][c]),
+            "nuevos": int(nuevos[c]),
+            "cohesion": round(float(np.mean(sims)), 4) if sims else None,
+            "ejemplos": muestra,
+            "docs": [{"id": int(d), "titulo": titulos.get(d), "sim": round(float(s), 4)} for d, s in cercanos.get(c, [])],
+        })
+    return salida
+
+def imprimir_reporte(clusters: list, umbral: float):
+    for n, r in enumerate(clusters, 1):
+        mejor = r["docs"][0]["sim"] if r["docs"] else None
+        diag = ("" if mejor is None else
+                "  🕳️ sin doc cercano (candidato a agregar)" if mejor < umbral else
+                "  🔎 hay doc cercano: revisar respuesta/ranking")
+        print(f"\n#{n} cluster {r['cluster']}: {r['negativos']} 👎 ({r['nuevos']} nuevos) | cohesión {r['cohesion']}{diag}")
+        for t in r["ejemplos"]:
+            print(f"   💬 {t[:120]}")
+        for d in r["docs"]:
+            print(f"   📄 {d['sim']:.3f}  [{d['id']}] {(d['titulo'] or '')[:90]}")
+
+# ----------------- Main -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clusters de preguntas con pulgar abajo (offline, incremental).")
+    parser.add_argument("--model_dir", default=os.environ.get("MODEL_PATH",
+                        r"C:/Proyectos/museo-asistente/models/paraphrase-multilingual-mpnet-base-v2"))
+    parser.add_argument("--backend", default=os.environ.get("EMBED_BACKEND", "torch"), choices=BACKENDS)
+    parser.add_argument("--fuente", default="mysql", choices=("mysql", "csv"), help="De dónde leer la retroalimentación.")
+    parser.add_argument("--csv", default="feedback.csv", help="Archivo que escribe index.js (--fuente csv).")
+    parser.add_argument("--estado", default="feedback_mining.joblib", help="Estado entre corridas.")
+    parser.add_argument("--reset", action="store_true", help="Descarta el estado y empieza de cero.")
+    parser.add_argument("--solo-reporte", action="store_true", help="No lee retroalimentación nueva.")
+    parser.add_argument("--clusters", type=int, default=None, help="Cantidad de clusters (default 50; fija al crear el estado).")
+    parser.add_argument("--chunk", type=int, default=2000, help="Preguntas por tramo leído/embebido.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Textos por llamada a model.encode.")
+    parser.add_argument("--checkpoint", type=int, default=20, help="Guardar el estado cada N tramos.")
+    parser.add_argument("--top", type=int, default=10, help="Clusters en el reporte.")
+    parser.add_argument("--vecinos", type=int, default=3, help="Docs más cercanos por cluster.")
+    parser.add_argument("--index-dir", default=INDEX_DIR_DEFAULT, help="Índice en disco (ver vector_index.py).")
+    parser.add_argument("--json", default=None, help="Además, guardar el reporte en este archivo JSON.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="museo")
+    parser.add_argument("--password", default="museo2025")
+    parser.add_argument("--database", default="museo")
+    args = parser.parse_args(argv)
+
+    ident = modelo_id(args.model_dir, args.backend, True)
+    estado = None if args.reset else cargar_estado(args.estado)
+    if estado is not None and estado["modelo"] != ident:
+        parser.error(f"El estado es del modelo {estado['modelo']} (ahora {ident}): usar --reset.")
+    if estado is None:
+        estado = estado_nuevo(max(2, args.clusters or 50), ident, args.seed)
+    elif args.clusters and args.clusters != estado["clusters"]:
+        print(f"ℹ️  El estado ya tiene {estado['clusters']} clusters (--clusters se ignora; --reset para cambiarlo).")
+
+    conn = None
+    if args.fuente == "mysql":
+        import mysql.connector
+        conn = mysql.connector.connect(host=args.host, user=args.user, password=args.password, database=args.database)
+
+    nuevos = np.zeros(estado["clusters"], dtype=np.int64)
+    rng = np.random.default_rng(args.seed + estado["procesadas"])
+    try:
+        # 1) Solo lo nuevo desde la corrida anterior
+        if not args.solo_reporte:
+            cursor = estado["cursor"][args.fuente]
+            lotes = (lotes_mysql(conn, cursor, args.chunk) if args.fuente == "mysql"
+                     else lotes_csv(args.csv, cursor, args.chunk))
+            modelo, leidas, t0 = None, 0, time.perf_counter()
+            for n_tramo, (cursor, preguntas) in enumerate(lotes, 1):
+                textos = [t for t in map(limpiar, preguntas) if t]
+                if textos:
+                    if modelo is None:
+                        print(f"🧠 Cargando modelo: {args.model_dir} ({args.backend})")
+                        modelo = cargar_modelo(args.model_dir, args.backend)
+                        t0 = time.perf_counter()
+                    agregar(estado, codificar(modelo, textos, args.batch_size), textos, nuevos, rng)
+                    leidas += len(textos)
+                    estado["procesadas"] += len(textos)
+                estado["cursor"][args.fuente] = cursor
+                if n_tramo % max(1, args.checkpoint) == 0:
+                    guardar_estado(estado, args.estado)
+                    print(f"📦 {leidas} preguntas nuevas ({leidas / max(1e-9, time.perf_counter() - t0):.1f}/s)")
+            guardar_estado(estado, args.estado)
+            print(f"✅ Preguntas 👎 nuevas: {leidas} | total procesadas: {estado['procesadas']}")
+
+        if estado["km"] is None:
+            faltan = INIT_FACTOR * estado["clusters"] - sum(len(t) for _, t in estado["inicio"])
+            print(f"⏳ Faltan {faltan} preguntas 👎 para entrenar {estado['clusters']} clusters "
+                  "(quedan guardadas; bajar --clusters con --reset si el volumen es chico).")
+            return 0
+
+        # 2) Reporte: clusters con más pulgares abajo + docs más cercanos
+        from vector_search import IndiceBusqueda
+        indice = IndiceBusqueda.desde_disco(args.index_dir, ivf_min=10**12)    # exacto: sin entrenar IVF
+        if indice is None:
+            print(f"⚠️  No hay índice en {args.index_dir}: el reporte sale sin docs cercanos.")
+        elif isinstance(indice.manifest.get("model"), str) and \
+                not indice.manifest["model"].startswith(os.path.basename(os.path.normpath(args.model_dir))):
+            print(f"⚠️  El índice es del modelo {indice.manifest['model']}: las similitudes no son comparables.")
+        clusters = reporte(estado, nuevos, indice, args.top, args.vecinos, index_dir=args.index_dir, conn=conn)
+        umbral = umbral_hueco()
+        print(f"\n━━━ 👎 Top {len(clusters)} clusters de preguntas con pulgar abajo (umbral {umbral}) ━━━")
+        imprimir_reporte(clusters, umbral)
+        if args.json:
+            escribir_atomico(args.json, lambda f: json.dump(
+                {"modelo": ident, "procesadas": estado["procesadas"], "umbral": umbral, "clusters": clusters},
+                f, ensure_ascii=False, indent=2))
+            print(f"\n💾 Reporte en {args.json}")
+        return 0
+    finally:
+        if conn is not None:
+            conn.close()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+# gunicorn.conf.py
+# ======================================================================
+# Modo producción del servicio de embeddings (Linux, gunicorn).
+#
+#   gunicorn -c gunicorn.conf.py embed_service:app
+#
+# Qué resuelve frente a `python embed_service.py` (servidor de desarrollo):
+#   - Varios procesos (workers) atendiendo /embed en paralelo.
+#   - preload_app=True: el SentenceTransformer se carga UNA sola vez en el
+#     proceso master; los workers se crean con fork() y comparten los pesos
+#     del modelo copy-on-write (no se duplican ~1.1 GB por worker).
+#   - Cada worker fija sus hilos de torch (intra-op) para que la suma
+#     de todos no sobre-suscriba los núcleos de la máquina.
+#
+# Variables de entorno:
+#   EMBED_BIND            → host:puerto (default 127.0.0.1:5001)
+#   EMBED_WORKERS         → nº de procesos (default 2)
+#   EMBED_WORKER_THREADS  → hilos HTTP por worker (default 4; permiten que el
+#                           micro-batcher junte pedidos dentro de cada worker)
+#   EMBED_TORCH_THREADS   → hilos de torch por worker
+#                           (default: núcleos / EMBED_WORKERS, mínimo 1)
+#   EMBED_TIMEOUT_S       → timeout de gunicorn por request (default 120)
+#   EMBED_BACKEND         → torch | onnx | onnx-int8 (ver embed_backend.py)
+#   EMBED_LAZY_LOAD       → 1 = cada worker abre el puerto enseguida y carga su
+#                           modelo en segundo plano (sin preload: no comparte
+#                           pesos, pero un reinicio no deja el puerto cerrado)
+#
+# Nota: gunicorn no corre en Windows; ahí seguí usando embed_service.py.
+# ======================================================================
+
+import gc                     # gc.freeze() antes del fork (mejor copy-on-write)
+import os                     # variables de entorno / nº de núcleos
+
+# ----------------------------------------------------------------------
+# Procesos y hilos
+# ----------------------------------------------------------------------
+bind = os.environ.get("EMBED_BIND", "127.0.0.1:5001")
+workers = max(1, int(os.environ.get("EMBED_WORKERS", "2")))
+worker_class = "gthread"
+threads = max(1, int(os.environ.get("EMBED_WORKER_THREADS", "4")))
+timeout = int(os.environ.get("EMBED_TIMEOUT_S", "120"))
+# ONNX Runtime no es fork-safe (sus hilos no sobreviven al fork): con los
+# backends ONNX cada worker carga su propia copia (int8 ≈ 1/4 del tamaño).
+# Con EMBED_LAZY_LOAD tampoco: la carga en segundo plano es por worker.
+preload_app = not os.environ.get("EMBED_BACKEND", "torch").lower().startswith("onnx") \
+    and os.environ.get("EMBED_LAZY_LOAD", "0").strip().lower() not in ("1", "true", "si", "sí")
+
+TORCH_THREADS = max(1, int(os.environ.get(
+    "EMBED_TORCH_THREADS",
+    str(max(1, (os.cpu_count() or 1) // workers)),
+)))
+
+# Las librerías de BLAS/OpenMP leen estas variables al inicializarse: las
+# fijamos ANTES de que embed_service importe torch (preload) para que el
+# master y los workers hereden el mismo tope.
+os.environ.setdefault("OMP_NUM_THREADS", str(TORCH_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(TORCH_THREADS))
+os.environ.setdefault("EMBED_TORCH_THREADS", str(TORCH_THREADS))  # lo lee embed_backend (ONNX)
+
+# ----------------------------------------------------------------------
+# Hooks de gunicorn
+# ----------------------------------------------------------------------
+def when_ready(server):
+    """
+    El master ya importó embed_service (modelo cargado).
+    gc.freeze() saca esos objetos del recolector: así el GC de cada worker
+    no "toca" sus páginas y siguen compartidas tras el fork.
+    """
+    gc.freeze()
+    server.log.info(f"[embed] master listo; {workers} workers x {TORCH_THREADS} hilos torch")
+
+def post_fork(server, worker):
+    """En cada worker recién creado: fija los hilos intra-op de torch."""
+    import torch
+    torch.set_num_threads(TORCH_THREADS)
+    server.log.info(f"[embed] worker {worker.pid}: torch.set_num_threads({TORCH_THREADS})")
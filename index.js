@@ -147,6 +147,12 @@ const OVERLAP_BONUS_PER_TOKEN  = Number(APP?.search?.overlap_bonus_per_token ??
 const OVERLAP_BONUS_MAX        = Number(APP?.search?.overlap_bonus_max       ?? 0.00)
 const TAG_MATCH_BONUS          = Number(APP?.search?.tag_match_bonus         ?? 0.04)
 const TAG_BYPASS_SIM           = Number(APP?.search?.tag_bypass_sim          ?? 0.70)
+// Búsqueda en el servicio Python (POST /search: embebe + top-k en un solo viaje).
+// Desactivada por defecto; si falla se usa la búsqueda local de siempre.
+const SEARCH_REMOTE     = ['1','true'].includes(String(process.env.SEARCH_REMOTE ?? APP?.search?.remote ?? false).toLowerCase())
+const SEARCH_URL        = process.env.SEARCH_URL ?? APP?.search?.url ?? EMBED_URL.replace(/\/embed$/, '/search')
+const SEARCH_REMOTE_K   = Math.max(1, Number(APP?.search?.remote_candidates ?? 50))
+const SEARCH_REMOTE_MODE = String(APP?.search?.remote_mode ?? 'auto')
 
 // Intents / ranking extra
 const INTENTS   = Array.isArray(APP?.intents) ? APP.intents : []
@@ -183,53 +189,344 @@ app.get('/', (_req,res)=> res.sendFile(path.join(__dirname, 'public', 'index.htm
 // Caches
 let DOCS  = []
 let VDOCS = []
+let VDOCS_BY_ID = new Map()   // id → item de VDOCS (para resolver los ids de /search)
+let DOCS_BY_ID  = new Map()   // id → item de DOCS (hits BM25: no necesitan vector)
+let LEXICON     = null        // índice léxico del índice en disco (lexico.json) → BM25
+
+// Registro de cambios (conocimiento_cambios, lo escriben el CRUD y el seeder; ver
+// vector_store.py): versión creciente por fila tocada. La recarga delta aplica solo
+// lo posterior a CHANGE_VERSION. Las versiones se asignan al insertar pero se ven al
+// hacer commit, así que se relee una ventana de CHANGE_OVERLAP versiones hacia atrás
+// y se saltean las ya aplicadas (RECENT_VERSIONS).
+const CHANGES_T      = 'conocimiento_cambios'
+const CHANGE_OVERLAP = 64
+const DELTA_MAX_ROWS = Math.max(1, Number(APP?.cache?.delta_max_rows ?? 2000))  // más cambios → recarga completa
+const DELTA_POLL_MS  = Number(APP?.cache?.delta_poll_ms ?? 0)                   // 0 = solo a pedido
+let CHANGE_VERSION  = null      // null = sin registro de cambios (solo recarga completa)
+let RECENT_VERSIONS = new Set()
+
+// BLOB little-endian (f32 = copia directa; f16 = conversión) → Float32Array
+function vecFromBlob(buf, dtype='f32'){
+  if (dtype === 'f16'){
+    const out = new Float32Array(buf.length / 2)
+    for (let i = 0; i < out.length; i++) out[i] = halfToFloat(buf.readUInt16LE(i*2))
+    return out
+  }
+  return new Float32Array(buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.length))
+}
 
-// Carga cache desde MySQL
+// Índice de vectores en disco (lo exporta seed_local_embeddings.py / vector_index.py):
+//   indice/CURRENT → versión activa; indice/<versión>/vectors.f32 + manifest.json
+// Se lee la matriz entera de una vez y cada doc usa una vista (subarray) sin copiar.
+// Si el seeder corrió con --passages, pasajes.f32 trae vectores de tramos de los docs
+// largos (offsets de caracteres sobre `contenido` en manifest.passages).
+const INDEX_DIR = path.join(__dirname, String(APP?.index?.dir ?? 'indice'))
+let INDEX_VERSION = null
+// Espacio de embeddings de los vectores cargados (vector_modelo del seeder / "model" del
+// manifest): se manda en cada /embed para que, durante un cambio de modelo con
+// embed_service sirviendo dos (EMBED_SHADOW_MODEL_PATH), la consulta use el de los docs.
+let EMBED_MODEL = null
+
+function loadVectorIndex(){
+  try{
+    const version = fs.readFileSync(path.join(INDEX_DIR, 'CURRENT'), 'utf-8').trim()
+    if (!version) return null
+    const vdir = path.join(INDEX_DIR, version)
+    const manifest = JSON.parse(fs.readFileSync(path.join(vdir, 'manifest.json'), 'utf-8'))
+    const buf = fs.readFileSync(path.join(vdir, 'vectors.f32'))
+    const mat = (buf.byteOffset % 4 === 0)
+      ? new Float32Array(buf.buffer, buf.byteOffset, buf.length / 4)
+      : new Float32Array(buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.length))
+    const dim = Number(manifest.dim)
+    const byId = new Map()
+    manifest.ids.forEach((id, i)=> byId.set(id, {
+      vec : mat.subarray(i * dim, (i + 1) * dim),   // ya normalizado (norma 1)
+      hash: manifest.hashes?.[i] ?? null,
+    }))
+    // Índice léxico (BM25 + etiquetas) armado por el seeder; opcional
+    let lexicon = null
+    if (manifest.lexical_file){
+      try{
+        const lex = JSON.parse(fs.readFileSync(path.join(vdir, manifest.lexical_file), 'utf-8'))
+        lexicon = { ...lex, ids: manifest.ids, docLen: Float32Array.from(lex.doc_len) }
+      }catch(e){
+        console.warn('[CACHE] No pude leer el índice léxico:', e?.message || e)
+      }
+    }
+    // Pasajes de docs largos (opcional): id del doc → [{ vec, start, end }]
+    const passages = new Map()
+    const P = manifest.passages
+    if (P?.count){
+      try{
+        const pbuf = fs.readFileSync(path.join(vdir, P.file))
+        const pmat = (pbuf.byteOffset % 4 === 0)
+          ? new Float32Array(pbuf.buffer, pbuf.byteOffset, pbuf.length / 4)
+          : new Float32Array(pbuf.buffer.slice(pbuf.byteOffset, pbuf.byteOffset + pbuf.length))
+        for (let j = 0; j < P.count; j++){
+          const id = manifest.ids[P.rows[j]]
+          if (!passages.has(id)) passages.set(id, [])
+          passages.get(id).push({ vec: pmat.subarray(j * dim, (j + 1) * dim), start: P.starts[j], end: P.ends[j] })
+        }
+      }catch(e){
+        console.warn('[CACHE] No pude leer los pasajes:', e?.message || e)
+      }
+    }
+    return { version, manifest, byId, lexicon, passages }
+  }catch{
+    return null
+  }
+}
+
+// Fila de MySQL → vector normalizado (BLOB binario o JSON viejo). null si no tiene.
+function rowToVec(r, C){
+  const blob = r[C.blob]
+  if (blob && blob.length){
+    const vec = vecFromBlob(blob, r[C.dtype])
+    return r[C.normed] ? vec : l2Normalize(vec)
+  }
+  const raw = r[C.vector]
+  const arr = typeof raw === 'string' ? JSON.parse(raw) : raw
+  if (Array.isArray(arr) && arr.length){
+    const vec = Float32Array.from(arr)
+    return r[C.normed] ? vec : l2Normalize(vec)
+  }
+  return null
+}
+
+function mostFrequent(values){
+  const counts = new Map()
+  for (const v of values) counts.set(v, (counts.get(v) ?? 0) + 1)
+  let best = null, n = 0
+  for (const [v, c] of counts) if (c > n){ best = v; n = c }
+  return best
+}
+
+// Columnas de `conocimiento` (schema.map.json puede renombrarlas)
+const KNOWLEDGE_T = 'conocimiento'
+function knowledgeColumns(){
+  return {
+    id     : TCONF?.id      ?? 'id',
+    title  : TCONF?.title   ?? 'titulo',
+    content: TCONF?.content ?? 'contenido',
+    date   : TCONF?.date    ?? 'fecha_evento',
+    image  : TCONF?.image   ?? 'imagen_url',
+    tags   : TCONF?.tags    ?? 'etiquetas',
+    source : TCONF?.source  ?? 'fuente_url',
+    vector : TCONF?.vector  ?? 'vector',
+    blob   : TCONF?.vector_blob  ?? 'vector_blob',
+    dtype  : TCONF?.vector_dtype ?? 'vector_dtype',
+    normed : TCONF?.vector_norm  ?? 'vector_norm',
+    hash   : TCONF?.text_hash    ?? 'texto_hash',
+    model  : TCONF?.vector_model ?? 'vector_modelo',
+  }
+}
+const knowledgeMeta    = (C)=> [C.id, C.title, C.content, C.date, C.image, C.tags, C.source]
+const knowledgeVecCols = (C)=> [C.vector, C.blob, C.dtype, C.normed, C.model]
+
+// Fila de MySQL → doc base (sin vector) con su léxico precalculado
+function rowToDoc(r, C){
+  return withLexicon({
+    id          : r[C.id],
+    titulo      : r[C.title],
+    contenido   : r[C.content] ?? '',
+    fecha_evento: r[C.date],
+    imagen_url  : r[C.image] ?? '',
+    etiquetas   : r[C.tags] ?? '',
+    fuente_url  : r[C.source] ?? '',
+  })
+}
+
+// Carga cache desde MySQL (+ índice en disco si existe)
 async function loadKnowledgeCache(){
   console.log('[CACHE] Cargando conocimiento desde MySQL…')
   const conn = await mysql.createConnection(DB)
   try{
-    const T = 'conocimiento'
-    const C = {
-      id     : TCONF?.id      ?? 'id',
-      title  : TCONF?.title   ?? 'titulo',
-      content: TCONF?.content ?? 'contenido',
-      date   : TCONF?.date    ?? 'fecha_evento',
-      image  : TCONF?.image   ?? 'imagen_url',
-      tags   : TCONF?.tags    ?? 'etiquetas',
-      source : TCONF?.source  ?? 'fuente_url',
-      vector : TCONF?.vector  ?? 'vector',
+    const T = KNOWLEDGE_T
+    const C = knowledgeColumns()
+    const meta    = knowledgeMeta(C)
+    const vecCols = knowledgeVecCols(C)
+    // versión del registro de cambios ANTES de leer filas: lo que se cambie
+    // mientras carga se vuelve a aplicar en la próxima recarga delta
+    const changes = await readChangeVersion(conn)
+    const select = (cs)=> conn.execute(`SELECT ${cs.join(', ')} FROM ${T} ORDER BY ${C.date} ASC`)
+
+    // 1) Con índice en disco: solo metadatos + hash (sin vectores)
+    const idx = loadVectorIndex()
+    let rows = null
+    if (idx){
+      try{ rows = (await select([...meta, C.hash]))[0] }
+      catch(e){ if (e?.code !== 'ER_BAD_FIELD_ERROR') throw e }
+    }
+    // 2) Sin índice (o tabla vieja): todo desde MySQL, como antes
+    const conIndice = Boolean(rows)
+    if (!conIndice){
+      try{
+        // Vector binario (vector_blob) si la tabla ya tiene las columnas nuevas (ver vector_store.py)
+        rows = (await select([...meta, ...vecCols]))[0]
+      }catch(e){
+        if (e?.code !== 'ER_BAD_FIELD_ERROR') throw e
+        rows = (await select([...meta, C.vector]))[0]
+      }
     }
-    const cols = [C.id, C.title, C.content, C.date, C.image, C.tags, C.source, C.vector]
-    const [rows] = await conn.execute(`SELECT ${cols.join(', ')} FROM ${T} ORDER BY ${C.date} ASC`)
 
-    DOCS = []
-    VDOCS = []
-    for (const r of rows){
-      const base = {
-        id          : r[C.id],
-        titulo      : r[C.title],
-        contenido   : r[C.content] ?? '',
-        fecha_evento: r[C.date],
-        imagen_url  : r[C.image] ?? '',
-        etiquetas   : r[C.tags] ?? '',
-        fuente_url  : r[C.source] ?? '',
+    // 3) Filas nuevas/cambiadas desde la última exportación: sus vectores vienen de MySQL
+    const sueltos = new Map()
+    if (conIndice){
+      const faltan = rows
+        .filter(r => { const e = idx.byId.get(r[C.id]); return !e || e.hash !== r[C.hash] })
+        .map(r => r[C.id])
+      for (let i = 0; i < faltan.length; i += 500){
+        const ids = faltan.slice(i, i + 500)
+        const [vrows] = await conn.query(
+          `SELECT ${[C.id, ...vecCols].join(', ')} FROM ${T} WHERE ${C.id} IN (?)`, [ids])
+        for (const r of vrows){ try{ sueltos.set(r[C.id], rowToVec(r, C)) }catch{} }
       }
-      DOCS.push(base)
+    }
+
+    const docs = []
+    const vdocs = []
+    for (const r of rows){
+      const base = rowToDoc(r, C)
+      docs.push(base)
       try{
-        const raw = r[C.vector]
-        const arr = typeof raw === 'string' ? JSON.parse(raw) : raw
-        if (Array.isArray(arr) && arr.length){
-          VDOCS.push({ ...base, vec: Float32Array.from(arr) })
+        // Todos los vectores quedan con norma 1 (índice y seeder --normalize ya vienen así):
+        // la búsqueda hace solo producto punto.
+        let vec = null
+        let passages = null
+        if (conIndice){
+          vec = sueltos.has(base.id) ? sueltos.get(base.id) : idx.byId.get(base.id)?.vec
+          // pasajes solo si el doc no cambió desde la exportación (offsets vigentes)
+          if (!sueltos.has(base.id)) passages = idx.passages.get(base.id) ?? null
+        } else {
+          vec = rowToVec(r, C)
         }
+        if (vec && vec.length) vdocs.push(withPassages(withLexicon({ ...base, vec }, base._lex), passages))
+      }catch{}
+    }
+    // Swap atómico: las búsquedas en curso siguen con los arrays anteriores
+    DOCS  = docs
+    VDOCS = vdocs
+    VDOCS_BY_ID = new Map(vdocs.map(d => [d.id, d]))
+    DOCS_BY_ID  = new Map(docs.map(d => [d.id, d]))
+    LEXICON     = conIndice ? idx.lexicon : null
+    INDEX_VERSION = conIndice ? idx.version : null
+    EMBED_MODEL   = conIndice ? (typeof idx.manifest.model === 'string' ? idx.manifest.model : null)
+                              : mostFrequent(rows.map(r => r[C.model]).filter(Boolean))
+    CHANGE_VERSION  = changes.version
+    RECENT_VERSIONS = changes.recent
+    console.log(`[CACHE] DOCS: ${DOCS.length} | VDOCS: ${VDOCS.length}` +
+      (conIndice ? ` | índice ${idx.version} (${sueltos.size} vectores desde MySQL)` : '') +
+      (conIndice && idx.passages.size ? ` | pasajes de ${idx.passages.size} docs` : '') +
+      (LEXICON ? ` | léxico ${LEXICON.vocab.length} términos` : ''))
+  } finally {
+    await conn.end()
+  }
+}
+
+// Versión actual del registro de cambios + las últimas CHANGE_OVERLAP (ya reflejadas)
+async function readChangeVersion(conn){
+  try{
+    const [rows] = await conn.query(
+      `SELECT version FROM ${CHANGES_T} ORDER BY version DESC LIMIT ?`, [CHANGE_OVERLAP])
+    const recent = new Set(rows.map(r => Number(r.version)))
+    return { version: rows.length ? Number(rows[0].version) : 0, recent }
+  }catch(e){
+    if (e?.code !== 'ER_NO_SUCH_TABLE') throw e
+    return { version: null, recent: new Set() }
+  }
+}
+
+// Recarga delta: trae de MySQL solo las filas anotadas en el registro de cambios
+// desde la última versión aplicada y arma arrays nuevos (swap atómico, como la carga
+// completa; las búsquedas en curso siguen con los anteriores). Un "reset", demasiados
+// cambios o un registro podado/inexistente → recarga completa.
+async function applyKnowledgeDelta(){
+  const r = CHANGE_VERSION === null
+    ? { mode:'full', reason:'sin registro de cambios' }
+    : await applyChangeLog()
+  if (r.mode === 'full') await loadKnowledgeCache()
+  return r
+}
+async function applyChangeLog(){
+  const conn = await mysql.createConnection(DB)
+  try{
+    const T = KNOWLEDGE_T
+    const C = knowledgeColumns()
+    // lo anterior a CHANGE_VERSION ya se podó (ver asegurar_tabla_cambios) → no hay cómo saber qué cambió
+    const [[{ minv }]] = await conn.query(`SELECT MIN(version) AS minv FROM ${CHANGES_T}`)
+    if (CHANGE_VERSION > 0 && minv !== null && Number(minv) > CHANGE_VERSION + 1) return { mode:'full', reason:'registro podado' }
+    const [log] = await conn.query(
+      `SELECT version, doc_id, op FROM ${CHANGES_T} WHERE version > ? ORDER BY version LIMIT ?`,
+      [Math.max(0, CHANGE_VERSION - CHANGE_OVERLAP), DELTA_MAX_ROWS + CHANGE_OVERLAP + 1])
+    if (log.length > DELTA_MAX_ROWS + CHANGE_OVERLAP) return { mode:'full', reason:`más de ${DELTA_MAX_ROWS} cambios` }
+    const pending = log.filter(r => !RECENT_VERSIONS.has(Number(r.version)))
+    if (pending.some(r => r.op === 'reset')) return { mode:'full', reason:'cambio masivo' }
+    if (!pending.length) return { mode:'delta', changed:0, version:CHANGE_VERSION }
+
+    // Filas vigentes de los ids tocados (las que ya no están = borradas)
+    const ids = [...new Set(pending.map(r => r.doc_id).filter(id => id !== null))]
+    const rows = []
+    for (let i = 0; i < ids.length; i += 500){
+      const part = ids.slice(i, i + 500)
+      const pick = (cs)=> conn.query(`SELECT ${cs.join(', ')} FROM ${T} WHERE ${C.id} IN (?)`, [part])
+      try{ rows.push(...(await pick([...knowledgeMeta(C), ...knowledgeVecCols(C)]))[0]) }
+      catch(e){
+        if (e?.code !== 'ER_BAD_FIELD_ERROR') throw e
+        rows.push(...(await pick([...knowledgeMeta(C), C.vector]))[0])
+      }
+    }
+
+    const touched = new Set(ids)
+    const docs  = DOCS.filter(d => !touched.has(d.id))
+    const vdocs = VDOCS.filter(d => !touched.has(d.id))
+    for (const r of rows){
+      const base = rowToDoc(r, C)
+      docs.push(base)
+      try{
+        // vector desde MySQL (como los "sueltos" de la carga completa); sin pasajes:
+        // los offsets del índice en disco pueden no valer para el texto nuevo
+        const vec = rowToVec(r, C)
+        if (vec && vec.length) vdocs.push(withLexicon({ ...base, vec }, base._lex))
       }catch{}
     }
-    console.log(`[CACHE] DOCS: ${DOCS.length} | VDOCS: ${VDOCS.length}`)
+    // mismo orden que la carga completa (ORDER BY fecha ASC; sin fecha primero)
+    const dateKey = (d)=> d.fecha_evento ? (new Date(d.fecha_evento).getTime() || 0) : -Infinity
+    if (rows.length){
+      docs.sort((a,b)=> dateKey(a) - dateKey(b))
+      vdocs.sort((a,b)=> dateKey(a) - dateKey(b))
+    }
+
+    const top = Math.max(CHANGE_VERSION, ...log.map(r => Number(r.version)))
+    DOCS  = docs
+    VDOCS = vdocs
+    VDOCS_BY_ID = new Map(vdocs.map(d => [d.id, d]))
+    DOCS_BY_ID  = new Map(docs.map(d => [d.id, d]))
+    CHANGE_VERSION  = top
+    RECENT_VERSIONS = new Set(log.map(r => Number(r.version)).filter(v => v > top - CHANGE_OVERLAP))
+    console.log(`[CACHE] Delta v${top}: ${rows.length} filas al día, ${ids.length - rows.length} borradas` +
+      ` | DOCS: ${DOCS.length} | VDOCS: ${VDOCS.length}`)
+    return { mode:'delta', changed:ids.length, removed:ids.length - rows.length, version:top }
   } finally {
     await conn.end()
   }
 }
 
+// Recargas en serie (una completa y una delta nunca se pisan); los avisos que llegan
+// mientras otra recarga corre se juntan en UNA delta pendiente.
+let reloadChain = Promise.resolve()
+let deltaQueued = null
+function serialReload(fn){
+  const p = reloadChain.then(fn)
+  reloadChain = p.catch(()=>{})
+  return p
+}
+function requestDelta(){
+  if (!deltaQueued){
+    deltaQueued = serialReload(()=>{ deltaQueued = null; return applyKnowledgeDelta() })
+  }
+  return deltaQueued
+}
+
 // Helpers fecha/snippet
 const formatDate = (d)=>{
   if(!d) return ''
@@ -243,6 +540,16 @@ const buildSnippet = (text='', maxChars=SNIPPET_CHARS)=>{
   const clean = (text||'').trim().replace(/\s+/g,' ')
   return clean.length <= maxChars ? clean : clean.slice(0,maxChars) + '…'
 }
+// Snippet del doc elegido: si la búsqueda eligió un pasaje, el tramo que matcheó
+// (offsets sobre `contenido`); si no, la ventana alrededor de la primera palabra.
+function docSnippet(best, query, maxChars=SNIPPET_CHARS){
+  const text = best?.contenido || ''
+  const p = best?._passage
+  if (!p || !(p.start >= 0) || p.start >= text.length) return smartSnippet(text, query, maxChars)
+  const end   = Math.min(text.length, p.start + maxChars)
+  const slice = text.slice(p.start, end).replace(/\s+/g, ' ').trim()
+  return (p.start>0?'…':'') + slice + (end<text.length?'…':'')
+}
 function smartSnippet(text, query, maxChars=SNIPPET_CHARS){
   const t = (text||'').replace(/\s+/g, ' ').trim()
   if (!t) return ''
@@ -330,15 +637,9 @@ function spStem(token=''){
   return t
 }
 function tokenOverlapCount(query, doc){
-  const qTokens = norm(query).split(/\W+/).filter(w=>w.length>=4)
-  if (!qTokens.length) return 0
-  const hay = norm(`${doc.titulo||''} ${doc.contenido||''} ${doc.etiquetas||''}`)
-  let m = 0
-  for (const tok of qTokens){
-    const base = spStem(tok)
-    if (hay.includes(tok) || (base.length>=4 && hay.includes(base))) m++
-  }
-  return m
+  const lq = prepareLexQuery(query)
+  if (!lq.terms.length) return 0
+  return overlapPrepared(lq, (doc._lex ?? docLexicon(doc)).hay)
 }
 function singularize(w=''){ return w.replace(/[0-9]+/g,'').replace(/(es|s)$/,'') }
 function toTokenSet(s=''){ return new Set(norm(s).split(/\W+/).filter(Boolean).map(singularize)) }
@@ -347,13 +648,49 @@ function jaccard(aSet, bSet){
   const union = aSet.size + bSet.size - inter
   return union ? inter/union : 0
 }
-function bestTagSim(queryText='', etiquetas=''){
-  const qSet = toTokenSet(queryText)
-  if (!qSet.size) return 0
-  const tags = String(etiquetas||'').split(',').map(s=>s.trim()).filter(Boolean)
+// Bonus léxicos precalculados (misma lógica que lexical.py del servicio Python):
+// los tokens de cada doc se arman UNA vez al cargar la caché y los de la
+// consulta una vez por búsqueda, no por cada doc dentro del loop.
+function docLexicon(doc){
+  return {
+    hay : norm(`${doc.titulo||''} ${doc.contenido||''} ${doc.etiquetas||''}`),
+    tags: String(doc.etiquetas||'').split(',').map(s=>s.trim()).filter(Boolean).map(toTokenSet),
+  }
+}
+function withLexicon(doc, lex = docLexicon(doc)){
+  // no enumerable: no viaja en los JSON de respuesta ni en los spreads
+  Object.defineProperty(doc, '_lex', { value: lex, enumerable: false })
+  return doc
+}
+// Pasajes del doc (índice con --passages) y pasaje elegido para la respuesta; no enumerables
+function withPassages(doc, passages){
+  if (passages?.length) Object.defineProperty(doc, '_passages', { value: passages, enumerable: false })
+  return doc
+}
+function withPassage(item, passage){
+  if (!passage) return item
+  const best = withLexicon({ ...item }, item._lex)
+  Object.defineProperty(best, '_passage', { value: passage, enumerable: false })
+  return best
+}
+function prepareLexQuery(query=''){
+  return {
+    qSet : toTokenSet(query),
+    terms: norm(query).split(/\W+/).filter(w=>w.length>=4).map(tok => [tok, spStem(tok)]),
+  }
+}
+function overlapPrepared(lq, hay){
+  let m = 0
+  for (const [tok, base] of lq.terms){
+    if (hay.includes(tok) || (base.length>=4 && hay.includes(base))) m++
+  }
+  return m
+}
+function tagSimPrepared(lq, tagSets){
+  if (!lq.qSet.size) return 0
   let best = 0
-  for (const t of tags){
-    const sim = jaccard(qSet, toTokenSet(t))
+  for (const t of tagSets){
+    const sim = jaccard(lq.qSet, t)
     if (sim > best) best = sim
   }
   return best
@@ -364,19 +701,66 @@ function now(){ return performance.now() }
 function timeLeft(start, budget){ return Math.max(0, budget - (now() - start)) }
 function clampTimeout(ms){ return Math.max(100, Math.min(ms|0, 60000)) }
 
-// Cliente /embed
+// Formato binario de /embed: header 16 bytes ("EMB1", dtype, pad, count u32, dim u32) + matriz LE
+function halfToFloat(h){
+  const s = (h & 0x8000) ? -1 : 1
+  const e = (h >> 10) & 0x1f
+  const f = h & 0x3ff
+  if (e === 0)  return s * Math.pow(2, -14) * (f / 1024)
+  if (e === 31) return f ? NaN : s * Infinity
+  return s * Math.pow(2, e - 15) * (1 + f / 1024)
+}
+function decodeEmbedBinary(buf){
+  if (buf.length < 16 || buf.toString('latin1', 0, 4) !== 'EMB1') throw new Error('Binario de /embed inválido')
+  const dtype = buf.readUInt8(4)
+  const count = buf.readUInt32LE(8)
+  const dim   = buf.readUInt32LE(12)
+  const out = []
+  for (let r = 0; r < count; r++){
+    const vec = new Float32Array(dim)
+    for (let i = 0; i < dim; i++){
+      const k = r * dim + i
+      vec[i] = dtype === 2 ? halfToFloat(buf.readUInt16LE(16 + k*2)) : buf.readFloatLE(16 + k*4)
+    }
+    out.push(vec)
+  }
+  return out
+}
+
+// El servicio no tiene cargado el modelo de los docs (p. ej. falta EMBED_SHADOW_MODEL_PATH
+// tras un cutover): los cosenos no significan nada. Se avisa una vez por modelo.
+const warnedModels = new Set()
+function warnModelMismatch(served){
+  const base = (m)=> String(m || '').replace(/\+l2$/, '').split('@')[0]
+  if (!served || !EMBED_MODEL || base(served) === base(EMBED_MODEL) || warnedModels.has(served)) return
+  warnedModels.add(served)
+  console.warn(`[EMBED] El servicio embebe con ${served} pero los docs son de ${EMBED_MODEL}` +
+               ' (cargar el modelo con EMBED_SHADOW_MODEL_PATH o MODEL_PATH)')
+}
+
+// Cliente /embed (pide binario float32; si el servicio es viejo y responde JSON, también sirve)
 async function embedText(text, timeoutMs){
   const controller = new AbortController()
-  const to = setTimeout(()=>controller.abort(), clampTimeout(timeoutMs ?? PERF_EMBED_TMOUT ?? EMBED_TMOUT_GLOBAL))
+  const tmout = clampTimeout(timeoutMs ?? PERF_EMBED_TMOUT ?? EMBED_TMOUT_GLOBAL)
+  const to = setTimeout(()=>controller.abort(), tmout)
   try{
+    // X-Request-Timeout-Ms: el servicio no hace cola más allá de nuestro plazo (responde 503 → BM25)
     const resp = await fetch(EMBED_URL, {
       method : 'POST',
-      headers: { 'Content-Type':'application/json; charset=utf-8' },
-      body   : JSON.stringify({ text }),
+      headers: { 'Content-Type':'application/json; charset=utf-8', 'Accept':'application/octet-stream, application/json',
+                 'X-Request-Timeout-Ms': String(tmout) },
+      body   : JSON.stringify(EMBED_MODEL ? { text, model: EMBED_MODEL } : { text }),
       signal : controller.signal
     })
     if(!resp.ok) throw new Error(`Flask /embed respondió ${resp.status}`)
+    warnModelMismatch(resp.headers.get('x-embedding-model'))
+    if ((resp.headers.get('content-type') || '').includes('application/octet-stream')){
+      const [vec] = decodeEmbedBinary(Buffer.from(await resp.arrayBuffer()))
+      if (!vec) throw new Error('Respuesta de /embed inválida')
+      return vec
+    }
     const data = await resp.json()
+    warnModelMismatch(data.model)
     let arr = null
     if (Array.isArray(data.embedding)) arr = data.embedding
     else if (Array.isArray(data.embeddings) && Array.isArray(data.embeddings[0])) arr = data.embeddings[0]
@@ -391,6 +775,19 @@ async function embedText(text, timeoutMs){
 }
 
 // Motor vectorial
+function l2Normalize(v){
+  let n = 0
+  for (let i=0;i<v.length;i++) n += v[i]*v[i]
+  n = Math.sqrt(n)
+  if (n) for (let i=0;i<v.length;i++) v[i] /= n
+  return v
+}
+function dotSim(a,b){
+  let dot = 0
+  const n = Math.min(a.length,b.length)
+  for (let i=0;i<n;i++) dot += a[i]*b[i]
+  return dot
+}
 function cosineSim(a,b){
   let dot=0, na=0, nb=0
   const n = Math.min(a.length,b.length)
@@ -398,25 +795,158 @@ function cosineSim(a,b){
   const denom = Math.sqrt(na)*Math.sqrt(nb)
   return denom ? dot/denom : 0
 }
+// Similitud coseno + bonus léxicos (tags / solapamiento). null si no pasa el umbral.
+// lq = prepareLexQuery(queryText), calculado una vez por búsqueda.
+function scoreWithBonus(lq, item, sim, threshold){
+  const lex      = item._lex ?? docLexicon(item)
+  const tagSim   = tagSimPrepared(lq, lex.tags)
+  const tagBonus = TAG_MATCH_BONUS * tagSim
+
+  if (sim < threshold && tagSim < TAG_BYPASS_SIM) return null
+
+  const overlap = overlapPrepared(lq, lex.hay)
+  const overlapBonus = Math.min(overlap * OVERLAP_BONUS_PER_TOKEN, OVERLAP_BONUS_MAX)
+
+  const score = sim + overlapBonus + tagBonus
+  return { item, score, sim, overlap, tagSim, tagBonus, _score: score }
+}
 function searchTopKWithBonus(queryText, queryVec, topK = TOP_K, threshold = SIM_THRESHOLD) {
   const hits = []
+  const qn = l2Normalize(Float32Array.from(queryVec))   // VDOCS ya están normalizados → coseno = punto
+  const lq = prepareLexQuery(queryText)
   for (const item of VDOCS) {
-    const sim = cosineSim(queryVec, item.vec)
-    const tagSim   = bestTagSim(queryText, item.etiquetas)
-    const tagBonus = TAG_MATCH_BONUS * tagSim
-
-    if (sim < threshold && tagSim < TAG_BYPASS_SIM) continue
+    // doc largo: coseno = max(doc, mejor pasaje), igual que vector_search.py
+    let sim = dotSim(qn, item.vec), passage = null
+    for (const p of item._passages ?? []){
+      const ps = dotSim(qn, p.vec)
+      if (ps > sim){ sim = ps; passage = p }
+    }
+    const hit = scoreWithBonus(lq, item, sim, threshold)
+    if (hit){
+      if (passage) hit.passage = { start: passage.start, end: passage.end, sim }
+      hits.push(hit)
+    }
+  }
+  hits.sort((a,b)=> b._score - a._score)
+  return hits.slice(0, topK)
+}
 
-    const overlap = tokenOverlapCount(queryText, item)
-    const overlapBonus = Math.min(overlap * OVERLAP_BONUS_PER_TOKEN, OVERLAP_BONUS_MAX)
+// Búsqueda remota: el servicio Python aplica coseno + bonus léxicos (hybrid) con los
+// mismos parámetros y devuelve el top-k ya puntuado. Si es un servicio sin híbrida,
+// devuelve SEARCH_REMOTE_K candidatos (ids + coseno) y los bonus se aplican acá.
+// null si el servicio no responde / no tiene índice → el llamador usa la búsqueda local.
+async function searchRemoteWithBonus(queryText, embedQuery, topK = TOP_K, threshold = SIM_THRESHOLD, timeoutMs){
+  const controller = new AbortController()
+  const tmout = clampTimeout(timeoutMs ?? PERF_EMBED_TMOUT)
+  const to = setTimeout(()=>controller.abort(), tmout)
+  try{
+    const resp = await fetch(SEARCH_URL, {
+      method : 'POST',
+      headers: { 'Content-Type':'application/json; charset=utf-8', 'X-Request-Timeout-Ms': String(tmout) },
+      body   : JSON.stringify({
+        query: embedQuery, lexical_query: queryText, hybrid: true,
+        k: Math.max(SEARCH_REMOTE_K, topK), mode: SEARCH_REMOTE_MODE,
+        params: {
+          sim_threshold: threshold, tag_match_bonus: TAG_MATCH_BONUS, tag_bypass_sim: TAG_BYPASS_SIM,
+          overlap_bonus_per_token: OVERLAP_BONUS_PER_TOKEN, overlap_bonus_max: OVERLAP_BONUS_MAX,
+        },
+      }),
+      signal : controller.signal
+    })
+    if (!resp.ok) return null
+    const data = await resp.json()
+    if (!Array.isArray(data.ids) || !Array.isArray(data.scores)) return null
+    const hits = []
+    if (Array.isArray(data.hits)){
+      for (const h of data.hits){
+        const item = VDOCS_BY_ID.get(h.id)
+        if (item) hits.push({ item, score: h.score, sim: h.sim, overlap: h.overlap,
+                              tagSim: h.tag_sim, tagBonus: h.tag_bonus, _score: h.score,
+                              ...(h.passage ? { passage: h.passage } : {}) })
+      }
+    } else {
+      const lq = prepareLexQuery(queryText)
+      data.ids.forEach((id, i)=>{
+        const item = VDOCS_BY_ID.get(id)
+        const hit = item && scoreWithBonus(lq, item, Number(data.scores[i]), threshold)
+        if (hit && data.passages?.[i]) hit.passage = data.passages[i]
+        if (hit) hits.push(hit)
+      })
+    }
+    hits.sort((a,b)=> b._score - a._score)
+    return hits.slice(0, topK)
+  } catch {
+    return null
+  } finally { clearTimeout(to) }
+}
 
-    const score = sim + overlapBonus + tagBonus
-    hits.push({ item, score, sim, overlap, tagSim, tagBonus, _score: score })
+// BM25 sobre el índice léxico del seeder (misma lógica que lexical.py / vector_search.py):
+// por término de la consulta, UNA búsqueda por prefijo (su raíz) en el vocabulario ordenado.
+// sim = BM25 / cota máxima de la consulta (∈ [0,1]) para que MIN_BEST & cía. sigan aplicando.
+function lowerBound(arr, x){
+  let lo = 0, hi = arr.length
+  while (lo < hi){ const mid = (lo + hi) >> 1; if (arr[mid] < x) lo = mid + 1; else hi = mid }
+  return lo
+}
+function searchBM25(queryText, topK = TOP_K){
+  const L = LEXICON
+  if (!L) return null
+  const lq = prepareLexQuery(queryText)
+  const prefixes = [...new Set(lq.terms.map(([tok, base]) => base.length >= 4 ? base : tok))]
+  const scores  = new Float64Array(L.N)
+  const overlap = new Int32Array(L.N)
+  let bound = 0
+  for (const p of prefixes){
+    const lo = lowerBound(L.vocab, p), hi = lowerBound(L.vocab, p + '\uffff')
+    if (lo === hi) continue
+    const tf = new Map()
+    for (let i = lo; i < hi; i++){
+      const post = L.postings[i]                    // plano: fila, tf, fila, tf, ...
+      for (let j = 0; j < post.length; j += 2) tf.set(post[j], (tf.get(post[j]) || 0) + post[j+1])
+    }
+    const idf = Math.log(1 + (L.N - tf.size + 0.5) / (tf.size + 0.5))
+    for (const [row, f] of tf){
+      const k = L.k1 * (1 - L.b + L.b * L.docLen[row] / L.avgdl)
+      scores[row] += idf * f * (L.k1 + 1) / (f + k)
+      overlap[row]++
+    }
+    bound += idf * (L.k1 + 1)
+  }
+  if (!bound) return []
+  const hits = []
+  for (let row = 0; row < L.N; row++){
+    if (!scores[row]) continue
+    const item = DOCS_BY_ID.get(L.ids[row])
+    if (!item) continue
+    const sim      = scores[row] / bound
+    const tagSim   = tagSimPrepared(lq, (item._lex ?? docLexicon(item)).tags)
+    const tagBonus = TAG_MATCH_BONUS * tagSim
+    const score    = sim + tagBonus + Math.min(overlap[row] * OVERLAP_BONUS_PER_TOKEN, OVERLAP_BONUS_MAX)
+    hits.push({ item, score, sim, overlap: overlap[row], tagSim, tagBonus, _score: score, via: 'bm25' })
   }
   hits.sort((a,b)=> b._score - a._score)
   return hits.slice(0, topK)
 }
 
+// Punto único de búsqueda para /ask: remota si está activada (y responde), si no local.
+// Si /embed no responde y hay índice léxico → BM25 en lugar de error "embeddings_offline".
+async function searchHits(queryText, embedQuery, timeoutMs){
+  if (SEARCH_REMOTE){
+    const hits = await searchRemoteWithBonus(queryText, embedQuery, TOP_K, SIM_THRESHOLD, timeoutMs)
+    if (hits) return hits
+  }
+  let qVec
+  try{
+    qVec = await embedText(embedQuery, timeoutMs)
+  }catch(e){
+    const hits = e?.code === 'EMBED_DOWN' ? searchBM25(queryText, TOP_K) : null
+    if (!hits?.length) throw e             // sin léxico o sin coincidencias → 503 como antes
+    console.warn('[SEARCH] /embed no responde → búsqueda léxica (BM25)')
+    return hits
+  }
+  return searchTopKWithBonus(queryText, qVec, TOP_K, SIM_THRESHOLD)
+}
+
 // Intents / ranking
 function detectIntentGeneric(q = '') {
   for (const rule of INTENTS) {
@@ -488,7 +1018,7 @@ function detectIntentHeuristics(q=''){
 // Respuesta V2 base
 function formatAnswer(best, queryForSnippet){
   const fecha = formatDate(best.fecha_evento)
-  const snip  = smartSnippet(best.contenido||'', queryForSnippet, SNIPPET_CHARS)
+  const snip  = docSnippet(best, queryForSnippet, SNIPPET_CHARS)
   return `${best.titulo}${fecha ? ` — ${fecha}` : ''}\n${snip}`
 }
 
@@ -516,7 +1046,7 @@ function buildPrompt({ best, preguntaRaw, promptMode }) {
   const context =
     `${best.titulo || ""}\n` +
     (best.fecha_evento ? `Fecha: ${formatDate(best.fecha_evento)}\n` : "") +
-    smartSnippet(best.contenido || "", preguntaRaw, SNIPPET_CHARS)
+    docSnippet(best, preguntaRaw, SNIPPET_CHARS)
 
   if (promptMode === 'short_date') {
     return [
@@ -559,7 +1089,7 @@ function buildCustomActionPrompt(best, actionPrompt, preguntaRaw) {
   const ctx =
     `${best.titulo || ""}\n` +
     (best.fecha_evento ? `Fecha: ${formatDate(best.fecha_evento)}\n` : "") +
-    smartSnippet(best.contenido || "", preguntaRaw, SNIPPET_CHARS)
+    docSnippet(best, preguntaRaw, SNIPPET_CHARS)
 
   return [ actionPrompt.trim(), "", "Contexto:", ctx, "", "Respuesta:" ].join("\n")
 }
@@ -855,8 +1385,7 @@ app.post('/ask', async (req,res)=>{
     }
 
     // -- Embeddings + búsqueda
-    const qVec = await embedText(preguntaNorm, Math.min(PERF_EMBED_TMOUT, timeLeft(t0, PERF_BUDGET_MS)))
-    let hits = searchTopKWithBonus(preguntaRaw, qVec, TOP_K, SIM_THRESHOLD)
+    let hits = await searchHits(preguntaRaw, preguntaNorm, Math.min(PERF_EMBED_TMOUT, timeLeft(t0, PERF_BUDGET_MS)))
 
     // Filtro léxico mínimo (si hay tokens de 4+)
     const hasTokens = preguntaNorm.split(/\W+/).filter(w=>w.length>=4).length > 0
@@ -870,8 +1399,7 @@ app.post('/ask', async (req,res)=>{
       const qRew = await rewriteQueryWithLlama(preguntaRaw, Math.min(LLM_STEP_MAX_MS, timeLeft(t0, PERF_BUDGET_MS)))
       if (qRew && qRew !== preguntaRaw) {
         try {
-          const qVec2 = await embedText(norm(qRew), Math.min(PERF_EMBED_TMOUT, timeLeft(t0, PERF_BUDGET_MS)))
-          let hits2 = searchTopKWithBonus(qRew, qVec2, TOP_K, SIM_THRESHOLD)
+          let hits2 = await searchHits(qRew, norm(qRew), Math.min(PERF_EMBED_TMOUT, timeLeft(t0, PERF_BUDGET_MS)))
           if (hasTokens){
             const filtered2 = hits2.filter(h=> tokenOverlapCount(qRew, h.item) > 0)
             if (filtered2.length) hits2 = filtered2
@@ -1017,7 +1545,7 @@ app.post('/ask', async (req,res)=>{
     }
 
     // Caso normal
-    const best = hits[0].item
+    const best = withPassage(hits[0].item, hits[0].passage)
     const respuestaV2 = formatAnswer(best, preguntaRaw)
 
     // Reescritura condicional
@@ -1146,27 +1674,39 @@ app.post('/api/feedback', async (req,res)=>{
 
 // /api/health
 app.get('/api/health', async (_req,res)=>{
-  let embedOk=false
+  let embedOk=false, embedStatus=null
   try{
     const v = await embedText('hola', 600)
-    embedOk = Array.isArray(v) && v.length>0
+    embedOk = Boolean(v?.length)          // Float32Array (binario) o array
+  }catch{}
+  try{
+    // loading | ready | error (embed_service con EMBED_LAZY_LOAD arranca "loading")
+    const r = await fetch(EMBED_URL.replace(/\/embed$/, '/health'), { signal: AbortSignal.timeout(600) })
+    embedStatus = (await r.json())?.status ?? null
   }catch{}
   res.json({
     ok:true,
     docs:DOCS.length,
     vdocs:VDOCS.length,
+    index:INDEX_VERSION,
+    embedModel:EMBED_MODEL,
     embedUrl:EMBED_URL,
     embedOk,
+    embedStatus,
     llmEnabled: Boolean(APP?.llm?.enabled),
     llmUrl: String(APP?.llm?.url||'')
   })
 })
 
-// /api/cache/reload
-app.post('/api/cache/reload', async (_req,res)=>{
+// /api/cache/reload            → recarga completa
+// /api/cache/reload?mode=delta → solo las filas del registro de cambios (lo usan CRUD/seeder con CACHE_NOTIFY_URL)
+app.post('/api/cache/reload', async (req,res)=>{
   try{
-    await loadKnowledgeCache()
-    res.json({ ok:true, docs:DOCS.length, vdocs:VDOCS.length })
+    const mode = String(req.query?.mode ?? req.body?.mode ?? 'full')
+    const r = mode === 'delta'
+      ? await requestDelta()
+      : await serialReload(async ()=>{ await loadKnowledgeCache(); return { mode:'full' } })
+    res.json({ ok:true, ...r, docs:DOCS.length, vdocs:VDOCS.length, index:INDEX_VERSION })
   } catch(e){
     res.status(500).json({ error:'No se pudo recargar' })
   }
@@ -1174,6 +1714,10 @@ app.post('/api/cache/reload', async (_req,res)=>{
 
 // Arranque del servidor
 app.listen(PORT, async ()=>{
-  try{ await loadKnowledgeCache() } catch(e){ console.error('[CACHE] load', e) }
+  try{ await serialReload(loadKnowledgeCache) } catch(e){ console.error('[CACHE] load', e) }
+  // Sondeo opcional del registro de cambios (cache.delta_poll_ms; 0 = solo con aviso)
+  if (DELTA_POLL_MS > 0){
+    setInterval(()=> requestDelta().catch(e => console.warn('[CACHE] delta', e?.message || e)), DELTA_POLL_MS).unref()
+  }
   console.log(`Servidor web en http://localhost:${PORT}`)
 })
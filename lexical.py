@@ -0,0 +1,254 @@
+# lexical.py
+# ======================================================================
+# Señales léxicas de la búsqueda híbrida, portadas 1:1 de index.js:
+#   norm / spStem / singularize / toTokenSet / tokenOverlapCount / bestTagSim
+#
+# En lugar de normalizar y tokenizar el texto y las etiquetas de cada doc
+# en cada consulta, acá se precalcula una vez, al exportar el índice (lexico.json, junto a
+# vectors.f32; lo arma el seeder con el MISMO texto que vectoriza,
+# build_text_for_embedding):
+#   - índice invertido: token normalizado → [(fila, tf), ...], con el
+#     vocabulario ordenado para buscar por PREFIJO;
+#   - largo de cada doc + parámetros BM25 (k1, b, avgdl);
+#   - por doc: los token sets de cada etiqueta (Jaccard de bestTagSim).
+#
+# Con eso, por consulta:
+#   - solapamiento: un término (4+ letras) "aparece" en un doc si algún token
+#     del doc empieza con su raíz (spStem, si tiene 4+ letras) o con el
+#     término. Es UNA búsqueda por rango en el vocabulario por término.
+#     (index.js usa `hay.includes(...)` sobre el texto: coincide salvo
+#     cuando el término aparece en el medio de otra palabra.)
+#   - Jaccard de etiquetas: solo se tocan las etiquetas que comparten algún
+#     token con la consulta (el resto da 0), igual que bestTagSim.
+#   - BM25 sobre esos mismos términos: búsqueda léxica completa cuando el
+#     modelo de embeddings no está disponible.
+#
+# Si cambiás norm/spStem/singularize/toTokenSet en index.js, cambialas también acá.
+# ======================================================================
+
+import re                      # split por no-alfanuméricos (\W de JS)
+import math                    # idf de BM25
+import bisect                  # rangos por prefijo en el vocabulario
+import unicodedata             # quitar tildes (NFD + marcas)
+from collections import Counter, defaultdict
+import numpy as np             # postings / puntajes BM25
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# \W de JavaScript sin flag "u" = todo lo que no sea [A-Za-z0-9_]
+_NO_PALABRA = re.compile(r"[^A-Za-z0-9_]+")
+_DIGITOS = re.compile(r"[0-9]+")
+_PLURAL = re.compile(r"(es|s)$")
+_SUFIJOS = [
+    "ciones", "siones", "mente", "idades", "adora", "adores", "adoras", "acion", "sion", "idad",
+    "ados", "adas", "idos", "idas", "ando", "iendo", "ador", "cion", "do", "da", "os", "as",
+    "ar", "er", "ir", "ado", "ada", "ido", "ida",
+]
+
+# ----------------- Normalización / tokens (igual que index.js) -----------------
+def norm(s: str = "") -> str:
+    """Minúsculas y sin tildes."""
+    s = unicodedata.normalize("NFD", (s or "").lower())
+    return "".join(c for c in s if not unicodedata.combining(c))
+
+def sp_stem(token: str = "") -> str:
+    """Stemmer mínimo en español: corta el primer sufijo que deje ≥ 4 letras."""
+    t = norm(token)
+    for suf in _SUFIJOS:
+        if t.endswith(suf) and len(t) - len(suf) >= 4:
+            return t[: -len(suf)]
+    return t
+
+def singularize(w: str = "") -> str:
+    return _PLURAL.sub("", _DIGITOS.sub("", w))
+
+def tokens(s: str = ""):
+    """norm(s).split(/\\W+/) sin vacíos."""
+    return [t for t in _NO_PALABRA.split(norm(s)) if t]
+
+def to_token_set(s: str = "") -> set:
+    return {singularize(t) for t in tokens(s)}
+
+def jaccard(a: set, b: set) -> float:
+    inter = len(a & b)
+    union = len(a) + len(b) - inter
+    return inter / union if union else 0.0
+
+def texto_doc(doc: dict) -> str:
+    """Texto normalizado donde se busca el solapamiento (título + contenido + etiquetas)."""
+    return norm(f"{doc.get('titulo') or ''} {doc.get('contenido') or ''} {doc.get('etiquetas') or ''}")
+
+def etiquetas_doc(doc: dict):
+    return [t.strip() for t in str(doc.get("etiquetas") or "").split(",") if t.strip()]
+
+def token_overlap_count(query: str, doc: dict) -> int:
+    """Versión sin precálculo (referencia / docs sueltos)."""
+    return ConsultaLexica(query).solapamiento(texto_doc(doc))
+
+def best_tag_sim(query: str, etiquetas: str = "") -> float:
+    """Versión sin precálculo (referencia / docs sueltos)."""
+    q = to_token_set(query)
+    if not q:
+        return 0.0
+    return max((jaccard(q, to_token_set(t)) for t in etiquetas_doc({"etiquetas": etiquetas})), default=0.0)
+
+# ----------------- Consulta preprocesada -----------------
+class ConsultaLexica:
+    """Tokens de la consulta calculados una sola vez (no por doc)."""
+
+    def __init__(self, query: str):
+        self.query = query or ""
+        self.token_set = to_token_set(self.query)
+        # tokens de 4+ letras con su raíz (para el solapamiento)
+        self.terminos = [(t, sp_stem(t)) for t in tokens(self.query) if len(t) >= 4]
+        # prefijo a buscar en el vocabulario por término (sin repetidos)
+        self.prefijos = list(dict.fromkeys(b if len(b) >= 4 else t for t, b in self.terminos))
+
+    def solapamiento(self, hay: str) -> int:
+        """Cuántos términos (o su raíz de 4+ letras) aparecen en el texto normalizado."""
+        m = 0
+        for tok, base in self.terminos:
+            if tok in hay or (len(base) >= 4 and base in hay):
+                m += 1
+        return m
+
+# ----------------- Construcción (al exportar el índice) -----------------
+class ConstructorLexico:
+    """Acumula doc por doc (en el orden de filas del índice) y arma el dict de lexico.json."""
+
+    def __init__(self):
+        self.postings = defaultdict(list)   # token → [fila, tf, fila, tf, ...]
+        self.doc_len = []
+        self.tags = []
+
+    def agregar(self, texto: str, etiquetas: str = ""):
+        fila = len(self.doc_len)
+        cuenta = Counter(tokens(texto))
+        for tok, tf in cuenta.items():
+            self.postings[tok].extend((fila, tf))
+        self.doc_len.append(sum(cuenta.values()))
+        self.tags.append([sorted(to_token_set(t)) for t in etiquetas_doc({"etiquetas": etiquetas})])
+
+    def a_dict(self, k1: float = BM25_K1, b: float = BM25_B) -> dict:
+        vocab = sorted(self.postings)
+        n = len(self.doc_len)
+        return {
+            "format": 1,
+            "k1": k1,
+            "b": b,
+            "N": n,
+            "avgdl": (sum(self.doc_len) / n) if n else 0.0,
+            "doc_len": self.doc_len,
+            "vocab": vocab,
+            "postings": [self.postings[t] for t in vocab],   # planos: fila, tf, fila, tf, ...
+            "tags": self.tags,
+        }
+
+# ----------------- Índice léxico precalculado -----------------
+class IndiceLexico:
+    """
+    Índice léxico de los docs del índice vectorial (misma numeración de filas),
+    cargado desde lexico.json (ver ConstructorLexico).
+    """
+
+    def __init__(self, lexico: dict):
+        self.N = int(lexico["N"])
+        self.k1 = float(lexico.get("k1", BM25_K1))
+        self.b = float(lexico.get("b", BM25_B))
+        self.avgdl = float(lexico.get("avgdl") or 1.0)
+        self.doc_len = np.asarray(lexico["doc_len"], dtype=np.float32)
+        self.vocab = lexico["vocab"]
+        self._postings = lexico["postings"]          # se pasan a numpy al primer uso
+        self._np = {}
+
+        self.tag_fila = []                # etiqueta → fila del doc
+        self.tag_tam = []                 # etiqueta → tamaño de su token set
+        self.postings_tags = defaultdict(list)  # token → etiquetas que lo contienen
+        for fila, tags in enumerate(lexico["tags"]):
+            for tset in tags:
+                tid = len(self.tag_fila)
+                self.tag_fila.append(fila)
+                self.tag_tam.append(len(tset))
+                for tok in tset:
+                    self.postings_tags[tok].append(tid)
+
+    @classmethod
+    def desde_docs(cls, docs, texto=None):
+        """Arma el índice en memoria desde dicts titulo/contenido/etiquetas (índices viejos sin lexico.json)."""
+        c = ConstructorLexico()
+        for doc in docs:
+            doc = doc or {}
+            c.agregar(texto(doc) if texto else texto_doc(doc), doc.get("etiquetas") or "")
+        return cls(c.a_dict())
+
+    def __len__(self):
+        return self.N
+
+    # --- Postings por prefijo ---
+    def _posting(self, i: int):
+        p = self._np.get(i)
+        if p is None:
+            arr = np.asarray(self._postings[i], dtype=np.int64).reshape(-1, 2)
+            p = self._np[i] = (arr[:, 0], arr[:, 1])
+        return p
+
+    def filas_prefijo(self, prefijo: str):
+        """(filas únicas, tf sumado) de todos los tokens del vocabulario que empiezan con `prefijo`."""
+        lo = bisect.bisect_left(self.vocab, prefijo)
+        hi = bisect.bisect_left(self.vocab, prefijo + "\uffff")
+        if lo == hi:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        if hi - lo == 1:
+            return self._posting(lo)
+        partes = [self._posting(i) for i in range(lo, hi)]
+        filas = np.concatenate([f for f, _ in partes])
+        tfs = np.concatenate([t for _, t in partes])
+        unicas, inv = np.unique(filas, return_inverse=True)
+        return unicas, np.bincount(inv, weights=tfs).astype(np.int64)
+
+    # --- Señales por consulta ---
+    def tag_sims(self, consulta: ConsultaLexica) -> dict:
+        """
+        {fila: mejor Jaccard consulta↔etiqueta} solo para filas con Jaccard > 0
+        (el resto vale 0, igual que bestTagSim).
+        """
+        q = consulta.token_set
+        if not q:
+            return {}
+        inter = defaultdict(int)
+        for tok in q:
+            for tid in self.postings_tags.get(tok, ()):
+                inter[tid] += 1
+        mejores = {}
+        for tid, i in inter.items():
+            sim = i / (len(q) + self.tag_tam[tid] - i)
+            fila = self.tag_fila[tid]
+            if sim > mejores.get(fila, 0.0):
+                mejores[fila] = sim
+        return mejores
+
+    def solapamientos(self, consulta: ConsultaLexica):
+        """Array (N,) con cuántos términos de la consulta aparece en cada doc."""
+        cuenta = np.zeros(self.N, dtype=np.int32)
+        for t, b in consulta.terminos:
+            filas, _ = self.filas_prefijo(b if len(b) >= 4 else t)
+            cuenta[filas] += 1
+        return cuenta
+
+    def bm25(self, consulta: ConsultaLexica):
+        """
+        Puntaje BM25 de cada doc (N,) y su cota máxima para esta consulta
+        (suma de idf·(k1+1)): score / cota ∈ [0, 1] es comparable entre consultas.
+        """
+        scores = np.zeros(self.N, dtype=np.float32)
+        cota = 0.0
+        norma = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+        for prefijo in consulta.prefijos:
+            filas, tf = self.filas_prefijo(prefijo)
+            if not len(filas):
+                continue
+            idf = math.log(1 + (self.N - len(filas) + 0.5) / (len(filas) + 0.5))
+            scores[filas] += idf * tf * (self.k1 + 1) / (tf + norma[filas])
+            cota += idf * (self.k1 + 1)
+        return scores, cota
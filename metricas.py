@@ -0,0 +1,149 @@
+# metricas.py
+# ======================================================================
+# Métricas en formato de texto de Prometheus (sin dependencias extra).
+# Las usa embed_service.py para GET /metrics.
+#
+#   - Contador   → solo sube (pedidos, textos, errores, truncados...)
+#   - Gauge      → valor del momento, leído con una función al exportar
+#                  (cola, encodes en curso, tamaño de la caché...)
+#   - Histograma → buckets acumulativos + _sum + _count (latencias, tamaños)
+#
+# Cada métrica admite etiquetas (labels) como tupla de valores:
+#   PEDIDOS.inc(("/embed", "200"))
+#   ETAPAS.observe(0.012, ("forward",))
+#
+# Nota: los valores son POR PROCESO. Con gunicorn cada worker tiene los suyos
+# y el scrape cae en uno cualquiera: todas las series llevan la etiqueta
+# `pid` para distinguirlos (sumar por pid en Prometheus/Grafana).
+# ======================================================================
+
+import os                      # pid del proceso (etiqueta común)
+import bisect                  # bucket de cada observación
+import threading               # Flask atiende en hilos
+
+# Buckets por defecto (segundos): de 0.5 ms a 10 s
+BUCKETS_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                    0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _etiquetas(nombres, valores, extra=()) -> str:
+    pares = list(zip(nombres, valores)) + list(extra)
+    pares.append(("pid", os.getpid()))
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in pares) + "}"
+
+def _numero(x) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _cabecera(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores = {}
+
+    def inc(self, etiquetas=(), n: float = 1):
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + n
+
+    def exportar(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        if not valores and not self.etiquetas:
+            valores = [((), 0)]             # la serie existe desde el arranque (rate() sin huecos)
+        return self._cabecera() + [
+            f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_numero(v)}" for k, v in valores
+        ]
+
+class Gauge(_Metrica):
+    """
+    Valor calculado al exportar: `leer()` devuelve un número o {tupla de etiquetas: número}.
+    tipo="counter" para contadores que ya lleva otro objeto (p. ej. aciertos de la caché).
+    """
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, leer, etiquetas=(), tipo: str = "gauge"):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.leer = leer
+        self.tipo = tipo
+
+    def exportar(self):
+        valor = self.leer()
+        valores = valor.items() if isinstance(valor, dict) else [((), valor)]
+        return self._cabecera() + [
+            f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_numero(v)}" for k, v in valores
+        ]
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}               # etiquetas -> [conteos por bucket (no acumulados), suma, total]
+
+    def observe(self, valor: float, etiquetas=()):
+        i = bisect.bisect_left(self.buckets, valor)    # primer bucket con le >= valor
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self):
+        with self._lock:
+            series = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._series.items())
+        lineas = self._cabecera()
+        for k, (conteos, suma, total) in series:
+            acumulado = 0
+            for le, c in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += c
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, k, [('le', _numero(le))])} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, k)} {_numero(round(suma, 6))}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, k)} {total}")
+        return lineas
+
+class Registro:
+    """Conjunto de métricas de un proceso; exportar() arma el cuerpo de /metrics."""
+
+    def __init__(self):
+        self._metricas = []
+
+    def agregar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self.agregar(Contador(nombre, ayuda, etiquetas))
+
+    def gauge(self, nombre, ayuda, leer, etiquetas=(), tipo="gauge"):
+        return self.agregar(Gauge(nombre, ayuda, leer, etiquetas, tipo))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        return self.agregar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def exportar(self) -> str:
+        lineas = []
+        for m in self._metricas:
+            lineas.extend(m.exportar())
+        return "\n".join(lineas) + "\n"
+
+# Content-Type del formato de texto de Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,191 @@
+# noticias_io.py
+# ======================================================================
+# Lectura y escritura del corpus exportado (noticias.json / noticias.jsonl).
+# Lo usan crud_conocimiento.py (export/import) y seed_local_embeddings.py.
+#
+# Formatos:
+#   - "json"  → { "news": [ {...}, {...} ] }  (el de siempre; también acepta [ ... ])
+#   - "jsonl" → un ítem JSON por línea (JSON Lines): se puede leer y escribir
+#               en streaming sin parsear el archivo entero.
+#   El formato se deduce de la extensión (.jsonl / .ndjson → jsonl).
+#
+# Escritura atómica: se escribe a un temporal en la MISMA carpeta y se
+# renombra encima (os.replace). Un corte a mitad de camino deja el archivo
+# anterior intacto, nunca uno truncado.
+# ======================================================================
+
+import os                      # rename atómico / fsync
+import json                    # (de)serialización
+import tempfile                # temporal en la carpeta destino
+
+EXTENSIONES_JSONL = (".jsonl", ".ndjson")
+
+def formato_de(ruta: str) -> str:
+    return "jsonl" if ruta.lower().endswith(EXTENSIONES_JSONL) else "json"
+
+# ----------------- Lectura -----------------
+def iterar_noticias(ruta, buf_size=1 << 16):
+    """
+    Devuelve los ítems del archivo de a uno (memoria acotada).
+    - jsonl: una línea = un ítem (las vacías se ignoran).
+    - json : decodifica el arreglo incrementalmente.
+             Soporta { "news": [...] } y [ ... ].
+    """
+    if formato_de(ruta) == "jsonl":
+        with open(ruta, "r", encoding="utf-8") as f:
+            for n, linea in enumerate(f, 1):
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    yield json.loads(linea)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{ruta}:{n}: línea JSON inválida ({e})") from e
+        return
+
+    dec = json.JSONDecoder()
+    with open(ruta, "r", encoding="utf-8") as f:
+        buf = f.read(buf_size)
+
+        def leer_mas():
+            nonlocal buf
+            extra = f.read(buf_size)
+            buf += extra
+            return bool(extra)
+
+        # 1) Ubicar el '[' donde empieza la lista de ítems
+        while True:
+            inicio = buf.lstrip()[:1]
+            if inicio == "[":
+                pos = buf.index("[") + 1
+                break
+            if inicio == "{":
+                # formato {"news": [...]} (el que escribe exportar_a_json)
+                k = buf.find('"news"')
+                if k >= 0:
+                    c = buf.find("[", k)
+                    if c >= 0:
+                        pos = c + 1
+                        break
+            elif inicio:
+                raise ValueError("El JSON debe ser una lista o contener 'news' como lista.")
+            if not leer_mas():
+                raise ValueError("El JSON debe ser una lista o contener 'news' como lista.")
+
+        # 2) Decodificar ítem por ítem
+        while True:
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or not leer_mas():
+                    break
+            if pos >= len(buf):
+                raise ValueError(f"JSON incompleto: {ruta}")
+            if buf[pos] == "]":
+                return
+            try:
+                item, fin = dec.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not leer_mas():
+                    raise
+                continue
+            yield item
+            pos = fin
+            if pos > buf_size:          # descartamos lo ya leído
+                buf = buf[pos:]
+                pos = 0
+
+# ----------------- Escritura atómica -----------------
+def escribir_atomico(ruta: str, escribir):
+    """
+    Llama a escribir(f) sobre un temporal junto a `ruta` y lo renombra encima.
+    Si escribir() falla, el temporal se borra y `ruta` queda como estaba.
+    """
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    fd, tmp = tempfile.mkstemp(dir=carpeta, prefix=f".{os.path.basename(ruta)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+            resultado = escribir(f)
+            f.flush()
+            os.fsync(f.fileno())            # los datos en disco ANTES del rename
+        # mkstemp crea con permisos 0600: copiamos los del archivo anterior (o 0644)
+        os.chmod(tmp, os.stat(ruta).st_mode & 0o777 if os.path.exists(ruta) else 0o644)
+        os.replace(tmp, ruta)
+        return resultado
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def escribir_noticias(ruta: str, items) -> int:
+    """
+    Escribe los ítems (cualquier iterable, p. ej. un cursor) en el formato de
+    `ruta` sin juntarlos en memoria. Devuelve la cantidad escrita.
+    """
+    jsonl = formato_de(ruta) == "jsonl"
+
+    def escribir(f):
+        n = 0
+        if not jsonl:
+            f.write('{\n  "news": [')
+        for item in items:
+            if jsonl:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            else:
+                cuerpo = json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n    ")
+                f.write(("," if n else "") + "\n    " + cuerpo)
+            n += 1
+        if not jsonl:
+            f.write("\n  ]\n}\n" if n else "]\n}\n")
+        return n
+
+    return escribir_atomico(ruta, escribir)
+
+class _TituloRepetido(Exception):
+    pass
+
+def parchear_noticias(ruta: str, titulo_viejo=None, nuevo=None, clave_orden="fecha_evento"):
+    """
+    Reescribe `ruta` cambiando UN ítem sin volver a leer la tabla:
+      - titulo_viejo: ítem a reemplazar/quitar (None = alta)
+      - nuevo: ítem a poner (None = baja). En un alta va en su lugar según
+        `clave_orden` (el archivo está ordenado como lo exporta el CRUD).
+    Devuelve False si el archivo no permite parchear con seguridad
+    (no existe o el título aparece más de una vez): hay que exportar completo.
+    """
+    if not os.path.exists(ruta):
+        return False
+    vistos = 0
+
+    def orden(item):
+        v = item.get(clave_orden)
+        return (v is not None, str(v or ""))     # NULL primero, como ORDER BY ... ASC
+
+    def items():
+        nonlocal vistos
+        # El ítem nuevo va en su lugar según la clave de orden; si reemplaza a uno
+        # con la misma clave, queda en la posición del viejo.
+        pendiente = nuevo
+        for item in iterar_noticias(ruta):
+            if titulo_viejo is not None and item.get("titulo") == titulo_viejo:
+                vistos += 1
+                if vistos > 1:
+                    raise _TituloRepetido(titulo_viejo)
+                if pendiente is not None and orden(pendiente) == orden(item):
+                    yield pendiente
+                    pendiente = None
+                continue
+            if pendiente is not None and orden(pendiente) < orden(item):
+                yield pendiente
+                pendiente = None
+            yield item
+        if pendiente is not None:
+            yield pendiente
+
+    try:
+        escribir_noticias(ruta, items())
+    except _TituloRepetido:
+        return False                    # el temporal se descarta: el archivo queda como estaba
+    return titulo_viejo is None or vistos == 1
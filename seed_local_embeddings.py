@@ -7,7 +7,8 @@
 # • Para cada ítem construye UN texto:  "titulo. contenido Etiquetas: ... Temas: ..."
 #   y genera un embedding (768D si usás mpnet multilingüe).
 # • Guarda/actualiza en MySQL la fila con los metadatos y el vector
-#   en formato JSON (columna `vector`), listo para que `index.js` lo use.
+#   en binario (columna `vector_blob`, float32/float16) y/o en JSON
+#   (columna `vector`, formato original), listo para que `index.js` lo use.
 #
 # Estrategia "Nivel A" (alineada con index.js):
 # ----------------------------------------------------------------------
@@ -17,9 +18,34 @@
 #   sin sobreponderar.
 # - No generamos embeddings separados: 1 doc = 1 embedding (simple).
 #
+# Pipeline (pensado para re-seeds completos tras cambiar de modelo):
+# ----------------------------------------------------------------------
+# 1) El JSON se lee en streaming (ítem por ítem, sin cargar todo en memoria);
+#    --json noticias.jsonl (JSON Lines, ver noticias_io.py) también sirve.
+# 2) Los ítems se agrupan en tramos de --chunk documentos.
+# 3) Dentro de cada tramo se ordenan por largo de texto y se codifican en
+#    lotes de --batch-size (menos padding → más docs/seg).
+# 4) Cada tramo se escribe con UN executemany y UN commit.
+# 5) Se informa el avance y los docs/seg (encode vs. DB).
+#
+# Modo incremental (--incremental, el que usa crud_conocimiento.py):
+# ----------------------------------------------------------------------
+# - Cada fila guarda texto_hash (SHA-256 del texto vectorizado), vector_modelo
+#   y vector_dim (ver vector_store.py).
+# - Solo se re-embeden los ítems nuevos, los que cambiaron de texto, los de
+#   otro modelo y los que tienen `vector` NULL (lo mismo que muestra
+#   listar_sin_vector() en el CRUD, incluidas filas que no están en el JSON).
+# - Los ítems al día se saltean sin pasar por el modelo; si no hay nada
+#   pendiente, ni siquiera se carga el modelo.
+#
 # Compatibilidad con index.js:
 # ----------------------------------------------------------------------
-# - index.js asume que `vector` es un JSON con una lista de floats.
+# - index.js lee `vector_blob` (binario) y, si no hay, `vector` (JSON).
+# - --storage json|blob|both elige qué columnas escribir (default: blob).
+# - --normalize guarda vectores L2-normalizados (norma 1) y lo registra en
+#   `vector_norm` y en vector_modelo (sufijo "+l2"): así index.js/búsqueda
+#   pueden usar producto punto directo y nunca se mezclan ambos modos.
+#   Para pasar filas viejas de JSON a BLOB: python vector_store.py migrate
 # - La búsqueda en Node compara la consulta embebida vs. estos vectores.
 # - También aplica filtro léxico en título+contenido+etiquetas y un BONUS
 #   leve por solapamiento (puede apagarse si lo deseás).
@@ -30,15 +56,93 @@
 #       --json noticias.json \
 #       --model_dir "C:/Proyectos/museo-asistente/models/paraphrase-multilingual-mpnet-base-v2" \
 #       --host localhost --user museo --password museo2025 --database museo \
-#       --table conocimiento --wipe-vectors
+#       --table conocimiento --wipe-vectors \
+#       --batch-size 32 --chunk 256
+#
+#   python seed_local_embeddings.py --incremental   # solo lo nuevo/cambiado
+#   python seed_local_embeddings.py --passages      # + vectores por pasaje (docs largos)
+#   python seed_local_embeddings.py --workers 4     # encode en 4 procesos (re-seed completo)
+#   python seed_local_embeddings.py --shadow --cutover --model_dir <modelo nuevo>
+#
+# Cambio de modelo sin corte (--shadow / --cutover):
+# ----------------------------------------------------------------------
+# - --wipe-vectors deja la búsqueda sin vectores durante todo el re-seed
+#   (index.js saltea las filas sin vector). En cambio:
+#   1) embed_service con EMBED_SHADOW_MODEL_PATH=<modelo nuevo>: sirve los dos
+#      modelos y cada cliente pide el de su índice ("model" en /embed).
+#   2) --shadow --model_dir <modelo nuevo>: recorre las filas de la TABLA (no el
+#      JSON) y guarda los vectores nuevos en <tabla>_sombra. Los vectores en
+#      uso, el índice en disco y la búsqueda no se tocan. Es reanudable: salta
+#      las filas cuya sombra ya está al día (mismo texto_hash y modelo).
+#      Se puede repetir con --workers N.
+#   3) --cutover (solo o junto con --shadow): si la sombra cubre el 100% de las
+#      filas con texto, copia en UNA transacción los vectores de la sombra a las
+#      columnas en uso, borra los pasajes del modelo viejo y exporta el índice
+#      nuevo (CURRENT cambia con un rename atómico: index.js y /search pasan
+#      al modelo nuevo en su próxima recarga, sin ventana sin vectores).
+#   4) Después: MODEL_PATH del servicio y --model_dir del seeder/CRUD al modelo
+#      nuevo (y quitar EMBED_SHADOW_MODEL_PATH). Los pasajes se regeneran con
+#      --passages.
+#
+# Encode en paralelo (--workers N):
+# ----------------------------------------------------------------------
+# - Un solo proceso con un modelo deja ociosa la mayoría de los núcleos en
+#   un re-seed completo (p. ej. tras pasar de 384 a 768 dims con --wipe-vectors).
+# - Con --workers N los tramos se reparten entre N procesos; cada uno carga el
+#   modelo UNA vez con --worker-threads hilos (default: núcleos / N, para no
+#   sobre-suscribir la CPU) y devuelve los vectores (y pasajes) del tramo.
+# - El proceso principal es el ÚNICO que escribe en MySQL: recibe los tramos
+#   EN ORDEN (como sin workers) y hace el executemany + commit de cada uno.
+#   Hay como mucho 2·N tramos en vuelo (memoria acotada).
+# - Informa docs/s por tramo y, al final, docs/s de cada worker.
+#
+# Pasajes (--passages):
+# ----------------------------------------------------------------------
+# - model.encode trunca en max_seq_length tokens: en los docs largos todo lo
+#   que viene después es invisible para la búsqueda.
+# - Con --passages, cada `contenido` que no entra se parte (con el tokenizer
+#   del modelo y sus offsets) en ventanas de --passage-tokens con
+#   --passage-overlap tokens de solape. Cada pasaje se embebe como
+#   "titulo. <tramo>" y va a <tabla>_pasajes con sus offsets de caracteres
+#   (char_inicio/char_fin sobre `contenido`).
+# - La búsqueda usa el mejor pasaje de cada doc y devuelve sus offsets: el
+#   snippet sale de ahí en vez de buscarlo en el texto completo.
+# - Los pasajes se regeneran para los docs que se re-embeden: la primera vez
+#   correr SIN --incremental para cubrir todo el corpus.
+#
+# Índice en disco (ver vector_index.py):
+# ----------------------------------------------------------------------
+# - Al terminar (si hubo cambios o no existe) vuelca todos los vectores a
+#   --index-dir (default "indice/"): matriz float32 normalizada + manifest.
+#   index.js la lee de una vez al arrancar/recargar en lugar de traer y
+#   parsear cada vector desde MySQL. --no-index lo desactiva.
+# - Incluye el índice léxico (BM25 + etiquetas) armado con el mismo texto
+#   de build_text_for_embedding (ver lexical.py).
+#
+# Recarga delta (ver registrar_cambios en vector_store.py):
+# ----------------------------------------------------------------------
+# - Cada UPSERT anota sus filas en <tabla>_cambios; con CACHE_NOTIFY_URL
+#   (p. ej. http://127.0.0.1:3000/api/cache/reload?mode=delta) se avisa a
+#   index.js al terminar y aplica solo esas filas.
 # ======================================================================
 
 import os                      # rutas/chequeos de archivos
 import json                    # serializar a JSON
+import time                    # medición de docs/seg
 import argparse                # flags CLI
+import itertools               # encadenar JSON + filas sin vector
+import collections             # cola de tramos en vuelo (--workers)
+import multiprocessing         # pool de procesos para encode (--workers)
 import mysql.connector         # cliente MySQL
 from mysql.connector import errorcode
-from sentence_transformers import SentenceTransformer  # embeddings locales
+from embed_backend import BACKENDS, cargar_modelo  # embeddings locales (torch / onnx / onnx-int8)
+from vector_store import (                                # vectores en MySQL (ver vector_store.py)
+    DTYPES, SQL_TIENE_VECTOR, asegurar_clave_unica, asegurar_columnas, asegurar_tabla_cambios, asegurar_tabla_pasajes,
+    asegurar_tabla_sombra, existe_tabla, hash_texto, modelo_id, notificar_cambios, pack_vector, registrar_cambios,
+    preparar_marca, sql_marca, tabla_pasajes, tabla_sombra,
+)
+from vector_index import INDEX_DIR_DEFAULT, exportar_desde_db, version_actual  # índice mmap
+from noticias_io import formato_de, iterar_noticias          # JSON / JSON Lines en streaming
 
 # ----------------- FLAGS (línea de comandos) -----------------
 parser = argparse.ArgumentParser(description="Seeder de embeddings locales (MySQL).")
@@ -49,6 +153,12 @@ parser.add_argument(
     default=r"C:/Proyectos/museo-asistente/models/paraphrase-multilingual-mpnet-base-v2",
     help="Carpeta del modelo local (usar mpnet 768 para mejores resultados).",
 )
+parser.add_argument(
+    "--backend",
+    default=os.environ.get("EMBED_BACKEND", "torch"),
+    choices=BACKENDS,
+    help="Motor de inferencia (usar el mismo que embed_service).",
+)
 parser.add_argument("--host", default="localhost", help="Host MySQL.")
 parser.add_argument("--user", default="museo", help="Usuario MySQL.")
 parser.add_argument("--password", default="museo2025", help="Password MySQL.")
@@ -57,35 +167,95 @@ parser.add_argument("--table", default="conocimiento", help="Tabla destino.")
 parser.add_argument(
     "--wipe-vectors",
     action="store_true",
-    help="Pone NULL en columna vector antes de regenerar (útil para limpiar 384→768).",
+    help="Pone NULL en columna vector antes de regenerar (la búsqueda queda sin vectores "
+         "hasta terminar; para cambiar de modelo sin corte usar --shadow + --cutover).",
 )
-args = parser.parse_args()  # parseo de flags
-
-# ----------------- CONFIG DB -----------------
-DB_CFG = dict(
-    host=args.host,         # host MySQL (por flag)
-    user=args.user,         # usuario
-    password=args.password, # password
-    database=args.database, # base de datos
+parser.add_argument("--batch-size", type=int, default=32, help="Textos por llamada a model.encode.")
+parser.add_argument("--chunk", type=int, default=256, help="Documentos por executemany/commit.")
+parser.add_argument(
+    "--storage",
+    default="blob",
+    choices=("blob", "json", "both"),
+    help="Formato del vector en MySQL: blob (binario), json (original) o ambos.",
+)
+parser.add_argument("--dtype", default="f32", choices=sorted(DTYPES), help="Precisión del BLOB.")
+parser.add_argument(
+    "--normalize",
+    action="store_true",
+    help="Guarda vectores L2-normalizados (coseno = producto punto). Usar igual que EMBED_NORMALIZE.",
+)
+parser.add_argument(
+    "--incremental",
+    action="store_true",
+    help="Solo embede filas nuevas, con texto/modelo distinto o sin vector.",
+)
+parser.add_argument(
+    "--index-dir",
+    default=INDEX_DIR_DEFAULT,
+    help="Carpeta del índice de vectores en disco que lee index.js (ver vector_index.py).",
+)
+parser.add_argument("--no-index", action="store_true", help="No exporta el índice en disco al terminar.")
+parser.add_argument(
+    "--passages",
+    action="store_true",
+    help="Parte los docs largos en pasajes solapados y guarda un vector por pasaje (<tabla>_pasajes).",
+)
+parser.add_argument(
+    "--passage-tokens",
+    type=int,
+    default=0,
+    help="Tokens de contenido por pasaje (default 0 = lo que entra en el modelo menos el título).",
+)
+parser.add_argument("--passage-overlap", type=int, default=32, help="Tokens compartidos entre pasajes seguidos.")
+parser.add_argument(
+    "--shadow",
+    action="store_true",
+    help="Embebe las filas de la tabla con --model_dir en <tabla>_sombra, sin tocar los vectores en uso.",
+)
+parser.add_argument(
+    "--cutover",
+    action="store_true",
+    help="Si la sombra de --model_dir cubre el 100%% de las filas, la pasa a las columnas en uso (una transacción).",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="Procesos que codifican en paralelo (cada uno con su copia del modelo). 1 = sin pool.",
+)
+parser.add_argument(
+    "--worker-threads",
+    type=int,
+    default=int(os.environ.get("EMBED_TORCH_THREADS", "0")),
+    help="Hilos de torch/ONNX por worker (default 0 = núcleos / --workers).",
 )
-
-# ----------------- RUTAS -----------------
-RUTA_JSON = args.json              # archivo JSON (por flag)
-RUTA_MODELO_LOCAL = args.model_dir # carpeta del modelo (por flag)
 
 # ----------------- Helpers de DB -----------------
-def crear_conexion():
-    """Abre y retorna una conexión MySQL (usa DB_CFG)."""
-    return mysql.connector.connect(**DB_CFG)
+def db_config(args):
+    """Arma el dict de conexión MySQL a partir de los flags."""
+    return dict(
+        host=args.host,         # host MySQL (por flag)
+        user=args.user,         # usuario
+        password=args.password, # password
+        database=args.database, # base de datos
+    )
+
+def crear_conexion(db_cfg):
+    """Abre y retorna una conexión MySQL."""
+    return mysql.connector.connect(**db_cfg)
 
 # ----------------- Carga JSON -----------------
 def cargar_json(ruta):
     """
     Lee el JSON y retorna la lista de noticias.
-    Soporta dos formatos:
+    Soporta tres formatos:
       - { "news": [...] }
       - [ ... ]
+      - JSON Lines (.jsonl: un ítem por línea)
+    Para leer en streaming: iterar_noticias() (noticias_io.py).
     """
+    if formato_de(ruta) == "jsonl":
+        return list(iterar_noticias(ruta))
     with open(ruta, "r", encoding="utf-8") as f:
         data = json.load(f)
     if isinstance(data, dict):
@@ -97,22 +267,22 @@ def cargar_json(ruta):
     return noticias
 
 # ----------------- Carga modelo local -----------------
-def cargar_modelo_local():
+def cargar_modelo_local(ruta_modelo, backend="torch"):
     """
     Carga el modelo SOLAMENTE desde disco (sin internet).
     Verifica archivos clave para fallar rápido si falta algo.
     """
     requeridos = ["modules.json", "config.json"]  # mínimos (podés exigir tokenizer/model.safetensors también)
-    faltan = [p for p in requeridos if not os.path.exists(os.path.join(RUTA_MODELO_LOCAL, p))]
+    faltan = [p for p in requeridos if not os.path.exists(os.path.join(ruta_modelo, p))]
     if faltan:
         raise FileNotFoundError(
             "Faltan archivos del modelo en la ruta local.\n"
-            f"Ruta: {RUTA_MODELO_LOCAL}\n"
+            f"Ruta: {ruta_modelo}\n"
             f"Faltantes: {faltan}\n"
             "Descargá TODO el modelo (Git LFS / Download ZIP) y descomprimí."
         )
-    print(f"🔁 Cargando modelo local: {RUTA_MODELO_LOCAL}")
-    modelo = SentenceTransformer(RUTA_MODELO_LOCAL, local_files_only=True)  # sin internet
+    print(f"🔁 Cargando modelo local: {ruta_modelo} (backend={backend})")
+    modelo = cargar_modelo(ruta_modelo, backend)                            # sin internet
     emb_dim = modelo.get_sentence_embedding_dimension()                     # ej.: 768 en mpnet
     print(f"✅ Modelo cargado. Dimensiones del embedding: {emb_dim}")
     return modelo, emb_dim
@@ -149,104 +319,599 @@ def build_text_for_embedding(item):
 
     return texto
 
-# ----------------- Embedding de un texto -----------------
+# ----------------- Embedding de textos -----------------
 def generar_embedding(modelo, texto):
     """Convierte texto en vector (list[float] JSON-serializable)."""
     vec = modelo.encode(texto)         # numpy array
     return [float(x) for x in vec]     # lo transformamos a lista de floats
 
-# ----------------- UPSERT en MySQL -----------------
-def upsert_noticia(cur, tabla, noticia, embedding_json):
+def generar_embeddings(modelo, textos, batch_size=32, normalize=False):
     """
-    Inserta o actualiza un registro en `tabla`.
-    Guarda el vector como JSON (ej.: 768 floats si usás mpnet).
+    Codifica varios textos en lotes. Ordena por largo antes de codificar
+    (lotes parejos = menos padding) y devuelve en el orden original.
+    Retorna una lista de vectores numpy (N x dim).
     """
-    sql = f"""
+    orden = sorted(range(len(textos)), key=lambda i: len(textos[i]))
+    vecs = modelo.encode(
+        [textos[i] for i in orden],
+        batch_size=max(1, int(batch_size)),
+        convert_to_numpy=True,
+        show_progress_bar=False,
+        normalize_embeddings=bool(normalize),   # norma 1 → coseno = producto punto
+    )
+    salida = [None] * len(textos)
+    for pos, i in enumerate(orden):
+        salida[i] = vecs[pos]
+    return salida
+
+# ----------------- UPSERT en MySQL -----------------
+# Columnas del UPSERT que también exporta el CRUD: si no cambia ninguna (solo el
+# vector), la marca de agua del export no se mueve (ver vector_store.sql_marca).
+CAMPOS_DATOS = ("contenido", "fecha_evento", "imagen_url", "etiquetas", "fuente_url")
+
+def _sql_upsert(tabla):
+    return f"""
     INSERT INTO {tabla}
-      (titulo, contenido, vector, fecha_evento, imagen_url, etiquetas, fuente_url)
+      (titulo, contenido, vector, vector_blob, vector_dtype, fecha_evento, imagen_url,
+       etiquetas, fuente_url, texto_hash, vector_modelo, vector_dim, vector_norm)
     VALUES
-      (%s, %s, CAST(%s AS JSON), %s, %s, %s, %s)
+      (%s, %s, CAST(%s AS JSON), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     ON DUPLICATE KEY UPDATE
-      contenido    = VALUES(contenido),
-      vector       = VALUES(vector),
-      fecha_evento = VALUES(fecha_evento),
-      imagen_url   = VALUES(imagen_url),
-      etiquetas    = VALUES(etiquetas),
-      fuente_url   = VALUES(fuente_url);
-    """
-    params = (
+      {sql_marca(tabla, CAMPOS_DATOS)}
+      contenido     = VALUES(contenido),
+      vector        = VALUES(vector),
+      vector_blob   = VALUES(vector_blob),
+      vector_dtype  = VALUES(vector_dtype),
+      fecha_evento  = VALUES(fecha_evento),
+      imagen_url    = VALUES(imagen_url),
+      etiquetas     = VALUES(etiquetas),
+      fuente_url    = VALUES(fuente_url),
+      texto_hash    = VALUES(texto_hash),
+      vector_modelo = VALUES(vector_modelo),
+      vector_dim    = VALUES(vector_dim),
+      vector_norm   = VALUES(vector_norm);
+    """
+
+# Cómo se escribe cada vector (lo arma main() a partir de los flags)
+FORMATO_DEFAULT = {"modelo": None, "storage": "blob", "dtype": "f32", "normalizado": False}
+
+def _params_upsert(noticia, embedding, formato=None):
+    fmt = {**FORMATO_DEFAULT, **(formato or {})}
+    en_json = fmt["storage"] in ("json", "both")
+    en_blob = fmt["storage"] in ("blob", "both")
+    return (
         noticia.get("titulo"),
         noticia.get("contenido"),
-        json.dumps(embedding_json),  # lista -> texto JSON
+        json.dumps([float(x) for x in embedding]) if en_json else None,  # lista -> texto JSON
+        pack_vector(embedding, fmt["dtype"]) if en_blob else None,       # float32/16 LE
+        fmt["dtype"] if en_blob else None,
         noticia.get("fecha_evento"),
         noticia.get("imagen_url"),
         noticia.get("etiquetas"),
         noticia.get("fuente_url"),
+        hash_texto(build_text_for_embedding(noticia)),
+        fmt["modelo"],
+        len(embedding),
+        1 if fmt["normalizado"] else 0,
+    )
+
+def upsert_noticia(cur, tabla, noticia, embedding_json, formato=None):
+    """
+    Inserta o actualiza un registro en `tabla`.
+    Guarda el vector (ej.: 768 floats si usás mpnet) como BLOB y/o JSON + hash/modelo/dim.
+    `formato` (dict, ver FORMATO_DEFAULT): modelo, storage, dtype, normalizado.
+    La fila queda anotada en `<tabla>_cambios` (recarga delta de index.js).
+    """
+    cur.execute(_sql_upsert(tabla), _params_upsert(noticia, embedding_json, formato))
+    registrar_cambios(cur, tabla, titulos=[noticia.get("titulo")])
+
+def upsert_lote(cur, tabla, noticias, embeddings, formato=None):
+    """
+    UPSERT de muchas filas con un solo executemany (el conector lo envía
+    como INSERT multi-fila). Devuelve filas afectadas según MySQL
+    (1 por insert, 2 por update, 0 si no cambió nada).
+    Las filas quedan anotadas en `<tabla>_cambios` (recarga delta de index.js).
+    """
+    filas = [_params_upsert(n, v, formato) for n, v in zip(noticias, embeddings)]
+    cur.executemany(_sql_upsert(tabla), filas)
+    afectadas = cur.rowcount
+    registrar_cambios(cur, tabla, titulos=[n.get("titulo") for n in noticias])
+    return afectadas
+
+# ----------------- Estado actual (modo incremental) -----------------
+def cargar_estado(cur, tabla):
+    """
+    titulo -> (texto_hash, vector_modelo, tiene_vector) de todas las filas.
+    No trae contenido ni vectores: solo lo necesario para decidir.
+    """
+    cur.execute(f"""
+        SELECT titulo, texto_hash, vector_modelo, {SQL_TIENE_VECTOR} AS tiene_vector
+        FROM {tabla}
+    """)
+    return {t: (h, m, bool(v)) for (t, h, m, v) in cur.fetchall()}
+
+def filtrar_pendientes(noticias, estado, ident, contador):
+    """
+    Deja pasar solo los ítems que hay que (re)embedir. Los demás se cuentan
+    en contador["saltadas"]. Anota los títulos vistos en contador["vistos"].
+    """
+    for n in noticias:
+        titulo = (n.get("titulo") or "").strip()
+        contador["vistos"].add(titulo)
+        previo = estado.get(titulo)
+        if previo is not None:
+            h, m, tiene_vector = previo
+            if tiene_vector and m == ident and h == hash_texto(build_text_for_embedding(n)):
+                contador["saltadas"] += 1
+                continue
+        yield n
+
+def filas_sin_vector(conn, tabla, vistos):
+    """
+    Filas de la tabla con `vector` NULL/vacío que no vinieron en el JSON
+    (p. ej. creadas en el CRUD). Se consulta recién al terminar el JSON.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(f"""
+            SELECT titulo, contenido, fecha_evento, imagen_url, etiquetas, fuente_url
+            FROM {tabla}
+            WHERE NOT {SQL_TIENE_VECTOR}
+        """)
+        filas = [r for r in cur.fetchall() if (r["titulo"] or "").strip() not in vistos]
+    finally:
+        cur.close()
+    yield from filas
+
+# ----------------- Sombra (cambio de modelo sin corte) -----------------
+def filas_para_sombra(conn, tabla, ident, contador, lote=500):
+    """
+    Filas de `tabla` (keyset por id) cuyo vector en la sombra falta o está
+    viejo (otro texto u otro modelo). Las que ya están al día se cuentan en
+    contador["saltadas"]; las sin título/contenido no se embeden nunca.
+    """
+    cur = conn.cursor(dictionary=True)
+    ultimo_id = 0
+    try:
+        while True:
+            cur.execute(
+                f"""SELECT t.id, t.titulo, t.contenido, t.fecha_evento, t.imagen_url, t.etiquetas, t.fuente_url,
+                           s.texto_hash AS sombra_hash, s.vector_modelo AS sombra_modelo
+                    FROM {tabla} t LEFT JOIN {tabla_sombra(tabla)} s ON s.doc_id = t.id
+                    WHERE t.id > %s
+                    ORDER BY t.id LIMIT %s""",
+                (ultimo_id, lote),
+            )
+            filas = cur.fetchall()
+            if not filas:
+                return
+            ultimo_id = filas[-1]["id"]
+            for r in filas:
+                if not (r["titulo"] or "").strip() or not (r["contenido"] or "").strip():
+                    continue
+                h, m = r.pop("sombra_hash"), r.pop("sombra_modelo")
+                if m == ident and h == hash_texto(build_text_for_embedding(r)):
+                    contador["saltadas"] += 1
+                    continue
+                yield r
+    finally:
+        cur.close()
+
+def guardar_sombra(cur, tabla, tramo, embeddings, formato=None):
+    """UPSERT de los vectores nuevos del tramo en `<tabla>_sombra` (siempre BLOB). Devuelve filas escritas."""
+    fmt = {**FORMATO_DEFAULT, **(formato or {})}
+    cur.executemany(
+        f"""INSERT INTO {tabla_sombra(tabla)}
+              (doc_id, texto_hash, vector_blob, vector_dtype, vector_dim, vector_modelo, vector_norm)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+              texto_hash    = VALUES(texto_hash),
+              vector_blob   = VALUES(vector_blob),
+              vector_dtype  = VALUES(vector_dtype),
+              vector_dim    = VALUES(vector_dim),
+              vector_modelo = VALUES(vector_modelo),
+              vector_norm   = VALUES(vector_norm)""",
+        [
+            (n["id"], hash_texto(build_text_for_embedding(n)), pack_vector(v, fmt["dtype"]), fmt["dtype"],
+             int(len(v)), fmt["modelo"], 1 if fmt["normalizado"] else 0)
+            for n, v in zip(tramo, embeddings)
+        ],
     )
-    cur.execute(sql, params)
+    return len(tramo)
+
+def promover_sombra(conn, tabla, ident):
+    """
+    Cutover: si TODAS las filas con texto tienen vector `ident` al día en la
+    sombra, los copia a las columnas en uso en una sola transacción (el JSON
+    viejo queda en NULL), borra los pasajes de otro modelo y vacía la sombra
+    de `ident`. Devuelve (pendientes, filas actualizadas); si hay pendientes
+    no cambia nada.
+    """
+    contador = {"saltadas": 0}
+    pendientes = sum(1 for _ in filas_para_sombra(conn, tabla, ident, contador))
+    if pendientes or not contador["saltadas"]:
+        return pendientes, 0
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"""UPDATE {tabla} t JOIN {tabla_sombra(tabla)} s ON s.doc_id = t.id AND s.vector_modelo = %s
+                SET {sql_marca(tabla, alias="t")}t.vector = NULL, t.vector_blob = s.vector_blob, t.vector_dtype = s.vector_dtype,
+                    t.vector_dim = s.vector_dim, t.vector_modelo = s.vector_modelo,
+                    t.vector_norm = s.vector_norm, t.texto_hash = s.texto_hash""",
+            (ident,),
+        )
+        actualizadas = cur.rowcount
+        registrar_cambios(cur, tabla, op="reset")      # todos los vectores cambian de modelo
+        if existe_tabla(cur, tabla_pasajes(tabla)):
+            cur.execute(
+                f"DELETE FROM {tabla_pasajes(tabla)} WHERE vector_modelo IS NULL OR vector_modelo <> %s", (ident,)
+            )
+        cur.execute(f"DELETE FROM {tabla_sombra(tabla)} WHERE vector_modelo = %s", (ident,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return 0, actualizadas
 
 # ----------------- Limpieza de vectores (opcional) -----------------
 def wipe_vectors(cur, tabla):
-    """Setea NULL en la columna vector (para limpiar 384→768 o regenerar todo)."""
-    cur.execute(f"UPDATE {tabla} SET vector = NULL")
+    """Setea NULL en las columnas de vector (para limpiar 384→768 o regenerar todo)."""
+    cur.execute(f"""UPDATE {tabla}
+                    SET {sql_marca(tabla)}vector = NULL, vector_blob = NULL, vector_dtype = NULL, vector_dim = NULL, vector_norm = NULL""")
+    registrar_cambios(cur, tabla, op="reset")
+    if existe_tabla(cur, tabla_pasajes(tabla)):
+        cur.execute(f"DELETE FROM {tabla_pasajes(tabla)}")
 
-# ----------------- Main -----------------
-def main():
-    # 1) Cargar modelo
+# ----------------- Pasajes (docs largos) -----------------
+def limite_tokens_pasaje(modelo, titulo, pedido=0):
+    """
+    Tokens de contenido por pasaje: lo que entra en el modelo menos el prefijo
+    "titulo. " y los tokens especiales ([CLS]/[SEP]). `pedido` > 0 lo achica.
+    """
+    maximo = int(getattr(modelo, "max_seq_length", 0) or 256)
+    prefijo = len(modelo.tokenizer(f"{titulo}. ", add_special_tokens=False)["input_ids"])
+    limite = maximo - prefijo - 2
+    if pedido > 0:
+        limite = min(limite, pedido)
+    return max(32, limite)
+
+def partir_pasajes(tokenizer, contenido, max_tokens, solape=32):
+    """
+    Ventanas de `max_tokens` tokens (con `solape` de tokens compartidos) sobre
+    `contenido`, como offsets de caracteres [(inicio, fin), ...].
+    Lista vacía si el contenido entra entero (el vector del doc ya lo cubre).
+    """
+    offsets = tokenizer(contenido, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return []
+    paso = max(1, max_tokens - max(0, solape))
+    tramos = []
+    for i in range(0, len(offsets), paso):
+        ventana = offsets[i:i + max_tokens]
+        tramos.append((int(ventana[0][0]), int(ventana[-1][1])))
+        if i + max_tokens >= len(offsets):
+            break
+    return tramos
+
+def texto_pasaje(noticia, inicio, fin):
+    """Texto a embedir de un pasaje: el título da contexto al tramo."""
+    return f"{(noticia.get('titulo') or '').strip()}. {(noticia.get('contenido') or '')[inicio:fin].strip()}"
+
+def ids_por_titulo(cur, tabla, titulos):
+    """titulo -> id de las filas recién upserteadas."""
+    if not titulos:
+        return {}
+    marcas = ", ".join(["%s"] * len(titulos))
+    cur.execute(f"SELECT id, titulo FROM {tabla} WHERE titulo IN ({marcas})", list(titulos))
+    return {t: i for (i, t) in cur.fetchall()}
+
+def calcular_pasajes(modelo, tramo, batch_size=32, max_tokens=0, solape=32, normalize=False):
+    """
+    Parte los docs largos del tramo y embebe sus pasajes en lotes (sin DB:
+    corre también dentro de los workers de --workers).
+    Devuelve [(posición en el tramo, n, char_inicio, char_fin, texto_hash, vector), ...].
+    """
+    filas, textos = [], []
+    for pos, noticia in enumerate(tramo):
+        limite = limite_tokens_pasaje(modelo, noticia.get("titulo") or "", max_tokens)
+        for n, (inicio, fin) in enumerate(partir_pasajes(modelo.tokenizer, noticia.get("contenido") or "", limite, solape)):
+            texto = texto_pasaje(noticia, inicio, fin)
+            filas.append((pos, n, inicio, fin, hash_texto(texto)))
+            textos.append(texto)
+    if not filas:
+        return []
+    vecs = generar_embeddings(modelo, textos, batch_size=batch_size, normalize=normalize)
+    return [(*f, v) for f, v in zip(filas, vecs)]
+
+def guardar_pasajes(cur, tabla, tramo, pasajes, formato):
+    """
+    Regenera los pasajes de los docs del tramo: borra los anteriores e inserta
+    los de `pasajes` (ver calcular_pasajes) con executemany.
+    Devuelve la cantidad de pasajes escritos.
+    """
+    fmt = {**FORMATO_DEFAULT, **(formato or {})}
+    tabla_p = tabla_pasajes(tabla)
+    ids = ids_por_titulo(cur, tabla, [n.get("titulo") for n in tramo])
+    if not ids:
+        return 0
+
+    marcas = ", ".join(["%s"] * len(ids))
+    cur.execute(f"DELETE FROM {tabla_p} WHERE doc_id IN ({marcas})", list(ids.values()))
+    filas = []
+    for pos, n, inicio, fin, h, v in pasajes:
+        doc_id = ids.get(tramo[pos].get("titulo"))
+        if doc_id is not None:
+            filas.append((
+                doc_id, n, inicio, fin, h, pack_vector(v, fmt["dtype"]), fmt["dtype"], int(len(v)),
+                fmt["modelo"], 1 if fmt["normalizado"] else 0,
+            ))
+    if filas:
+        cur.executemany(
+            f"""INSERT INTO {tabla_p}
+                  (doc_id, n, char_inicio, char_fin, texto_hash,
+                   vector_blob, vector_dtype, vector_dim, vector_modelo, vector_norm)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            filas,
+        )
+    return len(filas)
+
+# ----------------- Encode de un tramo (en serie o en un worker) -----------------
+def codificar_tramo(modelo, tramo, opciones):
+    """
+    Vectores del tramo (+ pasajes si opciones["passages"]).
+    Devuelve (vecs, pasajes) con pasajes = salida de calcular_pasajes (o []).
+    """
+    textos = [build_text_for_embedding(n) for n in tramo]   # título + contenido + etiquetas
+    vecs = generar_embeddings(modelo, textos, batch_size=opciones["batch_size"], normalize=opciones["normalize"])
+    pasajes = []
+    if opciones["passages"]:
+        pasajes = calcular_pasajes(
+            modelo, tramo, batch_size=opciones["batch_size"], max_tokens=opciones["passage_tokens"],
+            solape=opciones["passage_overlap"], normalize=opciones["normalize"],
+        )
+    return vecs, pasajes
+
+_MODELO_WORKER = None   # modelo de cada proceso del pool (se carga una vez en _iniciar_worker)
+_ERROR_WORKER = None    # si falló la carga: se informa en el primer tramo
+
+def _iniciar_worker(ruta_modelo, backend, threads):
+    # Una excepción en el initializer hace que el Pool relance workers sin fin:
+    # se guarda y se levanta al codificar (llega al proceso principal en res.get()).
+    global _MODELO_WORKER, _ERROR_WORKER
     try:
-        modelo, emb_dim = cargar_modelo_local()
+        _MODELO_WORKER = cargar_modelo(ruta_modelo, backend, threads=threads)
+        print(f"✅ Worker {os.getpid()}: modelo cargado ({threads} hilos)")
     except Exception as e:
-        print("❌ No se pudo cargar el modelo local:", e)
-        raise
+        _ERROR_WORKER = f"{type(e).__name__}: {e}"
+
+def _codificar_en_worker(tramo, opciones):
+    if _MODELO_WORKER is None:
+        raise RuntimeError(f"Worker {os.getpid()} sin modelo ({_ERROR_WORKER})")
+    t = time.perf_counter()
+    vecs, pasajes = codificar_tramo(_MODELO_WORKER, tramo, opciones)
+    return vecs, pasajes, {"worker": os.getpid(), "encode_s": time.perf_counter() - t}
+
+def codificar_en_paralelo(tramos, workers, opciones, ruta_modelo, backend, threads=0):
+    """
+    Reparte los tramos en un pool de `workers` procesos y los devuelve EN ORDEN:
+    genera (tramo, vecs, pasajes, {"worker", "encode_s"}). El pool se crea
+    recién con el primer tramo (modo incremental sin pendientes = sin modelos).
+    """
+    tramos = iter(tramos)
+    primero = next(tramos, None)
+    if primero is None:
+        return
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"🧵 Pool de {workers} workers × {threads} hilos")
+    # "spawn": igual en Linux y Windows, y sin heredar la conexión MySQL del padre
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=_iniciar_worker, initargs=(ruta_modelo, backend, threads)) as pool:
+        en_vuelo = collections.deque()
+        for tramo in itertools.chain([primero], tramos):
+            en_vuelo.append((tramo, pool.apply_async(_codificar_en_worker, (tramo, opciones))))
+            if len(en_vuelo) >= 2 * workers:
+                tramo, res = en_vuelo.popleft()
+                yield (tramo, *res.get())
+        while en_vuelo:
+            tramo, res = en_vuelo.popleft()
+            yield (tramo, *res.get())
+
+# ----------------- Pipeline por tramos -----------------
+def iterar_tramos(noticias, tamano):
+    """Agrupa el stream de ítems válidos en listas de hasta `tamano`."""
+    tramo = []
+    for n in noticias:
+        # Validaciones mínimas
+        titulo = (n.get("titulo") or "").strip()
+        contenido = (n.get("contenido") or "").strip()
+        if not titulo or not contenido:
+            print("⚠️  Saltando item sin 'titulo' o 'contenido':", n)
+            continue
+        tramo.append(n)
+        if len(tramo) >= tamano:
+            yield tramo
+            tramo = []
+    if tramo:
+        yield tramo
+
+# ----------------- Main -----------------
+def main(argv=None):
+    args = parser.parse_args(argv)  # parseo de flags
+    if (args.shadow or args.cutover) and (args.wipe_vectors or args.incremental or args.passages):
+        parser.error("--shadow/--cutover no se combinan con --wipe-vectors, --incremental ni --passages.")
+    ident = modelo_id(args.model_dir, args.backend, args.normalize)
+    formato = {"modelo": ident, "storage": args.storage, "dtype": args.dtype, "normalizado": args.normalize}
 
-    # 2) Leer JSON
-    if not os.path.exists(RUTA_JSON):
-        raise FileNotFoundError(f"No existe el archivo {RUTA_JSON}")
-    print(f"📄 Leyendo JSON: {RUTA_JSON}")
-    noticias = cargar_json(RUTA_JSON)
+    # 1) Cargar modelo (en modo incremental, recién si hay algo pendiente;
+    #    con --workers lo carga cada worker, no el proceso principal)
+    modelo, emb_dim = None, None
+    if not (args.incremental or args.shadow or args.cutover) and args.workers <= 1:
+        try:
+            modelo, emb_dim = cargar_modelo_local(args.model_dir, args.backend)
+        except Exception as e:
+            print("❌ No se pudo cargar el modelo local:", e)
+            raise
+
+    # 2) Abrir JSON (se lee en streaming dentro del loop; --shadow lee la tabla)
+    if args.shadow or args.cutover:
+        print(f"🌓 Modo sombra: modelo {ident} → {tabla_sombra(args.table)}")
+    elif not os.path.exists(args.json):
+        raise FileNotFoundError(f"No existe el archivo {args.json}")
+    else:
+        print(f"📄 Leyendo JSON: {args.json}")
 
     # 3) Conectar DB
-    conn = crear_conexion()
+    conn = crear_conexion(db_config(args))
     cur = conn.cursor()
 
     try:
-        # 3.a) (opcional) limpiar vectores previos
+        # 3.a) Columnas de metadatos (texto_hash, vector_modelo, vector_dim)
+        creadas = asegurar_columnas(cur, args.table)
+        if creadas:
+            print(f"🧱 Columnas agregadas a {args.table}: {', '.join(creadas)}")
+        _, aviso = asegurar_clave_unica(cur, args.table, "titulo")   # el UPSERT es ON DUPLICATE KEY (titulo)
+        if aviso:
+            print(f"🧱 {aviso}")
+        asegurar_tabla_cambios(cur, args.table)                       # recarga delta en index.js
+        preparar_marca(cur, args.table)                               # re-embedir no fuerza re-export del CRUD
+        conn.commit()                                                 # (poda del registro)
+        if args.passages:
+            print(f"🧩 Pasajes en {asegurar_tabla_pasajes(cur, args.table)} (solape {args.passage_overlap} tokens)")
+
+        # 3.b) (opcional) limpiar vectores previos
         if args.wipe_vectors:
             print("🧹 Limpiando columna 'vector' (NULL para todos los registros)…")
             wipe_vectors(cur, args.table)
             conn.commit()
 
-        insertadas = 0
-        actualizadas = 0
+        # 3.c) Fuente de ítems: todo el JSON, solo lo pendiente (incremental)
+        #      o las filas de la tabla sin sombra al día (--shadow)
+        contador = {"saltadas": 0, "vistos": set()}
+        if args.shadow or args.cutover:
+            asegurar_tabla_sombra(cur, args.table)
+            conn.commit()
+            noticias = filas_para_sombra(conn, args.table, ident, contador) if args.shadow else iter(())
+        else:
+            noticias = iterar_noticias(args.json)
+        if args.incremental:
+            estado = cargar_estado(cur, args.table)
+            noticias = itertools.chain(
+                filtrar_pendientes(noticias, estado, ident, contador),
+                filas_sin_vector(conn, args.table, contador["vistos"]),
+            )
 
-        # 4) Recorrer items y hacer UPSERT
-        for n in noticias:
-            # Validaciones mínimas
-            titulo = (n.get("titulo") or "").strip()
-            contenido = (n.get("contenido") or "").strip()
-            if not titulo or not contenido:
-                print("⚠️  Saltando item sin 'titulo' o 'contenido':", n)
-                continue
+        docs = 0
+        afectadas = 0
+        pasajes = 0
+        t_encode = 0.0
+        t_db = 0.0
+        t0 = time.perf_counter()
+        por_worker = collections.defaultdict(lambda: [0, 0.0])    # pid → [docs, segundos de encode]
+
+        # 4) Por tramo: encode en lotes (acá o en el pool) + UPSERT con executemany + commit
+        opciones = {
+            "batch_size": args.batch_size, "normalize": args.normalize, "passages": args.passages,
+            "passage_tokens": args.passage_tokens, "passage_overlap": args.passage_overlap,
+        }
+        tramos = iterar_tramos(noticias, max(1, args.chunk))
 
-            # Texto a embedir: título + contenido + etiquetas
-            texto_embed = build_text_for_embedding(n)
+        def en_serie():
+            nonlocal modelo, emb_dim, t0
+            for tramo in tramos:
+                if modelo is None:
+                    modelo, emb_dim = cargar_modelo_local(args.model_dir, args.backend)
+                    t0 = time.perf_counter()            # no contamos la carga del modelo
+                t = time.perf_counter()
+                vecs, pas = codificar_tramo(modelo, tramo, opciones)
+                yield tramo, vecs, pas, {"worker": os.getpid(), "encode_s": time.perf_counter() - t}
+
+        if args.workers > 1:
+            codificados = codificar_en_paralelo(
+                tramos, args.workers, opciones, args.model_dir, args.backend, args.worker_threads,
+            )
+        else:
+            codificados = en_serie()
 
-            # Generar vector y subir a la tabla
-            vec = generar_embedding(modelo, texto_embed)
-            upsert_noticia(cur, args.table, n, vec)
+        n_tramo = 0
+        while True:
+            t1 = time.perf_counter()
+            siguiente = next(codificados, None)            # espera el encode del próximo tramo (en orden)
+            t2 = time.perf_counter()
+            if siguiente is None:
+                break
+            tramo, vecs, pas, trabajo = siguiente
+            n_tramo += 1
+            emb_dim = emb_dim or (len(vecs[0]) if len(vecs) else None)
 
-            # Heurística para contabilizar inserts/updates
-            if cur.rowcount == 1:
-                insertadas += 1
-                print(f"✅ Insertada: {titulo}")
+            if args.shadow:
+                afectadas += guardar_sombra(cur, args.table, tramo, vecs, formato)
             else:
-                actualizadas += 1
-                print(f"♻️  Actualizada: {titulo}")
+                afectadas += upsert_lote(cur, args.table, tramo, vecs, formato)
+            if args.passages:
+                # mismo commit que los docs: vector del doc y sus pasajes quedan al día juntos
+                pasajes += guardar_pasajes(cur, args.table, tramo, pas, formato)
+            conn.commit()
+            t3 = time.perf_counter()
 
-        # 5) Confirmar cambios
-        conn.commit()
-        print(f"\n🎉 Listo. Insertadas: {insertadas} | Actualizadas: {actualizadas}")
-        print(f"📏 Verificación sugerida en MySQL: JSON_LENGTH(vector) = {emb_dim}")
+            docs += len(tramo)
+            # sin pool: tiempo de encode puro; con pool: lo que el writer esperó al tramo
+            t_encode += trabajo["encode_s"] if args.workers <= 1 else t2 - t1
+            t_db += t3 - t2
+            w = por_worker[trabajo["worker"]]
+            w[0] += len(tramo)
+            w[1] += trabajo["encode_s"]
+            print(
+                f"📦 Tramo {n_tramo}: {len(tramo)} docs | total {docs} | "
+                f"{docs / max(1e-9, time.perf_counter() - t0):.1f} docs/s "
+                f"(encode {len(tramo) / max(1e-9, trabajo['encode_s']):.1f} docs/s"
+                + (f" en worker {trabajo['worker']}" if args.workers > 1 else "")
+                + f", DB {t3 - t2:.2f}s)"
+            )
+
+        # 5) Resumen
+        total = time.perf_counter() - t0
+        if args.incremental or args.shadow:
+            print(f"\n⏭️  Al día (sin re-embedir): {contador['saltadas']}")
+        if modelo is None and not docs:
+            print("🎉 Nada pendiente: no hizo falta cargar el modelo.")
+        else:
+            print(f"\n🎉 Listo. Documentos: {docs} | Filas afectadas (MySQL): {afectadas}")
+            if args.passages:
+                print(f"🧩 Pasajes (docs largos): {pasajes}")
+            print(f"⏱️  {total:.1f}s → {docs / max(1e-9, total):.1f} docs/s (encode {t_encode:.1f}s, DB {t_db:.1f}s)")
+            if args.workers > 1:
+                for pid, (n_docs, seg) in sorted(por_worker.items()):
+                    print(f"   🧵 worker {pid}: {n_docs} docs en {seg:.1f}s → {n_docs / max(1e-9, seg):.1f} docs/s")
+            print(f"📏 Verificación sugerida en MySQL: vector_dim = {emb_dim} (modelo {ident}, storage {args.storage})")
+
+        # 5.b) Cutover: la sombra pasa a las columnas en uso (todo o nada)
+        promovidas = 0
+        if args.cutover:
+            pendientes, promovidas = promover_sombra(conn, args.table, ident)
+            if pendientes:
+                print(f"⛔ Cutover cancelado: {pendientes} filas sin vector {ident} al día en la sombra "
+                      "(correr --shadow de nuevo).")
+            elif not promovidas:
+                print(f"⛔ Cutover cancelado: no hay vectores {ident} en la sombra.")
+            else:
+                print(f"🔀 Cutover: {promovidas} filas pasaron a {ident}.")
+
+        # 6) Índice en disco para index.js (solo si cambió algo o todavía no existe;
+        #    la sombra no cambia lo que se sirve hasta el cutover)
+        cambio = promovidas or (docs and not args.shadow)
+        if not args.no_index and (cambio or version_actual(args.index_dir) is None):
+            t4 = time.perf_counter()
+            m = exportar_desde_db(conn, args.index_dir, args.table, texto=build_text_for_embedding)
+            print(
+                f"🗂️  Índice {m['version']}: {m['count']} vectores x {m['dim']} dims → "
+                f"{args.index_dir} ({time.perf_counter() - t4:.1f}s)"
+            )
+
+        # 7) Aviso al backend (CACHE_NOTIFY_URL): aplica solo las filas cambiadas
+        if (cambio or args.wipe_vectors) and notificar_cambios():
+            print("🔔 Backend avisado: recarga delta de los cambios.")
 
     except mysql.connector.Error as err:
         conn.rollback()
@@ -0,0 +1,387 @@
+# vector_index.py
+# ======================================================================
+# Índice de vectores en disco (artefacto que exporta el seeder).
+#
+# Para que index.js (y el servicio Python) arranquen/recarguen sin traer
+# y parsear todos los vectores desde MySQL, el corpus se vuelca a una
+# matriz float32 contigua que se puede mapear en memoria (mmap).
+#
+# Estructura:
+#   indice/
+#     CURRENT               → nombre de la versión activa (ej. "v20261017-120000-000123")
+#     v20261017-120000-000123/
+#       vectors.f32         → matriz float32 little-endian (count x dim), filas de norma 1
+#       manifest.json       → { version, created_at, model, dim, count, dtype,
+#                               normalized, row_bytes, docs_file, lexical_file,
+#                               ids: [...], hashes: [...] }
+#       docs.jsonl          → una línea por fila: {"id", "titulo", "contenido", "etiquetas"}
+#       lexico.json         → índice invertido + estadísticas BM25 + token sets de
+#                             etiquetas, armado con el mismo texto que se vectoriza
+#                             (búsqueda híbrida y fallback BM25; ver lexical.py)
+#       pasajes.f32         → (opcional) vectores de pasajes de docs largos, float32
+#                             de norma 1 (ver seed_local_embeddings.py --passages);
+#                             en el manifest, "passages": { file, count, rows,
+#                             starts, ends } con la fila del doc y los offsets de
+#                             caracteres sobre `contenido` de cada pasaje
+#       ivf_<nlist>.npz     → (corpus grandes) centroides + asignación del IVF,
+#                             entrenados acá una vez por versión (ver vector_search.py);
+#                             en el manifest, "ivf": { file, nlist, build_s }
+#
+#   - La fila i corresponde a ids[i] y empieza en el byte i * row_bytes.
+#   - hashes[i] es el texto_hash de la fila (para detectar vectores viejos).
+#   - Los pasajes quedan ordenados por fila de doc (rows no decrece): los de
+#     un doc son un tramo contiguo de pasajes.f32.
+#   - Cada exportación escribe una carpeta NUEVA y recién al final cambia
+#     CURRENT con un rename atómico: un lector nunca ve un índice a medias.
+#   - Se conservan las últimas KEEP_VERSIONS versiones (los lectores que
+#     tengan mapeada la anterior no se quedan sin archivo).
+#
+# Uso:
+#   python vector_index.py export [--out indice] [--host ... --database ...]
+#   python vector_index.py info   [--out indice]
+#   (seed_local_embeddings.py lo exporta solo al terminar, salvo --no-index)
+# ======================================================================
+
+import os                      # rutas / rename atómico
+import json                    # manifest
+import time                    # sello de versión
+import shutil                  # limpieza de versiones viejas
+import argparse                # CLI
+import numpy as np             # matriz float32 / memmap
+from lexical import ConstructorLexico
+from vector_store import SQL_TIENE_VECTOR, existe_tabla, leer_vector, tabla_pasajes
+
+INDEX_DIR_DEFAULT = "indice"
+VECTORS_FILE = "vectors.f32"
+MANIFEST_FILE = "manifest.json"
+DOCS_FILE = "docs.jsonl"
+LEXICO_FILE = "lexico.json"
+PASSAGES_FILE = "pasajes.f32"
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 2
+
+# ----------------- Escritura -----------------
+def _nueva_version() -> str:
+    t = time.time()
+    return time.strftime("v%Y%m%d-%H%M%S", time.localtime(t)) + f"-{int((t % 1) * 1e6):06d}"
+
+def _fsync_escribir(ruta, data: bytes):
+    with open(ruta, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+def publicar_version(out_dir: str, version: str):
+    """Apunta CURRENT a `version` con un rename atómico y limpia versiones viejas."""
+    tmp = os.path.join(out_dir, CURRENT_FILE + ".tmp")
+    _fsync_escribir(tmp, version.encode("utf-8"))
+    os.replace(tmp, os.path.join(out_dir, CURRENT_FILE))
+
+    versiones = sorted(d for d in os.listdir(out_dir) if d.startswith("v") and os.path.isdir(os.path.join(out_dir, d)))
+    for viejo in versiones[:-KEEP_VERSIONS]:
+        if viejo != version:
+            shutil.rmtree(os.path.join(out_dir, viejo), ignore_errors=True)
+
+def _resumir_modelos(modelos):
+    """Set de vector_modelo vistos → un nombre, lista (con aviso) o None."""
+    if not isinstance(modelos, (set, frozenset)):
+        return modelos
+    nombres = sorted(m for m in modelos if m)
+    if len(nombres) > 1:
+        print(f"⚠️  El índice mezcla vectores de varios modelos: {', '.join(nombres)}")
+    return nombres[0] if len(nombres) == 1 else (nombres or None)
+
+def _escribir_pasajes(vdir: str, pasajes, fila_de_id: dict, dim: int):
+    """
+    Escribe pasajes.f32 con los pasajes de docs presentes en el índice.
+    `pasajes`: iterable de (doc_id, n, char_inicio, char_fin, vector), en orden de doc.
+    Devuelve la entrada "passages" del manifest o None si no hubo ninguno.
+    """
+    rows, starts, ends = [], [], []
+    with open(os.path.join(vdir, PASSAGES_FILE), "wb") as f:
+        for doc_id, _n, inicio, fin, vec in pasajes:
+            fila = fila_de_id.get(int(doc_id))
+            vec = np.asarray(vec, dtype="<f4")
+            if fila is None or vec.shape[0] != dim:
+                continue                      # doc sin vector en el índice u otro modelo
+            norma = float(np.linalg.norm(vec))
+            if norma > 0:
+                vec = vec / norma
+            f.write(vec.astype("<f4").tobytes())
+            rows.append(fila)
+            starts.append(int(inicio))
+            ends.append(int(fin))
+        f.flush()
+        os.fsync(f.fileno())
+    if not rows:
+        os.remove(os.path.join(vdir, PASSAGES_FILE))
+        return None
+    return {"file": PASSAGES_FILE, "count": len(rows), "rows": rows, "starts": starts, "ends": ends}
+
+def _entrenar_ivf(vdir: str, count: int, dim: int):
+    """
+    Entrena el IVF de la versión al exportar, así los workers de búsqueda solo
+    lo cargan. None si el corpus es chico o falta sklearn (en ese caso lo
+    entrena el servicio, en segundo plano).
+    """
+    from vector_search import IVF_MIN, construir_ivf, ruta_ivf
+    if count < max(2, IVF_MIN):
+        return None
+    mat = np.memmap(os.path.join(vdir, VECTORS_FILE), dtype="<f4", mode="r", shape=(count, dim))
+    t0 = time.perf_counter()
+    try:
+        nlist = construir_ivf(mat, vdir)
+    except ImportError:
+        print("⚠️  sklearn no está instalado: el IVF lo entrenará el servicio de búsqueda")
+        return None
+    return {"file": os.path.basename(ruta_ivf(vdir, nlist)), "nlist": nlist,
+            "build_s": round(time.perf_counter() - t0, 3)}
+
+def escribir_indice(out_dir: str, filas, model=None, extra: dict = None, texto=None, pasajes=None) -> dict:
+    """
+    Escribe una versión nueva del índice a partir de `filas`:
+    iterable de (id, vector numpy, texto_hash[, doc]). Los vectores se guardan
+    normalizados (norma 1); si vienen `doc` (dict de metadatos) se escriben
+    también docs.jsonl y lexico.json. Devuelve el manifest publicado.
+    - texto: función doc → texto para el índice léxico (el seeder pasa
+      build_text_for_embedding; default: título + contenido + etiquetas).
+    - model: nombre del modelo, o un set que `filas` va completando
+      (se resuelve al final, cuando ya se recorrieron todas las filas).
+    - pasajes: iterable opcional de (doc_id, n, char_inicio, char_fin, vector)
+      ordenado por doc_id (ver filas_pasajes_desde_db).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    version = _nueva_version()
+    vdir = os.path.join(out_dir, version)
+    os.makedirs(vdir)
+
+    ids, hashes, dim, con_docs = [], [], None, False
+    lexico = ConstructorLexico()
+    ruta_docs = os.path.join(vdir, DOCS_FILE)
+    with open(os.path.join(vdir, VECTORS_FILE), "wb") as f, open(ruta_docs, "w", encoding="utf-8") as fd:
+        for id_, vec, h, *resto in filas:
+            vec = np.asarray(vec, dtype="<f4")
+            if dim is None:
+                dim = int(vec.shape[0])
+            elif vec.shape[0] != dim:
+                print(f"⚠️  Saltando id {id_}: dim {vec.shape[0]} ≠ {dim}")
+                continue
+            norma = float(np.linalg.norm(vec))
+            if norma > 0:
+                vec = vec / norma
+            f.write(vec.astype("<f4").tobytes())
+            ids.append(int(id_))
+            hashes.append(h)
+            doc = resto[0] if resto else None
+            con_docs = con_docs or doc is not None
+            if doc is not None:
+                lexico.agregar(texto(doc) if texto else " ".join(
+                    str(doc.get(c) or "") for c in ("titulo", "contenido", "etiquetas")
+                ), doc.get("etiquetas") or "")
+            else:
+                lexico.agregar("")            # mantiene la numeración de filas
+            fd.write(json.dumps({"id": int(id_), **(doc or {})}, ensure_ascii=False, default=str) + "\n")
+        for fh in (f, fd):
+            fh.flush()
+            os.fsync(fh.fileno())
+    if con_docs:
+        _fsync_escribir(os.path.join(vdir, LEXICO_FILE),
+                        json.dumps(lexico.a_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    else:
+        os.remove(ruta_docs)
+    info_pasajes = None
+    if pasajes is not None and ids:
+        info_pasajes = _escribir_pasajes(vdir, pasajes, {id_: i for i, id_ in enumerate(ids)}, dim)
+    info_ivf = _entrenar_ivf(vdir, len(ids), dim) if ids else None
+
+    manifest = {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": _resumir_modelos(model),
+        "dim": dim or 0,
+        "count": len(ids),
+        "dtype": "f32",
+        "normalized": True,
+        "row_bytes": (dim or 0) * 4,
+        "docs_file": DOCS_FILE if con_docs else None,
+        "lexical_file": LEXICO_FILE if con_docs else None,
+        "ids": ids,
+        "hashes": hashes,
+        "passages": info_pasajes,
+        "ivf": info_ivf,
+    }
+    if extra:
+        manifest.update(extra)
+    _fsync_escribir(os.path.join(vdir, MANIFEST_FILE), json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+    publicar_version(out_dir, version)
+    return manifest
+
+def filas_desde_db(conn, tabla: str = "conocimiento", lote: int = 500, modelos: set = None):
+    """
+    Recorre los vectores de la tabla en orden de id (keyset, memoria acotada).
+    Genera (id, vector numpy, texto_hash, doc) con doc = titulo/contenido/etiquetas.
+    Si se pasa `modelos`, anota ahí los vector_modelo vistos.
+    """
+    cur = conn.cursor()
+    ultimo_id = 0
+    try:
+        while True:
+            cur.execute(
+                f"""SELECT id, vector_blob, vector_dtype, vector, texto_hash, vector_modelo,
+                           titulo, contenido, etiquetas
+                    FROM {tabla}
+                    WHERE id > %s AND {SQL_TIENE_VECTOR}
+                    ORDER BY id LIMIT %s""",
+                (ultimo_id, lote),
+            )
+            filas = cur.fetchall()
+            if not filas:
+                return
+            for id_, blob, dtype, raw, h, modelo, titulo, contenido, etiquetas in filas:
+                vec = leer_vector(blob, dtype, raw)
+                if vec is not None:
+                    if modelos is not None:
+                        modelos.add(modelo)
+                    yield id_, vec, h, {"titulo": titulo, "contenido": contenido, "etiquetas": etiquetas}
+            ultimo_id = filas[-1][0]
+    finally:
+        cur.close()
+
+def filas_pasajes_desde_db(conn, tabla: str = "conocimiento", lote: int = 2000):
+    """
+    Recorre `<tabla>_pasajes` en orden (doc_id, n) (keyset sobre la clave única).
+    Genera (doc_id, n, char_inicio, char_fin, vector numpy).
+    """
+    cur = conn.cursor()
+    ultimo = (0, -1)
+    try:
+        while True:
+            cur.execute(
+                f"""SELECT doc_id, n, char_inicio, char_fin, vector_blob, vector_dtype
+                    FROM {tabla_pasajes(tabla)}
+                    WHERE (doc_id, n) > (%s, %s)
+                    ORDER BY doc_id, n LIMIT %s""",
+                (*ultimo, lote),
+            )
+            filas = cur.fetchall()
+            if not filas:
+                return
+            for doc_id, n, inicio, fin, blob, dtype in filas:
+                yield doc_id, n, inicio, fin, leer_vector(blob, dtype, None)
+            ultimo = (filas[-1][0], filas[-1][1])
+    finally:
+        cur.close()
+
+def exportar_desde_db(conn, out_dir: str = INDEX_DIR_DEFAULT, tabla: str = "conocimiento", texto=None) -> dict:
+    """
+    Exporta todos los vectores de `tabla` a una nueva versión del índice.
+    El índice léxico usa `texto` (default: build_text_for_embedding del seeder).
+    Si existe `<tabla>_pasajes`, exporta también los pasajes.
+    """
+    if texto is None:
+        from seed_local_embeddings import build_text_for_embedding as texto
+    modelos = set()
+    cur = conn.cursor()
+    try:
+        con_pasajes = existe_tabla(cur, tabla_pasajes(tabla))
+    finally:
+        cur.close()
+    return escribir_indice(
+        out_dir, filas_desde_db(conn, tabla, modelos=modelos), model=modelos, texto=texto,
+        pasajes=filas_pasajes_desde_db(conn, tabla) if con_pasajes else None,
+    )
+
+# ----------------- Lectura -----------------
+def version_actual(out_dir: str = INDEX_DIR_DEFAULT):
+    """Nombre de la versión activa o None si no hay índice."""
+    try:
+        with open(os.path.join(out_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def cargar_indice(out_dir: str = INDEX_DIR_DEFAULT, version: str = None):
+    """
+    Mapea en memoria la versión activa (o la pedida).
+    Devuelve (matriz np.memmap de solo lectura [count x dim], manifest) o (None, None).
+    """
+    version = version or version_actual(out_dir)
+    if not version:
+        return None, None
+    vdir = os.path.join(out_dir, version)
+    with open(os.path.join(vdir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if not manifest["count"]:
+        return np.zeros((0, manifest["dim"]), dtype=np.float32), manifest
+    mat = np.memmap(
+        os.path.join(vdir, VECTORS_FILE), dtype="<f4", mode="r",
+        shape=(manifest["count"], manifest["dim"]),
+    )
+    return mat, manifest
+
+def cargar_docs(out_dir: str, manifest: dict):
+    """Metadatos por fila (docs.jsonl) de la versión del manifest, o None si no se exportaron."""
+    if not manifest or not manifest.get("docs_file"):
+        return None
+    with open(os.path.join(out_dir, manifest["version"], manifest["docs_file"]), "r", encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+def cargar_pasajes(out_dir: str, manifest: dict):
+    """
+    Pasajes de la versión del manifest: (matriz memmap [count x dim], info del
+    manifest con rows/starts/ends) o (None, None) si no se exportaron.
+    """
+    info = (manifest or {}).get("passages")
+    if not info or not info.get("count"):
+        return None, None
+    mat = np.memmap(
+        os.path.join(out_dir, manifest["version"], info["file"]), dtype="<f4", mode="r",
+        shape=(info["count"], manifest["dim"]),
+    )
+    return mat, info
+
+def cargar_lexico(out_dir: str, manifest: dict):
+    """Contenido de lexico.json de la versión del manifest, o None si no se exportó."""
+    if not manifest or not manifest.get("lexical_file"):
+        return None
+    with open(os.path.join(out_dir, manifest["version"], manifest["lexical_file"]), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# ----------------- CLI -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice de vectores en disco (mmap).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_exp = sub.add_parser("export", help="Exporta los vectores de MySQL a un índice nuevo.")
+    p_exp.add_argument("--out", default=INDEX_DIR_DEFAULT)
+    p_exp.add_argument("--table", default="conocimiento")
+    p_exp.add_argument("--host", default="localhost")
+    p_exp.add_argument("--user", default="museo")
+    p_exp.add_argument("--password", default="museo2025")
+    p_exp.add_argument("--database", default="museo")
+    p_inf = sub.add_parser("info", help="Muestra la versión activa del índice.")
+    p_inf.add_argument("--out", default=INDEX_DIR_DEFAULT)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        import mysql.connector
+        conn = mysql.connector.connect(host=args.host, user=args.user, password=args.password, database=args.database)
+        try:
+            m = exportar_desde_db(conn, args.out, args.table)
+        finally:
+            conn.close()
+        print(f"🗂️  Índice {m['version']}: {m['count']} vectores x {m['dim']} dims → {args.out}")
+    else:
+        mat, m = cargar_indice(args.out)
+        if m is None:
+            print(f"ℹ️ No hay índice en {args.out}")
+            return
+        info = {k: v for k, v in m.items() if k not in ("ids", "hashes", "passages")}
+        if m.get("passages"):
+            info["passages"] = {"count": m["passages"]["count"], "docs": len(set(m["passages"]["rows"]))}
+        lex = cargar_lexico(args.out, m)
+        if lex:
+            info["lexical"] = {"N": lex["N"], "vocab": len(lex["vocab"]), "avgdl": round(lex["avgdl"], 1)}
+        print(json.dumps(info, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,632 @@
+# vector_search.py
+# ======================================================================
+# Búsqueda de vecinos más cercanos sobre el índice en disco
+# (el que exporta el seeder, ver vector_index.py). La usa embed_service.py
+# en POST /search: embebe la consulta y devuelve ids + scores en un solo viaje.
+#
+# Modos:
+#   - "exact" → producto punto contra TODA la matriz (mmap) + argpartition.
+#               Resultado exacto; sirve de referencia para medir recall.
+#   - "ivf"   → índice IVF (inverted file): k-means esférico sobre los vectores
+#               (sklearn), cada doc queda en la lista de su centroide más
+#               cercano y la consulta solo recorre las `nprobe` listas cuyos
+#               centroides más se le parecen. Costo ~ n * nprobe / nlist.
+#   - "auto"  → ivf si el índice tiene IVF entrenado; si no, exact.
+#   - "bm25"  → solo léxico (lexico.json, ver lexical.py): no necesita el
+#               modelo; es el respaldo cuando no se puede embeber la consulta.
+#
+# Varias consultas a la vez (buscar_lote): en modo exact es UN solo matmul
+# (consultas x docs) + argpartition por fila; útil para evaluaciones offline.
+#
+# Búsqueda híbrida (buscar_hibrido): al coseno se le suman los mismos bonus
+# que aplica index.js (Jaccard de etiquetas y solapamiento de tokens, ver
+# lexical.py), con los tokens de cada doc precalculados al cargar el índice.
+# Parámetros por defecto: sección "search" de app.config.json
+# (sim_threshold, tag_match_bonus, tag_bypass_sim, overlap_bonus_*).
+#
+# Pasajes (si el índice trae pasajes.f32, ver seed_local_embeddings.py --passages):
+# el coseno de un doc largo es el MAYOR entre el de su vector y el de su mejor
+# pasaje, y el hit trae "passage": {start, end, sim} (offsets sobre `contenido`)
+# para armar el snippet. Los pasajes se recorren completos también en modo
+# ivf: son pocos (solo docs largos) y así un doc no se pierde por su centroide.
+#
+# El IVF solo se entrena con corpus grandes (EMBED_IVF_MIN filas): con pocos
+# cientos de docs el scan exacto ya es instantáneo. Lo entrena el export
+# (vector_index.py, una vez por versión) y queda junto a la versión del índice
+# (ivf_<nlist>.npz): los workers solo lo cargan. Si falta (índice exportado sin
+# sklearn o con otro EMBED_IVF_NLIST), el servicio lo entrena en un hilo
+# aparte y mientras tanto "auto" responde con exact.
+#
+# Variables de entorno:
+#   EMBED_INDEX_DIR   → carpeta del índice (default "indice")
+#   EMBED_IVF_MIN     → filas mínimas para entrenar IVF (default 4096)
+#   EMBED_IVF_NLIST   → nº de listas (default 0 = auto, ≈ 4·√n)
+#   EMBED_IVF_NPROBE  → listas a recorrer por consulta (default 8)
+#
+# Medir recall del IVF contra el exacto:
+#   python vector_search.py recall [--index-dir indice] [--k 10] [--nprobe 8]
+# ======================================================================
+
+import os                      # rutas / variables de entorno
+import json                    # salida de la CLI
+import time                    # tiempos de entrenamiento
+import argparse                # CLI
+import threading               # recarga segura con Flask en hilos
+import numpy as np             # matriz de vectores / top-k
+from lexical import ConsultaLexica, IndiceLexico
+from vector_index import INDEX_DIR_DEFAULT, CURRENT_FILE, cargar_docs, cargar_indice, cargar_lexico, cargar_pasajes
+
+IVF_MIN = int(os.environ.get("EMBED_IVF_MIN", "4096"))
+IVF_NLIST = int(os.environ.get("EMBED_IVF_NLIST", "0"))
+IVF_NPROBE = int(os.environ.get("EMBED_IVF_NPROBE", "8"))
+MODOS = ("auto", "exact", "ivf", "bm25")
+RELLENO_ID = -1                 # id de relleno en buscar_lote (IVF con menos de k candidatos)
+
+# ----------------- Parámetros híbridos (mismos defaults que index.js) -----------------
+PARAMS_HIBRIDO_DEFAULT = {
+    "sim_threshold": 0.16,
+    "tag_match_bonus": 0.04,
+    "tag_bypass_sim": 0.70,
+    "overlap_bonus_per_token": 0.0,
+    "overlap_bonus_max": 0.0,
+}
+
+def cargar_params_hibridos(ruta: str = "app.config.json") -> dict:
+    """Defaults + lo que haya en la sección "search" de app.config.json."""
+    params = dict(PARAMS_HIBRIDO_DEFAULT)
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            search = json.load(f).get("search") or {}
+        params.update({k: float(search[k]) for k in params if k in search})
+    except (OSError, ValueError):
+        pass
+    return params
+
+PARAMS_HIBRIDO = cargar_params_hibridos(os.environ.get("APP_CONFIG", "app.config.json"))
+
+# ----------------- Top-k -----------------
+def top_k(scores, k: int):
+    """Índices de los k mayores `scores`, ordenados de mayor a menor (argpartition + sort de k)."""
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+def top_k_lote(scores, k: int):
+    """top_k por fila de una matriz (consultas x docs). Devuelve índices (consultas x k)."""
+    m, n = scores.shape
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((m, 0), dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (m, 1))
+    orden = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(idx, orden, axis=1)
+
+def apilar_resultados(ids, scores, ancho: int):
+    """
+    Junta los top-k de cada consulta en matrices (m x ancho). En IVF las listas
+    sondeadas pueden traer menos de k candidatos: esas filas se rellenan con
+    id RELLENO_ID y score -inf (ver sin_relleno).
+    """
+    I = np.full((len(ids), ancho), RELLENO_ID, dtype=np.int64)
+    S = np.full((len(ids), ancho), -np.inf, dtype=np.float32)
+    for j, (i, s) in enumerate(zip(ids, scores)):
+        I[j, :len(i)] = i
+        S[j, :len(s)] = s
+    return I, S
+
+def sin_relleno(ids, scores):
+    """Quita el relleno de una fila de apilar_resultados. Devuelve (ids, scores)."""
+    ok = np.asarray(ids) != RELLENO_ID
+    return np.asarray(ids)[ok], np.asarray(scores)[ok]
+
+def nlist_para(n: int, nlist: int = IVF_NLIST) -> int:
+    """Nº de listas para n filas: el pedido, o ≈ 4·√n si es 0 (entre 1 y n/2)."""
+    nlist = nlist or int(4 * np.sqrt(n))
+    return max(1, min(nlist, n // 2 or 1))
+
+def ruta_ivf(vdir: str, nlist: int) -> str:
+    return os.path.join(vdir, f"ivf_{nlist}.npz")
+
+def normalizar(vec):
+    """Copia float32 con norma 1 (la matriz del índice ya viene normalizada)."""
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+    n = float(np.linalg.norm(vec))
+    return vec / n if n > 0 else vec
+
+def normalizar_filas(mat):
+    """Matriz float32 (m x dim) con cada fila de norma 1."""
+    mat = np.atleast_2d(np.asarray(mat, dtype=np.float32))
+    return mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+
+# ----------------- Índice -----------------
+class IndiceBusqueda:
+    """
+    Matriz del índice (count x dim, filas de norma 1) + IVF opcional
+    + datos léxicos precalculados (si el índice trae docs.jsonl)
+    + pasajes de docs largos (si el índice trae pasajes.f32).
+    Inmutable una vez construido: para recargar se crea uno nuevo y se reemplaza.
+    """
+
+    def __init__(self, mat, manifest: dict, vdir: str = None, lexico: IndiceLexico = None, pasajes=None,
+                 ivf_min: int = IVF_MIN, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, ivf_fondo: bool = False):
+        self.mat = mat
+        self.manifest = manifest
+        self.version = manifest.get("version")
+        self.dim = int(manifest.get("dim") or 0)
+        self.ids = np.asarray(manifest.get("ids") or [], dtype=np.int64)
+        self.nprobe = max(1, nprobe)
+        self.centroides = None        # (nlist x dim) normalizados
+        self.listas = None            # lista de arrays de filas por centroide
+        self.ivf_s = None             # segundos que tomó entrenar/cargar el IVF
+        self.ivf_estado = None        # None | "training" (en un hilo, ver ivf_fondo) | "ready" | "error"
+        self.lexico = lexico if lexico is not None and len(lexico) == len(self.ids) else None
+        self.pasajes = None           # matriz (P x dim) de pasajes, filas de norma 1
+        if pasajes is not None and pasajes[0] is not None:
+            self.pasajes, info = pasajes
+            self.pas_filas = np.asarray(info["rows"], dtype=np.int64)     # fila del doc (no decrece)
+            self.pas_inicio = np.asarray(info["starts"], dtype=np.int64)
+            self.pas_fin = np.asarray(info["ends"], dtype=np.int64)
+            # docs con pasajes y dónde empieza el tramo de cada uno
+            self.pas_docs, self.pas_cortes = np.unique(self.pas_filas, return_index=True)
+        if len(self.ids) >= max(2, ivf_min):
+            self._preparar_ivf(vdir, nlist, ivf_fondo)
+
+    @classmethod
+    def desde_disco(cls, out_dir: str = INDEX_DIR_DEFAULT, **kw):
+        """Carga la versión activa del índice. None si todavía no hay índice."""
+        mat, manifest = cargar_indice(out_dir)
+        if manifest is None:
+            return None
+        lexico = cargar_lexico(out_dir, manifest)
+        if lexico is not None:
+            lexico = IndiceLexico(lexico)
+        else:                                  # índice exportado antes de lexico.json
+            docs = cargar_docs(out_dir, manifest)
+            lexico = IndiceLexico.desde_docs(docs) if docs else None
+        return cls(mat, manifest, vdir=os.path.join(out_dir, manifest["version"]), lexico=lexico,
+                   pasajes=cargar_pasajes(out_dir, manifest), **kw)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- IVF ---
+    def _preparar_ivf(self, vdir: str, nlist: int, fondo: bool = False):
+        """
+        Carga el IVF que dejó el export. Si no está, lo entrena: en el acto, o con
+        fondo=True en un hilo aparte (el servicio sigue respondiendo con exact).
+        """
+        nlist = nlist_para(len(self.ids), nlist)
+        cache = ruta_ivf(vdir, nlist) if vdir else None
+        if cache and os.path.exists(cache):
+            t0 = time.perf_counter()
+            with np.load(cache) as z:
+                self._armar_listas(z["centroides"], z["asignacion"], t0)
+        elif fondo:
+            self.ivf_estado = "training"
+            threading.Thread(target=self._entrenar_ivf, args=(nlist, cache),
+                             name="ivf-train", daemon=True).start()
+        else:
+            self._entrenar_ivf(nlist, cache)
+
+    def _entrenar_ivf(self, nlist: int, cache: str = None):
+        t0 = time.perf_counter()
+        try:
+            centroides, asignacion = entrenar_ivf(self.mat, nlist)
+            if cache:
+                guardar_ivf(cache, centroides, asignacion)
+        except Exception as e:
+            if self.ivf_estado != "training":
+                raise
+            self.ivf_estado = "error"
+            print(f"⚠️  No se pudo entrenar el IVF ({e}): se sigue con búsqueda exacta")
+            return
+        self._armar_listas(centroides, asignacion, t0)
+
+    def _armar_listas(self, centroides, asignacion, t0: float):
+        # Listas invertidas: filas agrupadas por centroide (orden estable)
+        orden = np.argsort(asignacion, kind="stable")
+        cortes = np.searchsorted(asignacion[orden], np.arange(1, len(centroides)))
+        listas = np.split(orden, cortes)
+        self.ivf_s = round(time.perf_counter() - t0, 3)
+        self.centroides = centroides
+        self.listas = listas          # último: recién acá _modo() empieza a ofrecer ivf
+        self.ivf_estado = "ready"
+
+    # --- Búsqueda ---
+    def _modo(self, modo: str) -> str:
+        if modo == "bm25":
+            raise ValueError("mode=bm25 es solo léxico: usar buscar_bm25.")
+        if modo == "auto":
+            return "ivf" if self.listas is not None else "exact"
+        if modo == "ivf" and self.listas is None:
+            if self.ivf_estado == "training":
+                raise ValueError("El IVF de esta versión se está entrenando: usá mode=exact o auto.")
+            raise ValueError("El índice no tiene IVF (corpus chico: usá mode=exact o auto).")
+        return modo
+
+    def _validar(self, Q):
+        if Q.shape[1] != self.dim:
+            raise ValueError(f"La consulta tiene dim {Q.shape[1]} y el índice {self.dim}.")
+        return Q
+
+    def _candidatos_ivf(self, q, nprobe: int = None):
+        """Filas (ordenadas) de las `nprobe` listas más cercanas y sus cosenos."""
+        nprobe = max(1, min(int(nprobe or self.nprobe), len(self.listas)))
+        cercanos = top_k(self.centroides @ q, nprobe)
+        filas = np.concatenate([self.listas[c] for c in cercanos])
+        filas.sort()                                   # lectura del mmap en orden
+        return filas, self.mat[filas] @ q, {"mode": "ivf", "scanned": int(len(filas)), "nprobe": int(nprobe)}
+
+    def _con_pasajes(self, q, filas, sims):
+        """
+        Coseno efectivo de los candidatos: max(doc, mejor pasaje). Agrega los docs
+        con pasajes que no estaban entre `filas` (ordenadas). Devuelve
+        (filas, sims, pasaje) con pasaje[j] = índice del pasaje ganador o -1.
+        """
+        if self.pasajes is None:
+            return filas, sims, None
+        ps = self.pasajes @ q
+        # mejor pasaje de cada doc: orden por (fila del doc, -sim) y el primero de cada tramo
+        mejor = np.lexsort((-ps, self.pas_filas))[self.pas_cortes]
+        faltan = np.setdiff1d(self.pas_docs, filas, assume_unique=True)
+        if len(faltan):
+            filas = np.concatenate([filas, faltan])
+            sims = np.concatenate([sims, self.mat[faltan] @ q])
+            orden = np.argsort(filas, kind="stable")
+            filas, sims = filas[orden], sims[orden]
+        else:
+            sims = np.array(sims, dtype=np.float32)        # copia: no tocar la matriz del lote
+        pos = np.searchsorted(filas, self.pas_docs)
+        gana = ps[mejor] > sims[pos]
+        sims[pos[gana]] = ps[mejor[gana]]
+        pasaje = np.full(len(filas), -1, dtype=np.int64)
+        pasaje[pos[gana]] = mejor[gana]
+        return filas, sims, pasaje
+
+    def _info_pasaje(self, j: int, sim: float):
+        return {"start": int(self.pas_inicio[j]), "end": int(self.pas_fin[j]), "sim": round(float(sim), 6)}
+
+    def buscar(self, q, k: int = 10, modo: str = "auto", nprobe: int = None):
+        """
+        Top-k de la consulta `q` (se normaliza acá).
+        Devuelve (ids, scores, info) con info = {"mode", "scanned"[, "nprobe"][, "passages"]}.
+        """
+        (ids, scores), info = self.buscar_lote(normalizar(q)[None, :], k, modo, nprobe)
+        return (*sin_relleno(ids[0], scores[0]), info)
+
+    def buscar_lote(self, Q, k: int = 10, modo: str = "auto", nprobe: int = None):
+        """
+        Top-k de varias consultas (m x dim). En modo exact: un solo matmul.
+        Devuelve ((ids m x k, scores m x k), info); en IVF, si una consulta tiene
+        menos de k candidatos, su fila termina en relleno (id RELLENO_ID, score
+        -inf; ver sin_relleno). Si el índice tiene pasajes,
+        info["passages"] trae, por consulta y por hit, {start, end, sim} o None.
+        """
+        Q = self._validar(normalizar_filas(Q))
+        modo = self._modo(modo)
+        if self.pasajes is not None:
+            return self._buscar_lote_pasajes(Q, k, modo, nprobe)
+        if modo == "exact":
+            scores = Q @ self.mat.T                        # (m x n)
+            idx = top_k_lote(scores, k)
+            return (self.ids[idx], np.take_along_axis(scores, idx, axis=1)), \
+                {"mode": "exact", "scanned": len(self.ids)}
+
+        ids, sc, revisadas = [], [], 0
+        for q in Q:
+            filas, scores, info = self._candidatos_ivf(q, nprobe)
+            idx = top_k(scores, k)
+            ids.append(self.ids[filas[idx]])
+            sc.append(scores[idx])
+            revisadas += info["scanned"]
+        info["scanned"] = revisadas // max(1, len(Q))     # promedio por consulta
+        return apilar_resultados(ids, sc, min(k, len(self.ids))), info
+
+    def _buscar_lote_pasajes(self, Q, k: int, modo: str, nprobe: int = None):
+        """buscar_lote con coseno max(doc, pasaje): una consulta a la vez."""
+        S = (Q @ self.mat.T) if modo == "exact" else None
+        todas = np.arange(len(self.ids))
+        ids, sc, pas, revisadas = [], [], [], 0
+        for i, q in enumerate(Q):
+            if S is not None:
+                filas, sims, info = todas, S[i], {"mode": "exact", "scanned": len(self.ids)}
+            else:
+                filas, sims, info = self._candidatos_ivf(q, nprobe)
+            filas, sims, pasaje = self._con_pasajes(q, filas, sims)
+            idx = top_k(sims, k)
+            ids.append(self.ids[filas[idx]])
+            sc.append(sims[idx])
+            pas.append([self._info_pasaje(pasaje[j], sims[j]) if pasaje[j] >= 0 else None for j in idx])
+            revisadas += info["scanned"] + len(self.pasajes)
+        info["scanned"] = revisadas // max(1, len(Q))
+        info["passages"] = pas                          # sin relleno: una entrada por hit real
+        return apilar_resultados(ids, sc, min(k, len(self.ids))), info
+
+    # --- Búsqueda híbrida (coseno + bonus léxicos de index.js) ---
+    def buscar_hibrido(self, q, texto: str, k: int = 10, modo: str = "auto", nprobe: int = None, params: dict = None):
+        """Top-k híbrido de una consulta. Devuelve (hits, info); ver buscar_hibrido_lote."""
+        hits, info = self.buscar_hibrido_lote(normalizar(q)[None, :], [texto], k, modo, nprobe, params)
+        return hits[0], info
+
+    def buscar_hibrido_lote(self, Q, textos, k: int = 10, modo: str = "auto", nprobe: int = None, params: dict = None):
+        """
+        Igual que searchTopKWithBonus de index.js, para m consultas:
+          - entra un doc si coseno >= sim_threshold o Jaccard de etiqueta >= tag_bypass_sim;
+          - score = coseno + tag_match_bonus·Jaccard + min(solapamiento·per_token, max).
+        `textos` son las consultas tal como las escribió el usuario (para los bonus).
+        Devuelve (lista de hits por consulta, info); cada hit:
+          {"id", "score", "sim", "tag_sim", "tag_bonus", "overlap"[, "passage"]}
+        ("sim" ya es max(doc, mejor pasaje); "passage" solo si ganó un pasaje).
+        """
+        p = {**PARAMS_HIBRIDO, **(params or {})}
+        Q = self._validar(normalizar_filas(Q))
+        modo = self._modo(modo)
+        todas = np.arange(len(self.ids))
+        S = (Q @ self.mat.T) if modo == "exact" else None    # un matmul para todo el lote
+
+        resultados, revisadas = [], 0
+        for i, q in enumerate(Q):
+            if S is not None:
+                filas, sims, info = todas, S[i], {"mode": "exact", "scanned": len(self.ids)}
+            else:
+                filas, sims, info = self._candidatos_ivf(q, nprobe)
+            revisadas += info["scanned"] + (len(self.pasajes) if self.pasajes is not None else 0)
+            resultados.append(self._rankear_hibrido(q, filas, sims, ConsultaLexica(textos[i] or ""), k, p))
+        info["scanned"] = revisadas // max(1, len(Q))
+        return resultados, info
+
+    def _rankear_hibrido(self, q, filas, sims, consulta: ConsultaLexica, k: int, p: dict):
+        tags = self.lexico.tag_sims(consulta) if self.lexico else {}
+
+        # IVF: los docs que entran por etiqueta (bypass) pueden no estar entre los candidatos
+        if len(filas) < len(self.ids) and tags:
+            extra = np.fromiter((f for f, t in tags.items() if t >= p["tag_bypass_sim"]), dtype=np.int64)
+            extra = np.setdiff1d(extra, filas)
+            if len(extra):
+                filas = np.concatenate([filas, extra])
+                sims = np.concatenate([sims, self.mat[extra] @ q])
+                orden = np.argsort(filas)
+                filas, sims = filas[orden], sims[orden]
+        filas, sims, pasaje = self._con_pasajes(q, filas, sims)
+
+        tag = np.zeros(len(filas), dtype=np.float32)
+        if tags:
+            tf = np.fromiter(tags.keys(), dtype=np.int64)
+            tv = np.fromiter(tags.values(), dtype=np.float32)
+            pos = np.searchsorted(filas, tf)
+            ok = (pos < len(filas)) & (filas[np.minimum(pos, len(filas) - 1)] == tf)
+            tag[pos[ok]] = tv[ok]
+
+        cand = np.nonzero((sims >= p["sim_threshold"]) | (tag >= p["tag_bypass_sim"]))[0]
+        base = sims[cand] + p["tag_match_bonus"] * tag[cand]
+        orden_base = np.argsort(-base, kind="stable")
+        orden, base = cand[orden_base], base[orden_base]
+
+        bonus_max = p["overlap_bonus_max"]
+        usa_overlap = self.lexico is not None and p["overlap_bonus_per_token"] > 0 and bonus_max > 0
+        if usa_overlap and len(orden) > k:
+            # El bonus suma como mucho bonus_max: nadie por debajo de (k-ésimo base - bonus_max) entra
+            keep = base >= base[k - 1] - bonus_max
+            orden, base = orden[keep], base[keep]
+        elif not usa_overlap:
+            orden, base = orden[:k], base[:k]
+
+        solap = self.lexico.solapamientos(consulta) if self.lexico else None
+        hits = []
+        for j, c in enumerate(orden):
+            fila = int(filas[c])
+            overlap = int(solap[fila]) if solap is not None else 0
+            bonus = min(overlap * p["overlap_bonus_per_token"], p["overlap_bonus_max"]) if usa_overlap else 0.0
+            hit = {
+                "id": int(self.ids[fila]),
+                "score": round(float(base[j]) + bonus, 6),
+                "sim": round(float(sims[c]), 6),
+                "tag_sim": round(float(tag[c]), 6),
+                "tag_bonus": round(p["tag_match_bonus"] * float(tag[c]), 6),
+                "overlap": overlap,
+            }
+            if pasaje is not None and pasaje[c] >= 0:
+                hit["passage"] = self._info_pasaje(pasaje[c], sims[c])
+            hits.append(hit)
+        hits.sort(key=lambda h: -h["score"])
+        return hits[:k]
+
+    # --- Búsqueda léxica (BM25) ---
+    def buscar_bm25(self, textos, k: int = 10, params: dict = None):
+        """
+        Top-k BM25 de cada texto, sin vectores. "sim" es el BM25 normalizado a
+        [0, 1] (BM25 / cota máxima de la consulta) y hace el papel del coseno:
+        score = sim + los mismos bonus de etiquetas/solapamiento, así los umbrales
+        de index.js siguen teniendo sentido. El valor crudo queda en "bm25".
+        Devuelve (lista de hits por consulta, info); cada hit:
+          {"id", "score", "sim", "bm25", "tag_sim", "tag_bonus", "overlap"}.
+        """
+        if self.lexico is None:
+            raise ValueError("El índice no tiene datos léxicos (re-exportarlo con el seeder).")
+        p = {**PARAMS_HIBRIDO, **(params or {})}
+        resultados, tocados = [], 0
+        for texto in textos:
+            consulta = ConsultaLexica(texto or "")
+            scores, cota = self.lexico.bm25(consulta)
+            tocados += int(np.count_nonzero(scores))
+            sims = scores / cota if cota else scores
+            tags = self.lexico.tag_sims(consulta)
+            tag = np.zeros(len(scores), dtype=np.float32)
+            if tags:
+                tag[np.fromiter(tags.keys(), dtype=np.int64)] = np.fromiter(tags.values(), dtype=np.float32)
+            solap = self.lexico.solapamientos(consulta)
+            total = sims + p["tag_match_bonus"] * tag \
+                + np.minimum(solap * p["overlap_bonus_per_token"], p["overlap_bonus_max"])
+            idx = top_k(np.where(scores > 0, total, -np.inf), k)
+            hits = []
+            for fila in idx[scores[idx] > 0]:
+                fila = int(fila)
+                hits.append({
+                    "id": int(self.ids[fila]),
+                    "score": round(float(total[fila]), 6),
+                    "sim": round(float(sims[fila]), 6),
+                    "bm25": round(float(scores[fila]), 6),
+                    "tag_sim": round(float(tag[fila]), 6),
+                    "tag_bonus": round(p["tag_match_bonus"] * float(tag[fila]), 6),
+                    "overlap": int(solap[fila]),
+                })
+            resultados.append(hits)
+        return resultados, {"mode": "bm25", "scanned": tocados // max(1, len(textos))}
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "count": len(self.ids),
+            "dim": self.dim,
+            "model": self.manifest.get("model"),
+            "passages": None if self.pasajes is None else {
+                "count": len(self.pasajes),
+                "docs": len(self.pas_docs),
+            },
+            "lexical": None if self.lexico is None else {
+                "vocab": len(self.lexico.vocab),
+                "avgdl": round(self.lexico.avgdl, 1),
+            },
+            "ivf": ({"status": self.ivf_estado} if self.ivf_estado else None) if self.listas is None else {
+                "nlist": len(self.listas),
+                "nprobe": self.nprobe,
+                "build_s": self.ivf_s,
+            },
+        }
+
+def entrenar_ivf(mat, nlist: int, muestra: int = 100_000, seed: int = 0):
+    """
+    K-means esférico: k-means sobre filas normalizadas y centroides re-normalizados
+    (así "más cercano" = mayor producto punto). Entrena con una muestra y asigna todo.
+    Devuelve (centroides float32 nlist x dim, asignación int32 por fila).
+    """
+    from sklearn.cluster import KMeans
+
+    n = mat.shape[0]
+    rng = np.random.default_rng(seed)
+    filas = np.sort(rng.choice(n, size=min(n, muestra), replace=False))
+    km = KMeans(n_clusters=nlist, n_init=1, max_iter=25, random_state=seed)
+    km.fit(np.asarray(mat[filas], dtype=np.float32))
+    centroides = km.cluster_centers_.astype(np.float32)
+    centroides /= np.maximum(np.linalg.norm(centroides, axis=1, keepdims=True), 1e-12)
+
+    asignacion = np.empty(n, dtype=np.int32)
+    for i in range(0, n, 8192):                       # por bloques: memoria acotada
+        asignacion[i:i + 8192] = np.argmax(mat[i:i + 8192] @ centroides.T, axis=1)
+    return centroides, asignacion
+
+def guardar_ivf(ruta: str, centroides, asignacion):
+    """Escribe ivf_<nlist>.npz con rename atómico (varios workers pueden llegar a la vez)."""
+    tmp = ruta + f".{os.getpid()}.{threading.get_ident()}.tmp.npz"
+    np.savez(tmp, centroides=centroides, asignacion=asignacion)
+    os.replace(tmp, ruta)
+
+def construir_ivf(mat, vdir: str, nlist: int = IVF_NLIST) -> int:
+    """Entrena y guarda el IVF de una versión del índice (lo llama el export). Devuelve nlist."""
+    nlist = nlist_para(mat.shape[0], nlist)
+    guardar_ivf(ruta_ivf(vdir, nlist), *entrenar_ivf(mat, nlist))
+    return nlist
+
+# ----------------- Recarga automática -----------------
+class GestorIndice:
+    """
+    Mantiene el IndiceBusqueda vigente de `out_dir` y lo recarga cuando el seeder
+    publica una versión nueva (cambia el mtime de CURRENT). Thread-safe: las
+    búsquedas en curso siguen usando el índice anterior hasta terminar.
+    """
+
+    def __init__(self, out_dir: str = INDEX_DIR_DEFAULT, chequeo_s: float = 2.0):
+        self.out_dir = out_dir
+        self.chequeo_s = chequeo_s
+        self._indice = None
+        self._mtime = None
+        self._ultimo_chequeo = 0.0
+        self._lock = threading.Lock()
+
+    def _mtime_current(self):
+        try:
+            return os.stat(os.path.join(self.out_dir, CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def recargar(self):
+        """Fuerza la carga de la versión activa. Devuelve el índice (o None)."""
+        with self._lock:
+            self._mtime = self._mtime_current()
+            # IVF que no vino del export: en un hilo, para no frenar esta búsqueda
+            self._indice = IndiceBusqueda.desde_disco(self.out_dir, ivf_fondo=True)
+            self._ultimo_chequeo = time.monotonic()
+            return self._indice
+
+    def actual(self):
+        """Índice vigente; revisa CURRENT como mucho cada `chequeo_s` segundos."""
+        ahora = time.monotonic()
+        if self._indice is None or ahora - self._ultimo_chequeo >= self.chequeo_s:
+            self._ultimo_chequeo = ahora
+            if self._indice is None or self._mtime_current() != self._mtime:
+                return self.recargar()
+        return self._indice
+
+    def stats(self):
+        return self._indice.stats() if self._indice is not None else None
+
+# ----------------- CLI: recall IVF vs exacto -----------------
+def medir_recall(indice: IndiceBusqueda, k: int = 10, nprobe: int = None, consultas: int = 200, seed: int = 0) -> dict:
+    """
+    Usa filas del propio corpus como consultas y compara el top-k del IVF
+    contra el exacto. Devuelve recall@k medio y tiempos por consulta.
+    """
+    rng = np.random.default_rng(seed)
+    muestras = rng.choice(len(indice), size=max(0, min(consultas, len(indice))), replace=False)
+    if not len(muestras):                   # índice vacío o --queries 0: nada que medir
+        return {"queries": 0, "k": k, "nprobe": int(nprobe or indice.nprobe), "recall": None,
+                "scanned_avg": 0.0, "exact_ms": 0.0, "ivf_ms": 0.0}
+    aciertos, t_ex, t_ivf, revisadas = 0, 0.0, 0.0, 0
+    for fila in muestras:
+        q = np.asarray(indice.mat[fila])
+        t0 = time.perf_counter()
+        ex, _, _ = indice.buscar(q, k, "exact")
+        t1 = time.perf_counter()
+        ap, _, info = indice.buscar(q, k, "ivf", nprobe)
+        t2 = time.perf_counter()
+        aciertos += len(set(ex.tolist()) & set(ap.tolist()))
+        revisadas += info["scanned"]
+        t_ex += t1 - t0
+        t_ivf += t2 - t1
+    n = len(muestras)
+    return {
+        "queries": int(n),
+        "k": k,
+        "nprobe": info["nprobe"],
+        "recall": round(aciertos / max(1, n * min(k, len(indice))), 4),
+        "scanned_avg": round(revisadas / max(1, n), 1),
+        "exact_ms": round(1000 * t_ex / max(1, n), 3),
+        "ivf_ms": round(1000 * t_ivf / max(1, n), 3),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Búsqueda vectorial sobre el índice en disco.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_rec = sub.add_parser("recall", help="Recall@k del IVF contra la búsqueda exacta.")
+    p_rec.add_argument("--index-dir", default=os.environ.get("EMBED_INDEX_DIR", INDEX_DIR_DEFAULT))
+    p_rec.add_argument("--k", type=int, default=10)
+    p_rec.add_argument("--nprobe", type=int, default=IVF_NPROBE)
+    p_rec.add_argument("--nlist", type=int, default=IVF_NLIST)
+    p_rec.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    # ivf_min=2 → entrena IVF aunque el corpus sea chico (es una medición)
+    indice = IndiceBusqueda.desde_disco(args.index_dir, ivf_min=2, nlist=args.nlist, nprobe=args.nprobe)
+    if indice is None:
+        print(f"ℹ️ No hay índice en {args.index_dir} (correr el seeder o vector_index.py export)")
+        return
+    rep = {"index": indice.stats(), **medir_recall(indice, args.k, args.nprobe, args.queries)}
+    print(json.dumps(rep, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+# vector_store.py
+# ======================================================================
+# Helpers compartidos para los vectores guardados en MySQL
+# (los usan seed_local_embeddings.py y crud_conocimiento.py).
+#
+# Columnas por fila en `conocimiento`:
+#   - vector        → JSON con la lista de floats (formato original)
+#   - vector_blob   → mismo vector empaquetado en binario little-endian
+#                     (float32 = 4 bytes/dim, float16 = 2 bytes/dim)
+#   - vector_dtype  → "f32" | "f16" (formato de vector_blob)
+#   - vector_dim    → dimensión del vector (ej.: 768)
+#   - vector_modelo → identificador del modelo/backend que generó el vector
+#                     (sufijo "+l2" si los vectores están normalizados)
+#   - vector_norm   → 1 si el vector tiene norma 1 (coseno = producto punto)
+#   - texto_hash    → SHA-256 del texto que se vectorizó
+#                     (build_text_for_embedding del seeder)
+#
+# Con hash/modelo el seeder incremental sabe qué filas están al día y cuáles
+# hay que re-embedir (texto nuevo/cambiado, otro modelo o vector NULL).
+# Las columnas se agregan solas la primera vez (ALTER TABLE ... ADD COLUMN).
+#
+# Una fila "tiene vector" si tiene vector_blob o un JSON no vacío
+# (ver SQL_TIENE_VECTOR); así conviven filas viejas y migradas.
+#
+# Pasajes (seed_local_embeddings.py --passages): los docs largos se parten en
+# tramos de tokens solapados; cada tramo tiene su vector en la tabla hija
+# `<tabla>_pasajes` (doc_id, n, char_inicio, char_fin sobre `contenido`).
+#
+# Sombra (seed_local_embeddings.py --shadow): vectores de un modelo NUEVO en la
+# tabla `<tabla>_sombra` (doc_id, texto_hash, vector_*) mientras las columnas de
+# `<tabla>` siguen sirviendo con el modelo actual; --cutover los copia en una
+# sola transacción (ver promover_sombra en el seeder).
+#
+# Registro de cambios: `<tabla>_cambios` (version creciente, doc_id, op) lo
+# escriben el CRUD y el seeder en la MISMA transacción que el cambio; index.js
+# aplica solo lo nuevo desde su última versión (POST /api/cache/reload?mode=delta)
+# en lugar de recargar todo. Con CACHE_NOTIFY_URL el aviso sale solo tras el commit.
+#
+# Migración JSON → BLOB (una vez, idempotente):
+#   python vector_store.py migrate [--dtype f32|f16] [--clear-json]
+# ======================================================================
+
+import os                      # nombre del modelo a partir de su carpeta
+import json                    # vectores JSON viejos
+import hashlib                 # hash del texto vectorizado
+import argparse                # CLI de migración
+import urllib.request          # aviso al backend tras un cambio (CACHE_NOTIFY_URL)
+import numpy as np             # empaquetado binario
+
+# Columnas de metadatos del vector: nombre -> definición SQL
+COLUMNAS_META = {
+    "texto_hash": "CHAR(64) NULL",
+    "vector_modelo": "VARCHAR(255) NULL",
+    "vector_dim": "INT NULL",
+    "vector_blob": "BLOB NULL",
+    "vector_dtype": "VARCHAR(8) NULL",
+    "vector_norm": "TINYINT(1) NULL",
+}
+
+# Formatos binarios: nombre -> dtype numpy little-endian
+DTYPES = {"f32": "<f4", "f16": "<f2"}
+
+# Expresiones SQL reutilizables (columna vector = JSON, vector_blob = binario)
+SQL_TIENE_VECTOR = "(vector_blob IS NOT NULL OR (vector IS NOT NULL AND JSON_LENGTH(vector) > 0))"
+SQL_DIMS = f"(CASE WHEN {SQL_TIENE_VECTOR} THEN COALESCE(vector_dim, JSON_LENGTH(vector)) ELSE 0 END)"
+
+# ----------------- Empaquetado binario -----------------
+def pack_vector(vec, dtype: str = "f32") -> bytes:
+    """Vector (lista o numpy) → bytes little-endian del dtype pedido."""
+    return np.asarray(vec, dtype=DTYPES[dtype]).tobytes()
+
+def unpack_vector(blob, dtype: str = "f32"):
+    """bytes → numpy float32 (copia; no comparte memoria con el blob)."""
+    return np.frombuffer(blob, dtype=DTYPES[dtype or "f32"]).astype(np.float32)
+
+def leer_vector(blob, dtype, json_vec):
+    """Vector de una fila: prioriza el BLOB y cae al JSON viejo. None si no hay."""
+    if blob is not None:
+        return unpack_vector(blob, dtype)
+    if json_vec:
+        arr = json.loads(json_vec) if isinstance(json_vec, (str, bytes)) else json_vec
+        if arr:
+            return np.asarray(arr, dtype=np.float32)
+    return None
+
+# ----------------- Identificadores -----------------
+def hash_texto(texto: str) -> str:
+    """SHA-256 (hex) del texto a vectorizar."""
+    return hashlib.sha256((texto or "").encode("utf-8")).hexdigest()
+
+def modelo_id(ruta_modelo: str, backend: str = "torch", normalizado: bool = False) -> str:
+    """
+    Identificador estable del espacio de embeddings: nombre de la carpeta
+    del modelo (+ backend si no es torch, porque int8 cambia levemente los vectores)
+    (+ "+l2" si se guardan normalizados: cambiar de modo obliga a re-embedir).
+    """
+    nombre = os.path.basename(os.path.normpath(ruta_modelo or "")) or "modelo"
+    if backend not in ("", None, "torch", "onnx"):
+        nombre = f"{nombre}@{backend}"
+    return f"{nombre}+l2" if normalizado else nombre
+
+# ----------------- Esquema -----------------
+def columnas_existentes(cur, tabla: str) -> set:
+    """Nombres de columnas de `tabla` en la base actual."""
+    cur.execute(
+        """SELECT COLUMN_NAME FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s""",
+        (tabla,),
+    )
+    return {r[0] for r in cur.fetchall()}
+
+def asegurar_columnas(cur, tabla: str, columnas: dict = COLUMNAS_META) -> list:
+    """Agrega las columnas que falten. Devuelve la lista de columnas creadas."""
+    existentes = columnas_existentes(cur, tabla)
+    creadas = []
+    for nombre, definicion in columnas.items():
+        if nombre not in existentes:
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {definicion}")
+            creadas.append(nombre)
+    return creadas
+
+def prefijo_indexable(cur, tabla: str, columna: str, max_chars: int = 191):
+    """
+    Largo del prefijo con que se indexa `columna` (None = completa): TEXT o un
+    VARCHAR largo van con prefijo (InnoDB limita el largo de la clave; 191
+    chars utf8mb4 < 767 bytes).
+    """
+    cur.execute(
+        """SELECT DATA_TYPE, CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+        (tabla, columna),
+    )
+    fila = cur.fetchone()
+    tipo, largo = (fila or ("text", None))
+    tipo = tipo.decode() if isinstance(tipo, (bytes, bytearray)) else str(tipo)
+    if tipo.lower().endswith(("text", "blob")) or (largo or 0) > max_chars:
+        return max_chars
+    return None
+
+def columna_indexable(cur, tabla: str, columna: str, max_chars: int = 191) -> str:
+    """Definición de `columna` para un índice: con prefijo si hace falta (ver prefijo_indexable)."""
+    n = prefijo_indexable(cur, tabla, columna, max_chars)
+    return f"{columna}({n})" if n else columna
+
+def asegurar_clave_unica(cur, tabla: str, columna: str = "titulo", nombre: str = None):
+    """
+    Crea UNIQUE KEY sobre `columna` si no hay ninguna (la usan el UPSERT del
+    seeder y la importación masiva del CRUD). Devuelve (ok, mensaje):
+    ok=False si hay valores repetidos y no se pudo crear (se informan cuántos).
+    Si la clave va con prefijo (TEXT), "repetido" es igual en los primeros
+    191 caracteres: títulos que difieren recién después chocarían en la clave.
+    Ojo: es DDL, hace commit implícito (llamar fuera de una transacción).
+    """
+    cur.execute(
+        """SELECT 1 FROM information_schema.STATISTICS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+             AND NON_UNIQUE = 0 AND SEQ_IN_INDEX = 1
+           LIMIT 1""",
+        (tabla, columna),
+    )
+    if cur.fetchone():
+        return True, None
+    # los repetidos se buscan con la misma expresión que cubre la clave
+    n = prefijo_indexable(cur, tabla, columna)
+    clave = f"LEFT({columna}, {n})" if n else columna
+    cur.execute(
+        f"""SELECT COUNT(*), MIN(ejemplo) FROM (
+              SELECT MIN({columna}) AS ejemplo FROM {tabla} GROUP BY {clave} HAVING COUNT(*) > 1
+            ) d"""
+    )
+    repetidos, ejemplo = cur.fetchone()
+    if repetidos:
+        donde = f" en los primeros {n} caracteres" if n else ""
+        ejemplo = ejemplo.decode("utf-8", "ignore") if isinstance(ejemplo, (bytes, bytearray)) else str(ejemplo)
+        return False, (f"{repetidos} valores de {columna} repetidos{donde} en {tabla} "
+                       f"(p. ej. «{ejemplo[:80]}»): no se crea la clave única")
+    nombre = nombre or f"uq_{columna}"
+    try:
+        cur.execute(f"ALTER TABLE {tabla} ADD UNIQUE KEY {nombre} ({f'{columna}({n})' if n else columna})")
+    except Exception as e:
+        if getattr(e, "errno", None) != 1062:          # ER_DUP_ENTRY: alguien insertó un repetido recién
+            raise
+        return False, f"Valores de {columna} repetidos en {tabla} ({e}): no se crea la clave única"
+    return True, f"Clave única {nombre} creada en {tabla}.{columna}"
+
+def tabla_pasajes(tabla: str) -> str:
+    return f"{tabla}_pasajes"
+
+def asegurar_tabla_pasajes(cur, tabla: str) -> str:
+    """Crea `<tabla>_pasajes` si no existe. Devuelve su nombre."""
+    nombre = tabla_pasajes(tabla)
+    cur.execute(
+        f"""CREATE TABLE IF NOT EXISTS {nombre} (
+              id            INT AUTO_INCREMENT PRIMARY KEY,
+              doc_id        INT NOT NULL,
+              n             INT NOT NULL,
+              char_inicio   INT NOT NULL,
+              char_fin      INT NOT NULL,
+              texto_hash    CHAR(64) NULL,
+              vector_blob   BLOB NOT NULL,
+              vector_dtype  VARCHAR(8) NOT NULL,
+              vector_dim    INT NOT NULL,
+              vector_modelo VARCHAR(255) NULL,
+              vector_norm   TINYINT(1) NULL,
+              UNIQUE KEY uq_doc_n (doc_id, n)
+            )"""
+    )
+    return nombre
+
+def tabla_sombra(tabla: str) -> str:
+    return f"{tabla}_sombra"
+
+def asegurar_tabla_sombra(cur, tabla: str) -> str:
+    """Crea `<tabla>_sombra` si no existe (un vector por doc del modelo en prueba). Devuelve su nombre."""
+    nombre = tabla_sombra(tabla)
+    cur.execute(
+        f"""CREATE TABLE IF NOT EXISTS {nombre} (
+              doc_id        INT PRIMARY KEY,
+              texto_hash    CHAR(64) NOT NULL,
+              vector_blob   BLOB NOT NULL,
+              vector_dtype  VARCHAR(8) NOT NULL,
+              vector_dim    INT NOT NULL,
+              vector_modelo VARCHAR(255) NOT NULL,
+              vector_norm   TINYINT(1) NULL,
+              KEY ix_modelo (vector_modelo)
+            )"""
+    )
+    return nombre
+
+def existe_tabla(cur, tabla: str) -> bool:
+    cur.execute(
+        """SELECT 1 FROM information_schema.TABLES
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s""",
+        (tabla,),
+    )
+    return cur.fetchone() is not None
+
+# ----------------- Registro de cambios (recarga delta en index.js) -----------------
+# op: "upsert" (fila nueva/cambiada), "delete" (fila borrada) o "reset"
+# (cambio masivo: el consumidor recarga todo). Solo se registra en las tablas
+# preparadas con asegurar_tabla_cambios en este proceso: las copias de
+# trabajo (p. ej. <tabla>_bench) no escriben registro.
+_TABLAS_CON_CAMBIOS = set()
+
+def tabla_cambios(tabla: str) -> str:
+    return f"{tabla}_cambios"
+
+# Días que se guardan en el registro (un consumidor más atrasado recarga todo)
+CAMBIOS_RETENCION_DIAS = int(os.environ.get("CAMBIOS_RETENCION_DIAS", "7"))
+
+def asegurar_tabla_cambios(cur, tabla: str, retencion_dias: int = CAMBIOS_RETENCION_DIAS) -> str:
+    """
+    Crea `<tabla>_cambios` si no existe, poda lo más viejo que `retencion_dias`
+    y activa el registro para `tabla`. Devuelve su nombre.
+    """
+    nombre = tabla_cambios(tabla)
+    cur.execute(
+        f"""CREATE TABLE IF NOT EXISTS {nombre} (
+              version BIGINT AUTO_INCREMENT PRIMARY KEY,
+              doc_id  INT NULL,
+              op      VARCHAR(8) NOT NULL,
+              fecha   TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+              KEY ix_fecha (fecha)
+            )"""
+    )
+    # Se conserva siempre la última fila: si la tabla queda vacía, algunos MySQL
+    # reinician el AUTO_INCREMENT al reiniciar y la versión "volvería atrás".
+    cur.execute(f"SELECT MAX(version) FROM {nombre}")
+    ultima = cur.fetchone()[0]
+    if ultima is not None and retencion_dias > 0:
+        cur.execute(
+            f"DELETE FROM {nombre} WHERE version < %s AND fecha < NOW(6) - INTERVAL %s DAY",
+            (ultima, retencion_dias),
+        )
+    _TABLAS_CON_CAMBIOS.add(tabla)
+    return nombre
+
+def registrar_cambios(cur, tabla: str, ids=(), titulos=(), op: str = "upsert",
+                      select: str = None, params=(), lote: int = 500) -> None:
+    """
+    Anota filas tocadas en `<tabla>_cambios`: por id, por título o con un
+    `select` que devuelva una columna `id`. Va dentro de la transacción del
+    cambio: si hay rollback, el registro tampoco queda.
+    op="reset" anota un cambio masivo sin ids.
+    """
+    if tabla not in _TABLAS_CON_CAMBIOS:
+        return
+    nombre = tabla_cambios(tabla)
+    if op == "reset":
+        cur.execute(f"INSERT INTO {nombre} (doc_id, op) VALUES (NULL, 'reset')")
+        return
+    ids = list(ids)
+    if ids:
+        cur.executemany(f"INSERT INTO {nombre} (doc_id, op) VALUES (%s, %s)", [(i, op) for i in ids])
+    titulos = list(titulos)
+    for i in range(0, len(titulos), lote):
+        parte = titulos[i:i + lote]
+        cur.execute(
+            f"""INSERT INTO {nombre} (doc_id, op)
+                SELECT id, %s FROM {tabla} WHERE titulo IN ({', '.join(['%s'] * len(parte))})""",
+            (op, *parte),
+        )
+    if select:
+        cur.execute(f"INSERT INTO {nombre} (doc_id, op) SELECT d.id, %s FROM ({select}) d", (op, *params))
+
+def notificar_cambios(url: str = None, timeout: float = 0.5) -> bool:
+    """
+    Avisa al backend que hay cambios (POST a CACHE_NOTIFY_URL, p. ej.
+    http://127.0.0.1:3000/api/cache/reload?mode=delta). Llamar DESPUÉS del commit.
+    Sin URL no hace nada; si el backend no responde, se ignora (lo levanta el
+    próximo aviso o el sondeo de index.js). Devuelve True si respondió 2xx.
+    """
+    url = url if url is not None else os.environ.get("CACHE_NOTIFY_URL", "")
+    if not url:
+        return False
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=b"", method="POST"), timeout=timeout) as r:
+            return 200 <= r.status < 300
+    except Exception:
+        return False
+
+# ----------------- Marca de agua del export (columna `actualizado`) -----------------
+# crud_conocimiento.py exporta la tabla solo si cambió MAX(actualizado), una
+# columna ON UPDATE CURRENT_TIMESTAMP. Un UPDATE que solo toca vectores la
+# movería igual y forzaría a re-exportar todo sin que cambie nada exportado:
+# esos UPDATE asignan `actualizado` a mano (sql_marca). Solo en las tablas
+# preparadas con preparar_marca que tienen la columna.
+COLUMNA_MARCA = "actualizado"
+_TABLAS_CON_MARCA = set()
+
+def preparar_marca(cur, tabla: str) -> bool:
+    """Activa sql_marca para `tabla` si tiene la columna `actualizado`. Devuelve si la tiene."""
+    if COLUMNA_MARCA in columnas_existentes(cur, tabla):
+        _TABLAS_CON_MARCA.add(tabla)
+        return True
+    _TABLAS_CON_MARCA.discard(tabla)
+    return False
+
+def sql_marca(tabla: str, datos=(), alias: str = "") -> str:
+    """
+    Asignación de `actualizado` para poner PRIMERA en el SET de un UPDATE (o de
+    un ON DUPLICATE KEY UPDATE) sobre vectores:
+      - sin `datos`: la marca no se mueve;
+      - con `datos` (columnas exportadas que también se escriben, comparadas con
+        VALUES(col)): se mueve solo si alguna cambia. Va primera porque MySQL
+        asigna de izquierda a derecha y la comparación tiene que ver lo viejo.
+    "" si la tabla no está preparada (ver preparar_marca).
+    """
+    if tabla not in _TABLAS_CON_MARCA:
+        return ""
+    col = f"{alias}.{COLUMNA_MARCA}" if alias else COLUMNA_MARCA
+    if not datos:
+        return f"{col} = {col}, "
+    iguales = " AND ".join(f"{c} <=> VALUES({c})" for c in datos)
+    return f"{col} = IF({iguales}, {col}, CURRENT_TIMESTAMP(6)), "
+
+# ----------------- Migración JSON → BLOB -----------------
+def migrar_vectores(conn, tabla: str = "conocimiento", dtype: str = "f32", clear_json: bool = False, lote: int = 500):
+    """
+    Convierte las filas que solo tienen `vector` JSON a `vector_blob`.
+    Recorre por id (keyset) en lotes; cada lote es una transacción.
+    - clear_json=True pone `vector` en NULL tras convertir (libera espacio).
+    Devuelve la cantidad de filas migradas.
+    """
+    cur = conn.cursor()
+    creadas = asegurar_columnas(cur, tabla)
+    if creadas:
+        print(f"🧱 Columnas agregadas a {tabla}: {', '.join(creadas)}")
+    preparar_marca(cur, tabla)                     # convertir el formato no es un cambio para el export
+
+    migradas, ultimo_id = 0, 0
+    while True:
+        cur.execute(
+            f"""SELECT id, vector FROM {tabla}
+                WHERE id > %s AND vector_blob IS NULL
+                  AND vector IS NOT NULL AND JSON_LENGTH(vector) > 0
+                ORDER BY id LIMIT %s""",
+            (ultimo_id, lote),
+        )
+        filas = cur.fetchall()
+        if not filas:
+            break
+        updates = []
+        for id_, raw in filas:
+            vec = leer_vector(None, None, raw)
+            updates.append((pack_vector(vec, dtype), dtype, int(vec.shape[0]), id_))
+        sql_clear = ", vector = NULL" if clear_json else ""
+        cur.executemany(
+            f"UPDATE {tabla} SET {sql_marca(tabla)}vector_blob = %s, vector_dtype = %s, vector_dim = %s{sql_clear} "
+            f"WHERE id = %s",
+            updates,
+        )
+        conn.commit()
+        migradas += len(filas)
+        ultimo_id = filas[-1][0]
+        print(f"📦 Migradas {migradas} filas (hasta id {ultimo_id})")
+    cur.close()
+    return migradas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Utilidades de vectores en MySQL.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_mig = sub.add_parser("migrate", help="Convierte vectores JSON a BLOB binario.")
+    p_mig.add_argument("--dtype", default="f32", choices=sorted(DTYPES))
+    p_mig.add_argument("--clear-json", action="store_true", help="Vacía la columna JSON tras convertir.")
+    p_mig.add_argument("--table", default="conocimiento")
+    p_mig.add_argument("--batch", type=int, default=500, help="Filas por transacción.")
+    p_mig.add_argument("--host", default="localhost")
+    p_mig.add_argument("--user", default="museo")
+    p_mig.add_argument("--password", default="museo2025")
+    p_mig.add_argument("--database", default="museo")
+    args = parser.parse_args(argv)
+
+    import mysql.connector
+    conn = mysql.connector.connect(host=args.host, user=args.user, password=args.password, database=args.database)
+    try:
+        n = migrar_vectores(conn, args.table, args.dtype, args.clear_json, args.batch)
+        print(f"🎉 Listo. Filas migradas a vector_blob ({args.dtype}): {n}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()